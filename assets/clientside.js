@@ -0,0 +1,277 @@
+// Clientside mode (NOTACTIVE_CLIENTSIDE=1): draws every section in the browser from the dataset that
+// clientside.client_dataset() puts in the 'client-data' store, mirroring Cube.lookup() and the render_*
+// functions in dashboard.py, so a dropdown change never reaches the server.
+
+(function () {
+    var DEACTIVE_COLUMNS = ['both', 'eval_low', 'club_low', 'eval_rows', 'eval_deactive', 'club_rows',
+                            'club_deactive'];
+    var ORDER_BINS = 5, SUBSCRIPTION_BINS = 4, TENURE_BINS = 6;
+
+    function html(type, props) {
+        return {type: type, namespace: 'dash_html_components', props: props};
+    }
+
+    function range(count) {
+        var values = [];
+        for (var i = 0; i < count; i++) {
+            values.push(i);
+        }
+        return values;
+    }
+
+    // Cube.lookup(): sum the cells of the selection, split by every dimension for the grouped charts
+    function summarize(data, selection) {
+        var cells = data.cells, dims = data.dimensions;
+        var wanted = dims.map(function (dim, position) {
+            return selection[position] === 'All' ? null : data.values[dim].indexOf(selection[position]);
+        });
+        if (wanted.indexOf(-1) !== -1) {
+            return null;
+        }
+
+        var names = Object.keys(cells).filter(function (name) { return dims.indexOf(name) === -1; });
+        var totals = {}, breakdowns = {}, rows = 0;
+        names.forEach(function (name) { totals[name] = 0; });
+        dims.forEach(function (dim) { breakdowns[dim] = {}; });
+        for (var i = 0; i < cells[dims[0]].length; i++) {
+            var selected = dims.every(function (dim, position) {
+                return wanted[position] === null || cells[dim][i] === wanted[position];
+            });
+            if (!selected) {
+                continue;
+            }
+            rows++;
+            names.forEach(function (name) { totals[name] += cells[name][i] || 0; });
+            dims.forEach(function (dim) {
+                var code = cells[dim][i];
+                if (code < 0) {
+                    return;  // missing values only count under 'All'
+                }
+                var counters = breakdowns[dim][code];
+                if (!counters) {
+                    counters = breakdowns[dim][code] = {};
+                    DEACTIVE_COLUMNS.forEach(function (name) { counters[name] = 0; });
+                }
+                DEACTIVE_COLUMNS.forEach(function (name) { counters[name] += cells[name][i]; });
+            });
+        }
+        if (rows === 0) {
+            return null;
+        }
+
+        var summary = Object.assign({}, totals);
+        ['orders_per_day', 'revenue_per_day', 'subscription', 'tenure'].forEach(function (metric) {
+            var count = totals[metric + '_count'];
+            summary[metric + '_mean'] = count ? totals[metric + '_sum'] / count : NaN;
+        });
+        var node = data.quantiles;
+        selection.forEach(function (value) { node = node && node[value]; });
+        data.quantile_columns.forEach(function (name, position) {
+            var value = node ? node[position] : null;
+            summary[name] = value === null || value === undefined ? NaN : value;
+        });
+
+        // grouped_charts(): (value, count) pairs in the cube's key order
+        function series(dim, rowsColumn, value) {
+            return Object.keys(breakdowns[dim]).map(Number).sort(function (a, b) { return a - b; })
+                .filter(function (code) { return breakdowns[dim][code][rowsColumn] > 0; })
+                .map(function (code) { return [data.values[dim][code], value(breakdowns[dim][code])]; });
+        }
+        summary.city_eval = series('city', 'eval_rows', function (c) { return c.eval_deactive; });
+        summary.city_club = series('city', 'club_rows', function (c) { return c.club_deactive; });
+        summary.salesman_deactive = series('salesman', 'both', function (c) { return c.eval_low + c.club_low; });
+        summary.status_eval = series('BranchStatus', 'eval_rows', function (c) { return c.eval_deactive; });
+        summary.status_club = series('BranchStatus', 'club_rows', function (c) { return c.club_deactive; });
+        return summary;
+    }
+
+    function emptySummary(data) {
+        var summary = {};
+        Object.keys(data.cells).forEach(function (name) { summary[name] = 0; });
+        ['orders_per_day', 'revenue_per_day', 'subscription', 'tenure'].forEach(function (metric) {
+            summary[metric + '_mean'] = NaN;
+        });
+        data.quantile_columns.forEach(function (name) { summary[name] = NaN; });
+        ['city_eval', 'city_club', 'salesman_deactive', 'status_eval', 'status_club'].forEach(function (name) {
+            summary[name] = [];
+        });
+        return summary;
+    }
+
+    // FigureTemplate.fill(...).figure(): the template with the data-carrying properties replaced
+    function fill(data, name, changes) {
+        var figure = JSON.parse(JSON.stringify(data.templates[name]));
+        figure.layout.template = data.theme;
+        (changes || []).forEach(function (change) {
+            var path = change[0], target = figure;
+            for (var i = 0; i < path.length - 1; i++) {
+                target = target[path[i]];
+            }
+            target[path[path.length - 1]] = change[1];
+        });
+        return figure;
+    }
+
+    function bins(summary, name, count) {
+        return range(count).map(function (i) { return summary[name + '_bin_' + i]; });
+    }
+
+    function fixed(value, digits) {
+        // Python's format(value, '.<digits>f'): toFixed() rounds exact ties up, Python to even. A tie
+        // is exactly representable only as an odd multiple of 2^-(digits + 1)
+        var half = value * Math.pow(2, digits + 1);
+        if (Number.isInteger(half) && Math.abs(half % 2) === 1) {
+            var lower = Math.floor(value * Math.pow(10, digits));
+            return ((Math.abs(lower % 2) === 1 ? lower + 1 : lower) / Math.pow(10, digits)).toFixed(digits);
+        }
+        return Number(value).toFixed(digits);
+    }
+
+    function grouped(value) {
+        return fixed(value, 0).replace(/\B(?=(\d{3})+(?!\d))/g, ',');
+    }
+
+    function topBars(data, name, pairs, limit) {
+        // _top_bars(): largest first, equal counts by label
+        pairs = pairs.slice().sort(function (a, b) {
+            return b[1] - a[1] || (a[0] < b[0] ? -1 : a[0] > b[0] ? 1 : 0);
+        });
+        if (limit) {
+            pairs = pairs.slice(0, limit);
+        }
+        return fill(data, name, [[['data', 0, 'x'], pairs.map(function (pair) { return pair[0]; })],
+                                 [['data', 0, 'y'], pairs.map(function (pair) { return pair[1]; })]]);
+    }
+
+    function kpiCards(summary) {
+        var style = {'width': '15%', 'display': 'inline-block', 'textAlign': 'center',
+                     'border': '1px solid #ddd', 'margin': '5px', 'padding': '10px'};
+        var cards = [['both', 'Both Eval & Club'], ['only_eval', 'Only Evaluation'], ['only_club', 'Only Club'],
+                     ['eval_low', 'Low Eval Rate (≤5%)'], ['club_low', 'Low Club Rate (≤5%)'],
+                     ['both_low', 'Both Rates Low (≤5%)']];
+        return html('Div', {children: cards.map(function (card) {
+            return html('Div', {className: 'kpi-card', style: style, children: [
+                html('H3', {children: String(summary[card[0]])}),
+                html('P', {children: card[1]})
+            ]});
+        })});
+    }
+
+    function tenureBin(value) {
+        if (value <= 30) { return '0-30'; }
+        if (value <= 60) { return '31-60'; }
+        if (value <= 90) { return '61-90'; }
+        if (value <= 180) { return '91-180'; }
+        if (value <= 365) { return '181-365'; }
+        return '365+';
+    }
+
+    // Same order and outputs as SECTIONS in dashboard.py
+    function render(data, s) {
+        var outputs = [kpiCards(s)];
+        outputs.push(s.eval_rows > 0 ? topBars(data, 'city-eval', s.city_eval, 10) : fill(data, 'no-evaluation'));
+        outputs.push(s.club_rows > 0 ? topBars(data, 'city-club', s.city_club, 10) : fill(data, 'no-club'));
+        outputs.push(s.both > 0 ? topBars(data, 'salesperson', s.salesman_deactive, 10) : fill(data, 'no-both'));
+        outputs.push(s.both > 0
+            ? fill(data, 'deactive-pie', [[['data', 0, 'values'],
+                                           [s.only_deactive_eval, s.only_deactive_club, s.both_low, s.active_both]]])
+            : fill(data, 'no-data-pie'));
+        outputs.push(s.eval_rows > 0 ? topBars(data, 'status-eval', s.status_eval) : fill(data, 'no-evaluation'));
+        outputs.push(s.club_rows > 0 ? topBars(data, 'status-club', s.status_club) : fill(data, 'no-club'));
+        outputs.push(s.orders_rows > 0 ? fill(data, 'orders-per-day', [
+            [['data', 0, 'y'], bins(s, 'orders', ORDER_BINS)],
+            [['layout', 'annotations', 0, 'text'], "<b style='color:red'>AVG: " + fixed(s.orders_per_day_mean, 1) + '</b>'],
+            [['layout', 'annotations', 1, 'text'], "<b style='color:blue'>MEDIAN: " + fixed(s.orders_per_day_q50, 1) + '</b>']
+        ]) : fill(data, 'no-orders'));
+        outputs.push(s.revenue_rows > 0 ? fill(data, 'revenue-per-day', [
+            [['data', 0, 'text'], [s.revenue_per_day_mean, s.revenue_per_day_q25, s.revenue_per_day_q50,
+                                   s.revenue_per_day_q75].map(function (value) { return '<b>' + grouped(value) + '</b>'; })]
+        ]) : fill(data, 'no-revenue'));
+        outputs.push(s.subscription_count > 0 ? fill(data, 'subscription', [
+            [['data', 0, 'y'], bins(s, 'subscription', SUBSCRIPTION_BINS)],
+            [['layout', 'annotations', 0, 'text'], "<b style='color:red'>AVERAGE: " + fixed(s.subscription_mean * 100, 1) + '%</b>'],
+            [['layout', 'annotations', 1, 'text'], "<b style='color:blue'>MEDIAN: " + fixed(s.subscription_q50 * 100, 1) + '%</b>']
+        ]) : fill(data, 'no-subscription'));
+        outputs.push(fill(data, 'negative-charge', [[['data', 0, 'values'], bins(s, 'neg', data.day_buckets)]]));
+        outputs.push(fill(data, 'no-data-days', [[['data', 0, 'values'], bins(s, 'nodata', data.day_buckets)]]));
+        if (s.tenure_count > 0) {
+            outputs.push(fill(data, 'tenure', [
+                [['data', 0, 'y'], bins(s, 'tenure', TENURE_BINS)],
+                [['layout', 'annotations', 0, 'text'], "<b style='color:red'>AVERAGE: " + fixed(s.tenure_mean, 0) + ' days</b>'],
+                [['layout', 'annotations', 1, 'text'], "<b style='color:blue'>MEDIAN: " + fixed(s.tenure_q50, 0) + ' days</b>'],
+                [['layout', 'annotations', 2, 'text'], "<b style='color:green'>75th %: " + fixed(s.tenure_q75, 0) + ' days</b>'],
+                [['layout', 'annotations', 3, 'text'], '<b>Summary:</b> Avg falls in ' + tenureBin(s.tenure_mean)
+                    + ' bin | Median falls in ' + tenureBin(s.tenure_q50) + ' bin | 75% falls in '
+                    + tenureBin(s.tenure_q75) + ' bin']
+            ]));
+        } else {
+            outputs.push(fill(data, 'no-tenure'));
+        }
+        return outputs;
+    }
+
+    // dropdown_options() in dashboard.py: the values of dims[position] with rows under the other
+    // dropdowns' selection, most rows first (ties in dropdown order), matching `search`, with counts
+    function dropdownOptions(data, position, selection, search, current) {
+        var cells = data.cells, dims = data.dimensions, dim = dims[position];
+        var wanted = dims.map(function (other, i) {
+            return i === position || selection[i] === 'All' ? null : data.values[other].indexOf(selection[i]);
+        });
+        var counts = {}, total = 0;
+        if (wanted.indexOf(-1) === -1) {
+            for (var i = 0; i < cells[dim].length; i++) {
+                var selected = dims.every(function (other, j) {
+                    return wanted[j] === null || cells[other][i] === wanted[j];
+                });
+                if (!selected) {
+                    continue;
+                }
+                total += cells.rows[i];
+                if (cells[dim][i] >= 0) {
+                    counts[cells[dim][i]] = (counts[cells[dim][i]] || 0) + cells.rows[i];
+                }
+            }
+        }
+        var needle = search ? String(search).toLowerCase() : null;
+        var codes = Object.keys(counts).map(Number).filter(function (code) {
+            return !needle || String(data.values[dim][code]).toLowerCase().indexOf(needle) !== -1;
+        }).sort(function (a, b) {
+            return counts[b] - counts[a] || data.first_seen[dim][a] - data.first_seen[dim][b];
+        });
+        if (data.option_limit) {
+            codes = codes.slice(0, data.option_limit);
+        }
+        var options = [{label: 'All (' + total + ')', value: 'All'}].concat(codes.map(function (code) {
+            return {label: data.values[dim][code] + ' (' + counts[code] + ')', value: data.values[dim][code]};
+        }));
+        if (current !== 'All' && !options.some(function (option) { return option.value === current; })) {
+            options.push({label: String(current), value: current});
+        }
+        return options;
+    }
+
+    var notactive = {
+        update_dashboard: function (data, salesperson, city, status) {
+            if (!data) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            var selection = [salesperson, city, status];
+            return render(data, summarize(data, selection) || emptySummary(data));
+        }
+    };
+    // <dim>_options(data, <the other two dropdowns in dimension order>, search, current)
+    ['salesman', 'city', 'BranchStatus'].forEach(function (dim, position) {
+        notactive[dim + '_options'] = function (data, first, second, search, current) {
+            if (!data) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            var others = [first, second], selection = [];
+            for (var i = 0; i < 3; i++) {
+                selection.push(i === position ? 'All' : others.shift());
+            }
+            return dropdownOptions(data, position, selection, search, current);
+        };
+    });
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {notactive: notactive});
+})();
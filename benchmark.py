@@ -0,0 +1,565 @@
+import argparse
+import atexit
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from cooccurrence import CooccurrenceIndex
+from cube import Cube, DIMENSIONS, SUMMARY_COLUMNS, filter_branches, deactive_flags, deactive_counts, grouped_charts, TENURE_COLUMN
+from datastore import build_snapshot
+from figures import FigureData
+from history import HistoryStore
+from loader import normalize_branches
+from plotly.io.json import to_json_plotly
+from rowindex import RowIndex
+from sketch import k_for_error
+from sqlsource import write_database
+
+
+# Imported by load_dashboard(): importing it loads NOTACTIVE_PATH and may start background threads
+dashboard = None
+
+# Rows of the synthetic workbook the dashboard serves when NOTACTIVE_PATH isn't set
+SERVED_ROWS = 5_000
+
+# BranchStatus values and their share of rows in notActive.xlsx
+STATUS_SHARES = [0.755, 0.078, 0.047, 0.043, 0.023, 0.017, 0.016, 0.008, 0.006, 0.005, 0.002]
+
+
+def synthetic_branches(rows, salesmen=None, cities=None, seed=0, part=None):
+    # Random frame with the real notActive.xlsx columns and value distributions. Cardinalities grow
+    # with the row count the way regional exports do: a few hundred cities at most, one house
+    # account selling everywhere and every other salesman covering one to four home cities.
+    # Parts of one export share `seed`, cardinalities and territories but draw their own rows.
+    salesmen = salesmen or int(np.clip(np.sqrt(rows) / 2, 40, 2000))
+    cities = cities or int(np.clip(rows ** 0.4, 25, 1000))
+    territories = np.random.default_rng(seed)
+    rng = np.random.default_rng(seed if part is None else [seed, part])
+    today = pd.Timestamp.now().normalize()
+
+    # City sizes are heavy-tailed: the largest holds over half the branches
+    city_weights = 1.0 / np.arange(1, cities + 1) ** 1.3
+    city_weights /= city_weights.sum()
+    home_cities = territories.choice(cities, size=(salesmen, 4), p=city_weights)
+    territory = territories.integers(1, 5, salesmen)
+    salesman = np.where(rng.random(rows) < 0.3, 0, rng.integers(1, salesmen, rows))
+    city = np.where(salesman == 0, rng.choice(cities, size=rows, p=city_weights),
+                    home_cities[salesman, rng.integers(0, 4, rows) % territory[salesman]])
+
+    def maybe_zero(values, share):
+        return np.where(rng.random(rows) < share, 0, values)
+
+    def maybe_missing(values, share):
+        return np.where(rng.random(rows) < share, np.nan, values)
+
+    f_days = np.where(rng.random(rows) < 0.71, 14, rng.integers(0, 14, rows))
+    f_days = np.where(rng.random(rows) < 0.17, 0, f_days)
+    days_since_facture = np.select([rng.random(rows) < 0.6, rng.random(rows) < 0.5],
+                                   [rng.integers(0, 8, rows), rng.integers(8, 31, rows)],
+                                   rng.integers(31, 400, rows))
+    frame = pd.DataFrame({
+        'salesman': np.array(['salesman %d' % i for i in range(salesmen)], dtype=object)[salesman],
+        'city': np.array(['city %d' % i for i in range(cities)], dtype=object)[city],
+        'BranchStatus': np.array(['status %d' % i for i in range(len(STATUS_SHARES))], dtype=object)[
+            rng.choice(len(STATUS_SHARES), size=rows, p=np.array(STATUS_SHARES) / sum(STATUS_SHARES))],
+        'SmartEvaluation': (rng.random(rows) < 0.86).astype('int64'),
+        'SmartClub': (rng.random(rows) < 0.89).astype('int64'),
+        'eval_ratio': maybe_missing(maybe_zero(rng.beta(0.8, 2.5, rows), 0.3), 0.14),
+        'Club_ratio': maybe_missing(maybe_zero(rng.exponential(0.3, rows), 0.9), 0.11),
+        'orderCount': maybe_zero(rng.lognormal(6.2, 1.2, rows).astype('int64'), 0.15),
+        'fDays': f_days,
+        'revenue': maybe_zero(rng.lognormal(20, 1.3, rows), 0.15),
+        'subscription': rng.beta(2.0, 1.2, rows),
+        'HowManydayschargeisNegetive': maybe_zero(rng.exponential(100, rows).astype('int64'), 0.5),
+        'lastfacture': today - pd.to_timedelta(days_since_facture * 86400 + rng.integers(0, 86400, rows), unit='s'),
+        TENURE_COLUMN: np.clip(rng.lognormal(6.5, 0.8, rows), 60, 3080).astype('int64'),
+    })
+    frame['how_many_days_with_nodata'] = (pd.Timestamp.now() - frame['lastfacture']).dt.days
+    return frame
+
+
+def write_synthetic(path, rows, part_rows=500_000, seed=0):
+    # synthetic_branches(rows) written to Parquet part by part, so the export is never held in memory
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    salesmen = int(np.clip(np.sqrt(rows) / 2, 40, 2000))
+    cities = int(np.clip(rows ** 0.4, 25, 1000))
+    writer = None
+    try:
+        for part, start in enumerate(range(0, rows, part_rows)):
+            frame = synthetic_branches(min(part_rows, rows - start), salesmen, cities, seed, part)
+            table = pa.Table.from_pandas(frame.drop(columns=['how_many_days_with_nodata']), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def load_dashboard():
+    # Import the dashboard without its reloader and warm-up threads. Unless NOTACTIVE_PATH names an
+    # export to serve, it serves a synthetic workbook in a temporary directory (with its snapshot
+    # cache), so the benchmark runs from any directory. Cases run in subprocesses inherit both.
+    global dashboard
+    os.environ.setdefault('NOTACTIVE_START_RELOADER', '0')
+    os.environ.setdefault('NOTACTIVE_WARMUP', '0')
+    if 'NOTACTIVE_PATH' not in os.environ:
+        directory = tempfile.mkdtemp(prefix='notactive-benchmark-')
+        atexit.register(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'notActive.xlsx')
+        synthetic_branches(SERVED_ROWS).drop(columns=['how_many_days_with_nodata']).to_excel(path, index=False)
+        os.environ['NOTACTIVE_PATH'] = path
+        os.environ.setdefault('NOTACTIVE_CACHE_DIR', os.path.join(directory, 'cache'))
+    import dashboard as module
+    dashboard = module
+    return module
+
+
+def sample_selections(frame, count, seed=0):
+    values = [frame[dim].dropna().unique() for dim in DIMENSIONS]
+    return sample_options(dict(zip(DIMENSIONS, values)), count, seed)
+
+
+def sample_options(options, count, seed=0):
+    # All/All/All plus random dropdown combinations, each dropdown left at 'All' half of the time
+    rng = np.random.default_rng(seed)
+    selections = [('All', 'All', 'All')]
+    values = [options[dim] for dim in DIMENSIONS]
+    while len(selections) < count:
+        selections.append(tuple(rng.choice(options) if rng.random() < 0.5 else 'All' for options in values))
+    return selections
+
+
+def time_calls(fn, selections):
+    latencies = []
+    for selection in selections:
+        start = time.perf_counter()
+        fn(*selection)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def report(name, latencies):
+    print('%-24s mean %9.2f ms   p50 %9.2f ms   max %9.2f ms'
+          % (name, latencies.mean(), np.median(latencies), latencies.max()))
+
+
+def grouped_charts_lambdas(filtered_df):
+    # The five grouped charts as update_dashboard computed them before deactive_counts()
+    eval_branches = filtered_df[filtered_df['SmartEvaluation'] == 1]
+    club_branches = filtered_df[filtered_df['SmartClub'] == 1]
+    both_eval_club_f = filtered_df[(filtered_df['SmartEvaluation'] == 1) & (filtered_df['SmartClub'] == 1)]
+    sales_deactive = both_eval_club_f.groupby('salesman', observed=True).agg({
+        'eval_ratio': lambda x: (x <= 0.05).sum(),
+        'Club_ratio': lambda x: (x <= 0.05).sum()
+    })
+    return {
+        'city_eval': eval_branches.groupby('city', observed=True).agg({'eval_ratio': lambda x: (x <= 0.05).sum()})['eval_ratio'],
+        'city_club': club_branches.groupby('city', observed=True).agg({'Club_ratio': lambda x: (x <= 0.05).sum()})['Club_ratio'],
+        'salesman_deactive': sales_deactive['eval_ratio'] + sales_deactive['Club_ratio'],
+        'status_eval': eval_branches.groupby('BranchStatus', observed=True).agg({'eval_ratio': lambda x: (x <= 0.05).sum()})['eval_ratio'],
+        'status_club': club_branches.groupby('BranchStatus', observed=True).agg({'Club_ratio': lambda x: (x <= 0.05).sum()})['Club_ratio'],
+    }
+
+
+def grouped_charts_flags(filtered_df):
+    flags = deactive_flags(filtered_df)
+    return grouped_charts({dim: deactive_counts(flags, dim) for dim in DIMENSIONS})
+
+
+def check_grouped(frame, selections):
+    # deactive_counts() must reproduce the lambda aggregation exactly, then compare their speed
+    for selection in selections:
+        filtered_df = filter_branches(frame, *selection)
+        expected = grouped_charts_lambdas(filtered_df)
+        actual = grouped_charts_flags(filtered_df)
+        for name, series in expected.items():
+            assert list(series.index) == list(actual[name].index), (selection, name)
+            assert list(series.to_numpy()) == list(actual[name].to_numpy()), (selection, name)
+    print('grouped charts identical for %d selections' % len(selections))
+
+    report('grouped, lambdas', time_calls(lambda *s: grouped_charts_lambdas(filter_branches(frame, *s)), selections))
+    report('grouped, flags', time_calls(lambda *s: grouped_charts_flags(filter_branches(frame, *s)), selections))
+
+
+def interaction_sequence(options, count, seed=0):
+    # Dropdown states of a user changing one dropdown at a time, starting from All/All/All
+    rng = np.random.default_rng(seed)
+    selection = ['All', 'All', 'All']
+    sequence = [tuple(selection)]
+    while len(sequence) < count:
+        position = rng.integers(0, len(DIMENSIONS))
+        values = ['All'] + list(options[DIMENSIONS[position]])
+        selection[position] = values[rng.integers(0, len(values))]
+        sequence.append(tuple(selection))
+    return sequence
+
+
+def section_request(output_id, prop, selection, previous):
+    # Body the browser posts to /_dash-update-component for one section callback
+    return {
+        'output': '..%s.%s...%s-signature.data..' % (output_id, prop, output_id),
+        'outputs': [{'id': output_id, 'property': prop}, {'id': output_id + '-signature', 'property': 'data'}],
+        'inputs': [{'id': component, 'property': 'value', 'value': value}
+                   for component, value in zip(['salesperson-dropdown', 'city-dropdown', 'status-dropdown'], selection)]
+                  + [{'id': 'as-of-date', 'property': 'date', 'value': None}],
+        'changedPropIds': ['salesperson-dropdown.value'],
+        'state': [{'id': output_id + '-signature', 'property': 'data', 'value': previous}],
+    }
+
+
+def measure_payloads(count):
+    # Response bytes and server time per dropdown change through the real callbacks, whole figures vs patches
+    client = dashboard.app.server.test_client()
+    sequence = interaction_sequence(dashboard.store.current().options, count)
+    for name, patch in [('whole figures', False), ('patches', True)]:
+        dashboard.PATCH_FIGURES = patch
+        dashboard.result_cache.clear()
+        dashboard.summary_cache.clear()
+        shown = {}
+        sizes, latencies = [], []
+        for selection in sequence:
+            size = 0
+            start = time.perf_counter()
+            for output_id, prop, _, _ in dashboard.SECTIONS:
+                response = client.post('/_dash-update-component',
+                                       json=section_request(output_id, prop, selection, shown.get(output_id)))
+                size += len(response.data)
+                updated = response.get_json()['response'] if response.status_code == 200 else {}
+                if output_id + '-signature' in updated:
+                    shown[output_id] = updated[output_id + '-signature']['data']
+            latencies.append(time.perf_counter() - start)
+            sizes.append(size)
+        # The first interaction always sends whole figures, later ones show the difference
+        sizes, latencies = np.array(sizes[1:]), np.array(latencies[1:]) * 1000
+        print('%-14s %9.1f KB / interaction   mean %7.2f ms   p50 %7.2f ms'
+              % (name, sizes.mean() / 1024, latencies.mean(), np.median(latencies)))
+
+    # Serialisation alone, for every section output of the same interactions
+    outputs = [dashboard.render_section(dashboard.store.current(), index, *selection)
+               for selection in sequence for index in range(len(dashboard.SECTIONS))]
+    figures = [output for output in outputs if isinstance(output, FigureData)]
+    for name, encode in [('whole figures', lambda output: output.figure()),
+                         ('patches', lambda output: output.patch().to_plotly_json())]:
+        start = time.perf_counter()
+        size = sum(len(to_json_plotly(encode(output))) for output in figures)
+        seconds = time.perf_counter() - start
+        print('%-14s serialise %7.3f ms / figure   %8.1f bytes / figure'
+              % (name, seconds / len(figures) * 1000, size / len(figures)))
+
+
+# Row counts and ingest modes of the --suite runs
+SUITE_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+SUITE_MODES = ['cube', 'index', 'sketch', 'stream', 'sql']
+
+
+def _peak_rss_mb():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_case(rows, mode, selections):
+    # One suite case in this process: startup (load and derive the snapshot), every sampled
+    # selection's full callback (summary, all sections, JSON) and peak memory
+    result = {'rows': rows, 'mode': mode}
+    today = datetime.now()
+    # The SQL backend keeps querying its database file until the case is done
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        if mode == 'stream':
+            path = os.path.join(directory, 'notActive.parquet')
+            write_synthetic(path, rows)
+        else:
+            frame = synthetic_branches(rows)
+        result['generate_seconds'] = time.perf_counter() - start
+        result['rss_before_startup_mb'] = _peak_rss_mb()
+
+        start = time.perf_counter()
+        if mode == 'stream':
+            snapshot = build_snapshot(path, 1, today, None, stream=True, sketch_k=k_for_error(0.01))
+        elif mode == 'sql':
+            path = os.path.join(directory, 'notActive.sqlite')
+            write_database(normalize_branches(frame), path)
+            del frame
+            snapshot = build_snapshot(path, 1, today, None, backend='sql')
+        else:
+            frame = normalize_branches(frame)
+            snapshot = build_snapshot(None, 1, today, None, use_cube=mode != 'index', frame=frame,
+                                      sketch_k=k_for_error(0.01) if mode == 'sketch' else None)
+        result['startup_seconds'] = time.perf_counter() - start
+        if snapshot.frame is not None:
+            result['frame_mb'] = snapshot.frame.memory_usage(deep=True).sum() / 2 ** 20
+
+        callbacks = []
+        for selection in sample_options(snapshot.options, selections):
+            start = time.perf_counter()
+            summary = dashboard.summarize_snapshot(snapshot, *selection)
+            outputs = [dashboard.full_output(output) for output in dashboard.render_dashboard(summary)]
+            payload = to_json_plotly(outputs)
+            callbacks.append({'selection': list(selection), 'ms': (time.perf_counter() - start) * 1000,
+                              'bytes': len(payload)})
+    latencies = np.array([callback['ms'] for callback in callbacks])
+    result['callback_ms'] = {'mean': latencies.mean(), 'p50': np.percentile(latencies, 50),
+                             'p95': np.percentile(latencies, 95), 'p99': np.percentile(latencies, 99),
+                             'max': latencies.max()}
+    result['callbacks'] = callbacks
+    result['peak_rss_mb'] = _peak_rss_mb()
+    return result
+
+
+def run_suite(sizes, modes, selections, output):
+    # Every size x mode in a fresh interpreter, so timings and peak memory don't leak between cases
+    import platform
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    results = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'selections': selections,
+        'runs': [],
+    }
+    for rows in sizes:
+        for mode in modes:
+            completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--case', str(rows), mode,
+                                        '--selections', str(selections)],
+                                       capture_output=True, text=True,
+                                       env=dict(os.environ, NOTACTIVE_RELOAD_INTERVAL='0', NOTACTIVE_START_RELOADER='0',
+                                                NOTACTIVE_WARMUP='0'),
+                                       cwd=os.path.dirname(os.path.abspath(__file__)))
+            if completed.returncode == 0:
+                run = json.loads(completed.stdout.strip().splitlines()[-1])
+                print('%10d %-7s startup %8.2f s   callback p50 %8.2f ms   p95 %8.2f ms   peak RSS %8.1f MB'
+                      % (rows, mode, run['startup_seconds'], run['callback_ms']['p50'], run['callback_ms']['p95'],
+                         run['peak_rss_mb']), file=sys.stderr)
+            else:
+                # Usually the machine running out of memory at the largest sizes; keep going
+                run = {'rows': rows, 'mode': mode, 'error': completed.stderr.strip().splitlines()[-1:] or
+                       ['exit status %d' % completed.returncode]}
+                print('%10d %-7s failed: %s' % (rows, mode, run['error'][0]), file=sys.stderr)
+            results['runs'].append(run)
+    text = json.dumps(results, indent=2, default=float)
+    if output:
+        with open(output, 'w') as output_file:
+            output_file.write(text + '\n')
+    else:
+        print(text)
+
+
+STARTUP_CODE = {
+    'read_excel': "import pandas as pd; frame = pd.read_excel(path)",
+    'loader': "from loader import load_branches; frame = load_branches(path)",
+}
+
+
+def measure_startup(path):
+    # Load the workbook in fresh interpreters: plain read_excel, loader without and with a snapshot
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, NOTACTIVE_CACHE_DIR=cache_dir)
+        for name, mode in [('read_excel', 'read_excel'), ('loader, cold', 'loader'), ('loader, snapshot', 'loader')]:
+            script = ('import json, resource, sys, time\n'
+                      'path = sys.argv[1]\n'
+                      'start = time.perf_counter()\n'
+                      '%s\n'
+                      'print(json.dumps({"seconds": time.perf_counter() - start,\n'
+                      '                  "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,\n'
+                      '                  "frame_bytes": int(frame.memory_usage(deep=True).sum())}))'
+                      % STARTUP_CODE[mode])
+            output = subprocess.run([sys.executable, '-c', script, path], env=env, check=True,
+                                    capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+            print('%-18s %8.2f s   max RSS %7.1f MB   frame %7.1f MB'
+                  % (name, result['seconds'], result['maxrss_kb'] / 1024, result['frame_bytes'] / 2 ** 20))
+
+
+def measure_workers(frame, worker_counts, repeats=5):
+    # Rescan latency of the largest slices (everything, and each dropdown's most common value) with
+    # the summary parts run on pools of each size; only scales with as many free cores
+    index = RowIndex(frame)
+    selections = [('All', 'All', 'All')]
+    for position, dim in enumerate(DIMENSIONS):
+        selection = ['All'] * len(DIMENSIONS)
+        selection[position] = frame[dim].value_counts().index[0]
+        selections.append(tuple(selection))
+    slices = [index.take(frame, index.select(*selection), SUMMARY_COLUMNS) for selection in selections]
+    print('%d cores, slices of %s rows' % (os.cpu_count(), ', '.join(str(len(rows)) for rows in slices)))
+
+    baseline = None
+    for workers in worker_counts:
+        pool = ThreadPoolExecutor(workers) if workers > 1 else None
+        latencies = time_calls(lambda position: dashboard.summarize_branches(slices[position], pool),
+                               [(position,) for position in range(len(slices))] * repeats)
+        if pool is not None:
+            pool.shutdown()
+        baseline = baseline or latencies.mean()
+        report('%d worker(s)' % workers, latencies)
+        print('%24s speedup %.2fx' % ('', baseline / latencies.mean()))
+
+
+def measure_options(frame, selections):
+    # Dependent dropdown options (each dimension's values under the other two dropdowns' selection,
+    # most rows first, NOTACTIVE_OPTION_LIMIT of them) from a filtered value_counts() over the rows and
+    # from the CooccurrenceIndex
+    options = {dim: list(frame[dim].dropna().unique()) for dim in DIMENSIONS}
+    start = time.perf_counter()
+    cooccurrence = CooccurrenceIndex.from_frame(frame, options)
+    print('co-occurrence index build: %.2f s, %d combinations' % (time.perf_counter() - start, len(cooccurrence.rows)))
+    index = RowIndex(frame)
+    calls = [(dim, dict(zip(DIMENSIONS, selection))) for selection in selections for dim in DIMENSIONS]
+
+    def scan(dim, selection):
+        others = [selection[other] if other != dim else 'All' for other in DIMENSIONS]
+        return RowIndex.take(frame, index.select(*others), [dim])[dim].value_counts().head(dashboard.OPTION_LIMIT)
+
+    def indexed(dim, selection):
+        return cooccurrence.options(dim, selection, limit=dashboard.OPTION_LIMIT)
+
+    scan_latencies = time_calls(scan, calls)
+    indexed_latencies = time_calls(indexed, calls)
+    report('value_counts', scan_latencies)
+    report('co-occurrence', indexed_latencies)
+    print('%24s speedup %.1fx' % ('', scan_latencies.mean() / indexed_latencies.mean()))
+
+
+def measure_history(frame, exports, queries=20):
+    # Record the same load as `exports` successive export dates, then time trend queries of random
+    # members against the rollup (first read of a member, then cached) and against the raw files
+    snapshot = build_snapshot(None, 1, datetime.now(), (0, 0), frame=frame)
+    members = [('', None)] + [(dim, value) for dim in DIMENSIONS for value in snapshot.options[dim]]
+    rng = np.random.default_rng(0)
+    picked = [members[i] for i in rng.choice(len(members), min(queries, len(members)), replace=False)]
+    with tempfile.TemporaryDirectory() as directory:
+        store = HistoryStore(directory)
+        first = pd.Timestamp('2020-01-01').date()
+        start = time.perf_counter()
+        for day in range(exports):
+            snapshot.signature = (day, 0)
+            store.record(snapshot, first + pd.Timedelta(days=day))
+        elapsed = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+        print('%d exports of %d members recorded in %.1f s (%.2f s each), %.1f MB on disk'
+              % (exports, len(members), elapsed, elapsed / exports, size / 1e6))
+        store = HistoryStore(directory)
+        report('trend, first read', time_calls(store.trend, picked))
+        report('trend, cached', time_calls(store.trend, picked))
+        report('trend, raw files', time_calls(lambda level, value: store.trend(level, value, ['eval_deactive', 'tenure_q50']),
+                                              picked[:3]))
+
+
+def measure_memory(path):
+    # Bytes per row of the served frame (derived column included) as loaded by default and lean
+    today = datetime.now()
+    signature = (0, 0)
+    baseline = None
+    for name, lean, float32 in [('default', False, False), ('lean', True, False), ('lean, float32', True, True)]:
+        frame = build_snapshot(path, 1, today, signature, use_cube=False, lean=lean, float32=float32).frame
+        per_row = frame.memory_usage(deep=True).sum() / max(len(frame), 1)
+        baseline = baseline or per_row
+        print('%-14s %3d columns   %8.1f bytes/row   %5.1f%%' % (name, len(frame.columns), per_row,
+                                                               per_row / baseline * 100))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark update_dashboard on a synthetic frame')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--selections', type=int, default=20)
+    parser.add_argument('--grouped', action='store_true',
+                        help='only compare the grouped chart aggregations against the lambda version')
+    parser.add_argument('--payload', action='store_true',
+                        help='only measure response bytes and serialisation per interaction on the served workbook '
+                             '(NOTACTIVE_PATH, or a synthetic one)')
+    parser.add_argument('--suite', action='store_true',
+                        help='only run every --sizes x --modes case in its own process and write JSON results')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in SUITE_SIZES),
+                        help='comma separated row counts for --suite')
+    parser.add_argument('--modes', default=','.join(SUITE_MODES), help='comma separated ingest modes for --suite')
+    parser.add_argument('--output', help='file for the --suite JSON (default: stdout)')
+    parser.add_argument('--case', nargs=2, metavar=('ROWS', 'MODE'), help=argparse.SUPPRESS)
+    parser.add_argument('--workers', metavar='COUNTS',
+                        help='only compare rescan latency of large slices across comma separated pool sizes')
+    parser.add_argument('--options', metavar='SALESMEN,CITIES',
+                        help='only compare dependent dropdown options from the rows and from the co-occurrence index')
+    parser.add_argument('--history', type=int, metavar='EXPORTS',
+                        help='only time trend queries over EXPORTS recorded exports of the synthetic frame')
+    parser.add_argument('--memory', metavar='WORKBOOK',
+                        help='only report bytes per row of WORKBOOK loaded by default, lean and with float32 ratios')
+    parser.add_argument('--startup', metavar='WORKBOOK',
+                        help='only measure load time and memory of WORKBOOK with and without the snapshot cache')
+    args = parser.parse_args()
+
+    if args.startup:
+        measure_startup(args.startup)
+        return
+    if args.memory:
+        measure_memory(args.memory)
+        return
+    load_dashboard()
+    if args.case:
+        print(json.dumps(run_case(int(args.case[0]), args.case[1], args.selections), default=float))
+        return
+    if args.suite:
+        run_suite([int(size) for size in args.sizes.split(',')], args.modes.split(','), args.selections, args.output)
+        return
+    if args.payload:
+        measure_payloads(args.selections)
+        return
+
+    salesmen, cities = [int(count) for count in args.options.split(',')] if args.options else (None, None)
+    frame = synthetic_branches(args.rows, salesmen, cities)
+    selections = sample_selections(frame, args.selections)
+    print('%d rows, %d selections' % (len(frame), len(selections)))
+    if args.grouped:
+        check_grouped(frame, selections)
+        return
+    if args.workers:
+        measure_workers(frame, [int(count) for count in args.workers.split(',')])
+        return
+    if args.options:
+        measure_options(frame, selections)
+        return
+    if args.history:
+        measure_history(frame, args.history)
+        return
+
+    start = time.perf_counter()
+    cube = Cube.build(frame)
+    print('cube build: %.2f s' % (time.perf_counter() - start))
+
+    start = time.perf_counter()
+    index = RowIndex(frame)
+    print('row index build: %.2f s' % (time.perf_counter() - start))
+
+    def scan(*selection):
+        return dashboard.summarize_branches(filter_branches(frame.copy(), *selection))
+
+    def indexed(*selection):
+        return dashboard.summarize_branches(index.take(frame, index.select(*selection), SUMMARY_COLUMNS))
+
+    scan_latencies = time_calls(scan, selections)
+    index_latencies = time_calls(indexed, selections)
+    cube_latencies = time_calls(cube.lookup, selections)
+    scan_callback = time_calls(lambda *selection: dashboard.render_dashboard(scan(*selection)), selections)
+    cube_callback = time_calls(lambda *selection: dashboard.render_dashboard(cube.lookup(*selection)), selections)
+
+    report('scan (before)', scan_latencies)
+    report('row index', index_latencies)
+    report('cube lookup (after)', cube_latencies)
+    report('callback, scan', scan_callback)
+    report('callback, cube', cube_callback)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class MemoryBackend:
+    # Per-process LRU with optional TTL
+
+    def __init__(self, maxsize=256, ttl=0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return _MISSING
+            stored_at, value = entry
+            if self.ttl and time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskBackend:
+    # Pickled entries in a directory shared by every worker process; file mtime doubles as LRU clock.
+    # Listing the directory costs a stat per entry, so it is only scanned once the entries counted at
+    # the last scan plus the sets since then exceed maxsize by `slack`; the directory can overshoot
+    # maxsize by up to `slack` entries per worker in between.
+
+    def __init__(self, directory, maxsize=256, ttl=0, slack=None):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.slack = slack if slack is not None else max(1, maxsize // 10)
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._estimate = len(self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '.pkl')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as entry_file:
+                stored_key, stored_at, value = pickle.load(entry_file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return _MISSING
+        if stored_key != key:
+            return _MISSING
+        if self.ttl and time.time() - stored_at > self.ttl:
+            self._remove(path)
+            return _MISSING
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value):
+        path = self._path(key)
+        tmp_path = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        with open(tmp_path, 'wb') as entry_file:
+            pickle.dump((key, time.time(), value), entry_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._estimate += 1  # an overwrite counts too: the estimate only errs high
+            if self._estimate <= self.maxsize + self.slack:
+                return
+            self._evict()
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith('.pkl'):
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.path))
+                    except OSError:
+                        pass
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        self._estimate = min(len(entries), self.maxsize)
+        if len(entries) <= self.maxsize:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.maxsize]:
+            if self._remove(path):
+                self.evictions += 1
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False  # another worker got there first
+
+    def clear(self):
+        with self._lock:
+            for _, path in self._entries():
+                self._remove(path)
+            self._estimate = 0
+
+    def __len__(self):
+        return len(self._entries())
+
+
+class ResultCache:
+    # Memoizes callback results keyed on the inputs plus the data version they were computed from
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def get_or_compute(self, key, compute):
+        if self.backend is None:
+            return compute()
+        value = self.backend.get(key)
+        if value is not _MISSING:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        # Concurrent misses on the same key wait for a single computation
+        with self._lock:
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+        with key_lock:
+            value = self.backend.get(key)
+            if value is not _MISSING:
+                with self._lock:
+                    self.hits += 1
+                return value
+            with self._lock:
+                self.misses += 1
+            try:
+                value = compute()
+                self.backend.set(key, value)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+        return value
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions if self.backend is not None else 0,
+            'size': len(self.backend) if self.backend is not None else 0,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+def make_cache(backend='memory', maxsize=256, ttl=0, directory=None):
+    # backend: 'memory' (per process), 'disk' (shared by all workers through `directory`) or 'none'
+    if backend == 'none':
+        return ResultCache(None)
+    if backend == 'disk':
+        return ResultCache(DiskBackend(directory or os.path.join('.cache', 'results'), maxsize, ttl))
+    if backend == 'memory':
+        return ResultCache(MemoryBackend(maxsize, ttl))
+    raise ValueError('Unknown cache backend %r' % backend)
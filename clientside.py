@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+from cube import (DIMENSIONS, COUNT_COLUMNS, SUM_COLUMNS, QUANTILE_COLUMNS, DAY_BUCKET_LABELS, row_measures,
+                  _aggregate, _day_buckets, _subsets)
+from figures import _TEMPLATES
+
+
+def _number(value):
+    # JSON has no NaN; the browser reads null back as NaN
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def _cell_measures(snapshot):
+    # Row measures with the no-data buckets as of the snapshot's date (a rolled snapshot keeps the
+    # frame, and with it the load day's how_many_days_with_nodata)
+    frame = snapshot.frame
+    measures = row_measures(frame)
+    days = (snapshot.today - frame['lastfacture']).dt.days
+    for i, mask in enumerate(_day_buckets(days)):
+        measures['nodata_bin_%d' % i] = mask.to_numpy(dtype='int64')
+    return measures
+
+
+def _quantiles(snapshot, measures):
+    # {salesman: {city: {status: [QUANTILE_COLUMNS]}}} for every selection the dropdowns can reach,
+    # 'All' standing in for an unfiltered dropdown. Quantiles don't add up, so unlike the counters
+    # they are shipped per selection: from the cube's levels, or aggregated here without a cube
+    cube = snapshot.cube
+    quantiles = {}
+    for fixed in _subsets():
+        if cube is not None and cube.sketches is not None:
+            rows = [(key, cube._sketch_quantiles(fixed, key)) for key in cube.members[fixed]]
+            rows = [(key, [values[name] for name in QUANTILE_COLUMNS]) for key, values in rows]
+        else:
+            table = cube.levels[fixed] if cube is not None else _aggregate(measures, list(fixed))
+            table = table[QUANTILE_COLUMNS]
+            keys = table.index if fixed else [()]
+            rows = zip(keys, table.to_numpy(dtype='float64').tolist())
+        for key, values in rows:
+            key = key if isinstance(key, tuple) else (key,)
+            selection = dict(zip(fixed, key))
+            node = quantiles
+            for dim in DIMENSIONS[:-1]:
+                node = node.setdefault(selection.get(dim, 'All'), {})
+            node[selection.get(DIMENSIONS[-1], 'All')] = [_number(value) for value in values]
+    return quantiles
+
+
+def client_dataset(snapshot, option_limit=0):
+    # Everything the browser needs to draw any selection without the server: additive counters per
+    # (salesman, city, BranchStatus) cell, quantiles per reachable selection and the figure templates.
+    #
+    # Cells are columnar; a dimension is stored as a code into `values[dim]`, which is sorted like the
+    # cube's group keys (-1 for a missing value, only ever counted under 'All'). `rows` counts the rows
+    # of a cell for the dropdown options, which list at most `option_limit` values (0: all)
+    measures = _cell_measures(snapshot)
+    table = measures[COUNT_COLUMNS + SUM_COLUMNS].assign(rows=1)
+    values = {}
+    first_seen = {}
+    for dim in DIMENSIONS:
+        values[dim] = sorted(measures[dim].dropna().unique())
+        table[dim] = pd.Categorical(measures[dim], categories=values[dim]).codes.astype('int64')
+        # Dropdown order of each value, which breaks ties between equally frequent options
+        ranks = {value: rank for rank, value in enumerate(snapshot.options[dim])}
+        first_seen[dim] = [ranks[value] for value in values[dim]]
+    cells = table.groupby(DIMENSIONS, sort=True)[COUNT_COLUMNS + SUM_COLUMNS + ['rows']].sum().reset_index()
+    columns = {dim: cells[dim].tolist() for dim in DIMENSIONS}
+    for name in COUNT_COLUMNS + ['rows']:
+        columns[name] = cells[name].astype('int64').tolist()
+    for name in SUM_COLUMNS:
+        columns[name] = [_number(value) for value in cells[name]]
+
+    # Every template carries the same Plotly theme; send it once
+    theme = None
+    templates = {}
+    for name, template in _TEMPLATES.items():
+        layout = dict(template.figure['layout'])
+        theme = layout.pop('template', theme)
+        templates[name] = dict(template.figure, layout=layout)
+
+    return {
+        'key': str(snapshot.key),
+        'dimensions': DIMENSIONS,
+        'values': values,
+        'first_seen': first_seen,
+        'option_limit': option_limit,
+        'cells': columns,
+        'quantiles': _quantiles(snapshot, measures),
+        'quantile_columns': QUANTILE_COLUMNS,
+        'day_buckets': len(DAY_BUCKET_LABELS),
+        'templates': templates,
+        'theme': theme,
+    }
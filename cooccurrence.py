@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from cube import DIMENSIONS
+from rowindex import RowIndex
+
+
+class CooccurrenceIndex:
+    # Row counts of every observed (salesman, city, BranchStatus) combination, for dropdowns that only
+    # offer the values still present under the other two dropdowns' selection.
+    #
+    # The combinations matching the other selections come from an inverted index over the combinations
+    # (not the rows), and one weighted bincount sums their rows per value, so the cost follows the
+    # number of distinct combinations whatever the number of rows.
+
+    def __init__(self, cells, options):
+        # cells: DIMENSIONS plus a 'rows' count per combination; options: the dropdown values per
+        # dimension in first-seen order, which breaks ties between equally frequent values
+        cells = pd.DataFrame({dim: pd.Categorical(cells[dim], categories=options[dim]) for dim in DIMENSIONS})\
+            .assign(rows=cells['rows'].to_numpy(dtype=np.int64))
+        self.rows = cells['rows'].to_numpy()
+        self._index = RowIndex(cells)
+        self._codes = {dim: cells[dim].cat.codes.to_numpy(dtype=np.int64) for dim in DIMENSIONS}
+        self._values = {dim: np.asarray(options[dim], dtype=object) for dim in DIMENSIONS}
+        self._lowered = {dim: pd.Series(options[dim], dtype=object).astype(str).str.lower() for dim in DIMENSIONS}
+
+    @classmethod
+    def from_frame(cls, frame, options):
+        cells = frame.groupby(DIMENSIONS, dropna=False, observed=True).size()
+        return cls(cells.rename('rows').reset_index(), options)
+
+    def combinations(self, dims):
+        # [(values, rows)] of every combination of `dims` (in DIMENSIONS order) that has rows, most rows first
+        dims = [dim for dim in DIMENSIONS if dim in dims]
+        if not dims:
+            return [((), int(self.rows.sum()))]
+        codes = pd.DataFrame({dim: self._codes[dim] for dim in dims}).assign(rows=self.rows)
+        codes = codes[(codes[dims] >= 0).all(axis=1)]
+        totals = codes.groupby(dims, sort=True)['rows'].sum().sort_values(ascending=False, kind='stable')
+        keys = totals.index if len(dims) > 1 else [(code,) for code in totals.index]
+        return [(tuple(self._values[dim][code] for dim, code in zip(dims, key)), int(rows))
+                for key, rows in zip(keys, totals)]
+
+    def options(self, dim, selection, search=None, limit=None):
+        # [(value, rows)] of `dim` under the other dimensions' selection ({dim: value or 'All'}), most
+        # rows first, only values containing `search` (case-insensitive) and at most `limit` of them;
+        # plus the number of rows the other dimensions select
+        others = [selection.get(other, 'All') if other != dim else 'All' for other in DIMENSIONS]
+        positions = self._index.select(*others)
+        codes, rows = self._codes[dim], self.rows
+        if positions is not None:
+            codes, rows = codes[positions], rows[positions]
+        present = codes >= 0  # missing values are only ever counted under 'All'
+        counts = np.bincount(codes[present], weights=rows[present], minlength=len(self._values[dim]))
+
+        candidates = np.flatnonzero(counts)
+        if search:
+            matches = self._lowered[dim].str.contains(search.lower(), regex=False).to_numpy()
+            candidates = candidates[matches[candidates]]
+        candidates = candidates[np.argsort(-counts[candidates], kind='stable')]
+        if limit:
+            candidates = candidates[:limit]
+        return [(self._values[dim][code], int(counts[code])) for code in candidates], int(rows.sum())
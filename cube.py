@@ -0,0 +1,363 @@
+import itertools
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from sketch import KllSketch
+
+# Filter dimensions, in dropdown order
+DIMENSIONS = ['salesman', 'city', 'BranchStatus']
+
+# Evaluation / club ratio at or below this is counted as deactive
+DEACTIVE_THRESHOLD = 0.05
+
+TENURE_COLUMN = 'client_tenure_days'
+
+# Custom histogram bins (left-closed, as used with pd.cut(right=False))
+ORDER_BINS = [0, 101, 201, 301, 501, float('inf')]
+ORDER_LABELS = ['0-100', '101-200', '201-300', '301-500', '500+']
+SUBSCRIPTION_BINS = [0, 0.5, 0.7, 0.9, float('inf')]
+SUBSCRIPTION_LABELS = ['0-50%', '50-70%', '70-90%', '90%+']
+TENURE_BINS = [0, 31, 61, 91, 181, 366, float('inf')]
+TENURE_LABELS = ['0-30', '31-60', '61-90', '91-180', '181-365', '365+']
+DAY_BUCKET_LABELS = ['0 days', '1-7 days', '8-30 days', '30+ days']
+
+# Columns the dashboard summaries read
+SUMMARY_COLUMNS = DIMENSIONS + [
+    'SmartEvaluation', 'SmartClub', 'eval_ratio', 'Club_ratio', 'orderCount', 'fDays', 'revenue',
+    'subscription', 'HowManydayschargeisNegetive', 'how_many_days_with_nodata', TENURE_COLUMN,
+]
+
+# Per-row metrics whose statistics (mean and quantiles) are shown on the charts
+METRICS = ['orders_per_day', 'revenue_per_day', 'subscription', 'tenure']
+QUANTILES = [0.25, 0.5, 0.75]
+
+# Additive per-row counters; every KPI, pie slice and grouped chart is a sum of these
+COUNT_COLUMNS = [
+    'both', 'only_eval', 'only_club', 'eval_low', 'club_low', 'both_low',
+    'only_deactive_eval', 'only_deactive_club', 'active_both',
+    'eval_rows', 'eval_deactive', 'club_rows', 'club_deactive',
+    'orders_rows', 'revenue_rows',
+] + ['orders_bin_%d' % i for i in range(len(ORDER_LABELS))] \
+  + ['subscription_bin_%d' % i for i in range(len(SUBSCRIPTION_LABELS))] \
+  + ['tenure_bin_%d' % i for i in range(len(TENURE_LABELS))] \
+  + ['neg_bin_%d' % i for i in range(len(DAY_BUCKET_LABELS))] \
+  + ['nodata_bin_%d' % i for i in range(len(DAY_BUCKET_LABELS))] \
+  + ['%s_count' % m for m in METRICS]
+
+# Counters behind the city, salesman and BranchStatus charts
+DEACTIVE_COLUMNS = ['both', 'eval_low', 'club_low', 'eval_rows', 'eval_deactive', 'club_rows', 'club_deactive']
+
+SUM_COLUMNS = ['%s_sum' % m for m in METRICS]
+
+QUANTILE_COLUMNS = ['%s_q%d' % (m, int(q * 100)) for m in METRICS for q in QUANTILES]
+
+
+def filter_branches(frame, selected_salesperson, selected_city, selected_status):
+    filtered_df = frame
+    if selected_salesperson != 'All':
+        filtered_df = filtered_df[filtered_df['salesman'] == selected_salesperson]
+    if selected_city != 'All':
+        filtered_df = filtered_df[filtered_df['city'] == selected_city]
+    if selected_status != 'All':
+        filtered_df = filtered_df[filtered_df['BranchStatus'] == selected_status]
+    return filtered_df
+
+
+def _bin_codes(values, bins):
+    # Same bucketing as pd.cut(values, bins, right=False); -1 for values outside every bin
+    codes = np.searchsorted(np.asarray(bins), values, side='right') - 1
+    codes[np.isnan(values) | (codes >= len(bins) - 1)] = -1
+    return codes
+
+
+def _day_buckets(days):
+    return [days == 0, (days > 0) & (days <= 7), (days >= 8) & (days <= 30), days > 30]
+
+
+def row_measures(frame):
+    # One row per branch with integer counters, metric sums and the raw metric values
+    eval_on = frame['SmartEvaluation'] == 1
+    club_on = frame['SmartClub'] == 1
+    eval_low = frame['eval_ratio'] <= DEACTIVE_THRESHOLD
+    club_low = frame['Club_ratio'] <= DEACTIVE_THRESHOLD
+    eval_high = frame['eval_ratio'] > DEACTIVE_THRESHOLD
+    club_high = frame['Club_ratio'] > DEACTIVE_THRESHOLD
+    both = eval_on & club_on
+
+    columns = {
+        'both': both,
+        'only_eval': eval_on & (frame['SmartClub'] == 0),
+        'only_club': club_on & (frame['SmartEvaluation'] == 0),
+        'eval_low': both & eval_low,
+        'club_low': both & club_low,
+        'both_low': both & eval_low & club_low,
+        'only_deactive_eval': both & eval_low & club_high,
+        'only_deactive_club': both & eval_high & club_low,
+        'active_both': both & eval_high & club_high,
+        'eval_rows': eval_on,
+        'eval_deactive': eval_on & eval_low,
+        'club_rows': club_on,
+        'club_deactive': club_on & club_low,
+    }
+
+    orders_rows = (frame['orderCount'] > 0) & (frame['fDays'] > 0)
+    revenue_rows = frame['revenue'] > 0
+    columns['orders_rows'] = orders_rows
+    columns['revenue_rows'] = revenue_rows
+
+    metrics = {
+        'orders_per_day': (frame['orderCount'] / frame['fDays']).where(orders_rows),
+        'revenue_per_day': (frame['revenue'] / frame['fDays']).where(revenue_rows),
+        'subscription': frame['subscription'],
+        'tenure': frame[TENURE_COLUMN],
+    }
+    for name, bins, labels in [('orders', ORDER_BINS, ORDER_LABELS),
+                               ('subscription', SUBSCRIPTION_BINS, SUBSCRIPTION_LABELS),
+                               ('tenure', TENURE_BINS, TENURE_LABELS)]:
+        metric = metrics['orders_per_day' if name == 'orders' else name]
+        codes = _bin_codes(metric.to_numpy(dtype='float64'), bins)
+        for i in range(len(labels)):
+            columns['%s_bin_%d' % (name, i)] = codes == i
+    for name, column in [('neg', 'HowManydayschargeisNegetive'), ('nodata', 'how_many_days_with_nodata')]:
+        for i, mask in enumerate(_day_buckets(frame[column])):
+            columns['%s_bin_%d' % (name, i)] = mask
+
+    measures = pd.DataFrame({name: mask.to_numpy(dtype='int64') if hasattr(mask, 'to_numpy') else mask.astype('int64')
+                             for name, mask in columns.items()}, index=frame.index)
+    for name, values in metrics.items():
+        values = values.astype('float64')
+        measures['%s_count' % name] = values.notna().astype('int64')
+        measures['%s_sum' % name] = values.fillna(0.0)
+        measures[name] = values
+    for dim in DIMENSIONS:
+        measures[dim] = frame[dim]
+    return measures
+
+
+def cell_seed(key, metric):
+    # Sketch seed of one cell's metric: stable across processes, unlike hash() of strings
+    return zlib.crc32(repr((key, metric)).encode('utf-8'))
+
+
+def fold_cells(measures, k, sketches=None):
+    # Counters per (salesman, city, BranchStatus) cell plus, aligned with its rows, a dict of one
+    # KllSketch per metric. Cells already in `sketches` (keyed by cell) keep folding into theirs.
+    grouped = measures.groupby(DIMENSIONS, sort=True, dropna=False, observed=True)
+    cells = grouped[COUNT_COLUMNS + SUM_COLUMNS].sum()
+
+    # Split every metric by cell with one sort instead of a mask per cell
+    groups = grouped.ngroup().to_numpy()
+    order = np.argsort(groups, kind='stable')
+    bounds = np.cumsum(np.bincount(groups, minlength=len(cells)))[:-1]
+    pieces = {m: np.split(measures[m].to_numpy(dtype='float64')[order], bounds) for m in METRICS}
+    cell_sketches = []
+    for group, key in enumerate(cells.index):
+        metric_sketches = sketches.get(key) if sketches is not None else None
+        if metric_sketches is None:
+            metric_sketches = {m: KllSketch(k, cell_seed(key, m)) for m in METRICS}
+            if sketches is not None:
+                sketches[key] = metric_sketches
+        for m in METRICS:
+            metric_sketches[m].update(pieces[m][group])
+        cell_sketches.append(metric_sketches)
+    return cells, cell_sketches
+
+
+def _subsets():
+    # Every combination of fixed (non-'All') dimensions, from none to all three
+    for size in range(len(DIMENSIONS) + 1):
+        yield from itertools.combinations(DIMENSIONS, size)
+
+
+def _aggregate(measures, keys):
+    # Additive counters and quantiles for every group of `keys` (a single row when keys is empty)
+    if keys:
+        grouped = measures.groupby(keys, sort=True, observed=True)
+        table = grouped[COUNT_COLUMNS + SUM_COLUMNS].sum()
+        quantiles = grouped[METRICS].quantile(QUANTILES)
+        for q in QUANTILES:
+            at_q = quantiles.xs(q, level=-1)
+            for m in METRICS:
+                table['%s_q%d' % (m, int(q * 100))] = at_q[m]
+    else:
+        table = measures[COUNT_COLUMNS + SUM_COLUMNS].sum().to_frame().T
+        for q in QUANTILES:
+            for m in METRICS:
+                table['%s_q%d' % (m, int(q * 100))] = measures[m].quantile(q)
+    return table
+
+
+def empty_summary():
+    totals = dict.fromkeys(COUNT_COLUMNS, 0)
+    totals.update(dict.fromkeys(SUM_COLUMNS, 0.0))
+    totals.update(dict.fromkeys(QUANTILE_COLUMNS, float('nan')))
+    return _summary_from_rows(totals, {dim: None for dim in DIMENSIONS})
+
+
+def deactive_flags(frame):
+    # The `<= 0.05` deactive flags as integer columns, built once and shared by the grouped charts
+    eval_on = frame['SmartEvaluation'] == 1
+    club_on = frame['SmartClub'] == 1
+    eval_low = frame['eval_ratio'] <= DEACTIVE_THRESHOLD
+    club_low = frame['Club_ratio'] <= DEACTIVE_THRESHOLD
+    both = eval_on & club_on
+    flags = pd.DataFrame({
+        'both': both,
+        'eval_low': both & eval_low,
+        'club_low': both & club_low,
+        'eval_rows': eval_on,
+        'eval_deactive': eval_on & eval_low,
+        'club_rows': club_on,
+        'club_deactive': club_on & club_low,
+    }, index=frame.index).astype('int8')
+    for dim in DIMENSIONS:
+        flags[dim] = frame[dim]
+    return flags
+
+
+def deactive_counts(flags, dim):
+    # One native groupby().sum() per dimension instead of a Python lambda per group
+    return flags.groupby(dim, sort=True, observed=True)[DEACTIVE_COLUMNS].sum()
+
+
+def _breakdown_series(table, rows_column, value_column, dim):
+    if table is None or len(table) == 0:
+        return pd.Series([], dtype='int64', name=value_column, index=pd.Index([], name=dim))
+    table = table[table[rows_column] > 0]
+    series = table[value_column].astype('int64')
+    series.index = pd.Index(series.index.astype(object), name=dim)
+    return series
+
+
+def grouped_charts(breakdowns):
+    # Data for the five grouped charts from per-dimension counter tables (deactive_counts() or the cube)
+    salesman = breakdowns['salesman']
+    if salesman is not None and len(salesman) > 0:
+        salesman = salesman.assign(total_deactive=salesman['eval_low'] + salesman['club_low'])
+    return {
+        'city_eval': _breakdown_series(breakdowns['city'], 'eval_rows', 'eval_deactive', 'city'),
+        'city_club': _breakdown_series(breakdowns['city'], 'club_rows', 'club_deactive', 'city'),
+        'salesman_deactive': _breakdown_series(salesman, 'both', 'total_deactive', 'salesman'),
+        'status_eval': _breakdown_series(breakdowns['BranchStatus'], 'eval_rows', 'eval_deactive', 'BranchStatus'),
+        'status_club': _breakdown_series(breakdowns['BranchStatus'], 'club_rows', 'club_deactive', 'BranchStatus'),
+    }
+
+
+def _summary_from_rows(totals, breakdowns):
+    summary = {name: int(totals[name]) for name in COUNT_COLUMNS}
+    for m in METRICS:
+        count = summary['%s_count' % m]
+        summary['%s_mean' % m] = float(totals['%s_sum' % m]) / count if count else float('nan')
+    for name in QUANTILE_COLUMNS:
+        summary[name] = float(totals[name])
+    summary.update(grouped_charts(breakdowns))
+    return summary
+
+
+class Cube:
+    # Aggregates for every (salesman, city, BranchStatus) combination including the 'All' rollups.
+    #
+    # `levels[fixed]` holds one row per combination of the fixed dimensions (those not set to
+    # 'All'); `breakdowns[(fixed, dim)]` holds the same counters split by one extra dimension,
+    # indexed by fixed + (dim,) so a selection is a sorted-index lookup instead of a frame scan.
+
+    def __init__(self, levels, breakdowns):
+        self.levels = levels
+        self.breakdowns = breakdowns
+        # Set by from_cells(): per-cell sketches and the cells behind every level row
+        self.sketches = None
+        self.members = None
+        self.overall = None
+
+    @classmethod
+    def build(cls, frame, sketch_k=None):
+        # sketch_k: answer quantiles from per-cell KLL sketches of that size instead of exact group quantiles
+        measures = row_measures(frame)
+        if sketch_k:
+            cells, sketches = fold_cells(measures, sketch_k)
+            return cls.from_cells(cells.reset_index(), sketches)
+        levels = {}
+        for fixed in _subsets():
+            levels[fixed] = _aggregate(measures, list(fixed))
+        return cls._from_levels(levels)
+
+    @classmethod
+    def from_cells(cls, cells, sketches):
+        # Same cube from pre-aggregated (salesman, city, BranchStatus) cells instead of rows: `cells`
+        # holds the dimensions plus COUNT_COLUMNS and SUM_COLUMNS, `sketches[i]` maps every metric of
+        # cell i to a KllSketch. Quantiles are merged from the selected cells' sketches on lookup.
+        levels = {}
+        members = {}
+        for fixed in _subsets():
+            if fixed:
+                grouped = cells.groupby(list(fixed), sort=True, dropna=True, observed=True)
+                levels[fixed] = grouped[COUNT_COLUMNS + SUM_COLUMNS].sum()
+                members[fixed] = grouped.indices
+            else:
+                levels[fixed] = cells[COUNT_COLUMNS + SUM_COLUMNS].sum().to_frame().T
+                members[fixed] = {(): np.arange(len(cells))}
+        cube = cls._from_levels(levels)
+        cube.sketches = sketches
+        cube.members = members
+        # The All/All/All merge touches every cell, so it is done once here rather than per lookup
+        cube.overall = cube._merged_sketches((), ())
+        return cube
+
+    def _merged_sketches(self, fixed, key):
+        if not fixed and self.overall is not None:
+            return self.overall
+        positions = self.members[fixed].get(key, [])
+        return {m: KllSketch.merge_all(self.sketches[i][m] for i in positions) for m in METRICS}
+
+    def _sketch_quantiles(self, fixed, key):
+        quantiles = {}
+        for m, merged in self._merged_sketches(fixed, key).items():
+            for q in QUANTILES:
+                quantiles['%s_q%d' % (m, int(q * 100))] = merged.quantile(q)
+        return quantiles
+
+    @classmethod
+    def _from_levels(cls, levels):
+        breakdowns = {}
+        for fixed in levels:
+            for dim in DIMENSIONS:
+                if dim in fixed:
+                    continue
+                full = tuple(d for d in DIMENSIONS if d in fixed or d == dim)
+                breakdowns[(fixed, dim)] = (levels[full]
+                                            .reorder_levels(list(fixed) + [dim])
+                                            .sort_index()) if fixed else levels[full]
+        return cls(levels, breakdowns)
+
+    def lookup(self, selected_salesperson, selected_city, selected_status):
+        selection = dict(zip(DIMENSIONS, [selected_salesperson, selected_city, selected_status]))
+        fixed = tuple(dim for dim in DIMENSIONS if selection[dim] != 'All')
+        key = tuple(selection[dim] for dim in fixed)
+
+        try:
+            if fixed:
+                totals = self.levels[fixed].loc[[key[0] if len(key) == 1 else key]]
+            else:
+                totals = self.levels[fixed]
+        except KeyError:
+            return empty_summary()
+        if len(totals) == 0:
+            return empty_summary()
+
+        breakdowns = {}
+        for dim in DIMENSIONS:
+            if dim in fixed:
+                row = totals.copy()
+                row.index = pd.Index([selection[dim]], name=dim)
+                breakdowns[dim] = row
+            elif fixed:
+                table = self.breakdowns[(fixed, dim)]
+                breakdowns[dim] = table.loc[key[0] if len(key) == 1 else key]
+            else:
+                breakdowns[dim] = self.breakdowns[(fixed, dim)]
+        totals = totals.iloc[0]
+        if self.sketches is not None:
+            totals = pd.concat([totals, pd.Series(self._sketch_quantiles(fixed, key[0] if len(key) == 1 else key))])
+        return _summary_from_rows(totals, breakdowns)
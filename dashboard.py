@@ -1,529 +1,679 @@
 import pandas as pd
 import dash
-from dash import dcc, html, Input, Output
+from dash import dcc, html, Input, Output, State, ClientsideFunction
 import plotly.express as px
-from datetime import datetime
+import flask
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-df = pd.read_excel('notActive.xlsx')
+from cube import (DIMENSIONS, SUMMARY_COLUMNS, DEACTIVE_THRESHOLD, deactive_flags, deactive_counts, grouped_charts,
+                  ORDER_BINS, ORDER_LABELS, SUBSCRIPTION_BINS, SUBSCRIPTION_LABELS,
+                  TENURE_BINS, TENURE_LABELS, TENURE_COLUMN, DAY_BUCKET_LABELS)
+from datastore import DataStore
+from cache import make_cache
+from clientside import client_dataset
+from figures import FigureTemplate, FigureData
+from history import HistoryStore
+from warmup import Warmer
+import metrics
+from metrics import STAGES, SELECTIONS, selection_shape, timed
 
-df['lastfacture'] = pd.to_datetime(df['lastfacture'])
-today = datetime.now()
-df['how_many_days_with_nodata'] = (today - df['lastfacture']).dt.days
+# NOTACTIVE_METRICS=1 times every load, filter, summary, render and serialisation stage and serves the
+# latency histograms with cache hit rates at /metrics in the Prometheus text format. The numbers are
+# per worker process (labelled with its pid); under gunicorn scrape each worker or sum over `worker`
+metrics.enabled = os.environ.get('NOTACTIVE_METRICS') == '1'
 
-# Step 4: Calculate counts and metrics
-# Count branches with both evaluation and club
-both_eval_club = df[(df['SmartEvaluation'] == 1) & (df['SmartClub'] == 1)]
-count_both_eval_club = len(both_eval_club)
+# Workbook to serve; it is watched and reloaded in the background every NOTACTIVE_RELOAD_INTERVAL seconds.
+# NOTACTIVE_BACKEND=sql serves table NOTACTIVE_TABLE of a SQLite (or .duckdb) file at NOTACTIVE_PATH
+# instead (build one with `python sqlsource.py notActive.xlsx notActive.sqlite`) and answers every
+# selection with aggregate queries
+BACKEND = os.environ.get('NOTACTIVE_BACKEND', 'pandas')
+DATA_PATH = os.environ.get('NOTACTIVE_PATH', 'notActive.sqlite' if BACKEND == 'sql' else 'notActive.xlsx')
 
-# Count only evaluations (evaluation=1 but club=0)
-count_only_eval = len(df[(df['SmartEvaluation'] == 1) & (df['SmartClub'] == 0)])
+# Precompute every dropdown combination so callbacks are lookups (NOTACTIVE_CUBE=0 rescans instead)
+# NOTACTIVE_INGEST=stream folds the workbook (or a .csv/.parquet export) into the cube chunk by chunk
+# without ever holding all rows, for exports that don't fit in memory.
+# NOTACTIVE_SKETCH_ERROR (e.g. 0.01) answers the box-plot quantiles from mergeable per-cell sketches
+# with that rank error instead of exact per-group quantiles.
+# NOTACTIVE_LEAN=1 keeps only the workbook columns the dashboard reads, and NOTACTIVE_FLOAT32=1 stores
+# the ratios as float32 (lossy at the 0.05 threshold's rounding boundary)
+store = DataStore(DATA_PATH,
+                  interval=float(os.environ.get('NOTACTIVE_RELOAD_INTERVAL', '30')),
+                  use_cube=os.environ.get('NOTACTIVE_CUBE', '1') != '0',
+                  stream=os.environ.get('NOTACTIVE_INGEST') == 'stream',
+                  chunksize=int(os.environ.get('NOTACTIVE_CHUNK_ROWS', '50000')),
+                  sketch_error=float(os.environ.get('NOTACTIVE_SKETCH_ERROR', '0')) or None,
+                  lean=os.environ.get('NOTACTIVE_LEAN') == '1',
+                  float32=os.environ.get('NOTACTIVE_FLOAT32') == '1',
+                  backend=BACKEND,
+                  table=os.environ.get('NOTACTIVE_TABLE', 'branches'))
+# A preforking server loads the data once in its master and starts the reloader in each worker
+# instead (threads don't survive fork); see gunicorn.conf.py
+if os.environ.get('NOTACTIVE_START_RELOADER', '1') != '0':
+    store.start()
 
-# Count only club (club=1 but evaluation=0)  
-count_only_club = len(df[(df['SmartClub'] == 1) & (df['SmartEvaluation'] == 0)])
+# Rendered outputs per (section, salesperson, city, status, data version); NOTACTIVE_RESULT_CACHE=disk
+# shares them between worker processes through NOTACTIVE_RESULT_CACHE_DIR
+result_cache = make_cache(os.environ.get('NOTACTIVE_RESULT_CACHE', 'memory'),
+                          maxsize=int(os.environ.get('NOTACTIVE_RESULT_CACHE_SIZE', '1024')),
+                          ttl=float(os.environ.get('NOTACTIVE_RESULT_CACHE_TTL', '0')),
+                          directory=os.environ.get('NOTACTIVE_RESULT_CACHE_DIR'))
 
-# For branches with both club and evaluation, calculate rates
-# Branches with evaluation rate <= 5%
-eval_rate_low = len(both_eval_club[both_eval_club['eval_ratio'] <= 0.05])
+# Send figure updates as Dash Patches of the data-carrying properties when the browser already shows
+# the same figure template (NOTACTIVE_PATCH=0 always sends whole figures)
+PATCH_FIGURES = os.environ.get('NOTACTIVE_PATCH', '1') != '0'
 
-# Branches with club rate <= 5%
-club_rate_low = len(both_eval_club[both_eval_club['Club_ratio'] <= 0.05])
+# Without the cube, summarize a selection's independent parts (and render update_dashboard's sections)
+# on NOTACTIVE_WORKERS threads at once; 1 runs them one after another. The pool starts its threads on
+# first use, so under a preforking server they only ever exist in the workers
+SECTION_WORKERS = int(os.environ.get('NOTACTIVE_WORKERS', '1'))
+section_pool = ThreadPoolExecutor(SECTION_WORKERS, thread_name_prefix='sections') if SECTION_WORKERS > 1 else None
 
-# Branches with both rates <= 5%
-both_rates_low = len(both_eval_club[(both_eval_club['eval_ratio'] <= 0.05) & (both_eval_club['Club_ratio'] <= 0.05)])
+# Filtered summaries shared by the section callbacks of one selection
+summary_cache = make_cache('memory', maxsize=64)
 
-# Calculate shares compared to total branches with both club and evaluation
-eval_rate_low_share = eval_rate_low / count_both_eval_club * 100 if count_both_eval_club > 0 else 0
-club_rate_low_share = club_rate_low / count_both_eval_club * 100 if count_both_eval_club > 0 else 0
-both_rates_low_share = both_rates_low / count_both_eval_club * 100 if count_both_eval_club > 0 else 0
+# NOTACTIVE_CLIENTSIDE=1 sends each page the per-cell counters once (assets/clientside.js draws every
+# selection from them), so dropdown changes never reach the server; open pages check for newer data
+# every NOTACTIVE_CLIENTSIDE_POLL seconds. Needs the rows in memory, so streamed and SQL loads keep
+# the server callbacks. The "as of" date picker is server-side only
+CLIENTSIDE = os.environ.get('NOTACTIVE_CLIENTSIDE') == '1' and store.current().frame is not None
+CLIENTSIDE_POLL = float(os.environ.get('NOTACTIVE_CLIENTSIDE_POLL', '60'))
+
+# NOTACTIVE_HISTORY=<directory> records the per-level aggregates of every load in an append-only Parquet
+# store partitioned by export date (see history.py) and charts the deactive counts across exports for
+# the overall view or a single selected salesperson, city or branch status
+HISTORY_DIR = os.environ.get('NOTACTIVE_HISTORY')
+history = HistoryStore(HISTORY_DIR) if HISTORY_DIR else None
+if history is not None:
+    history.on_load(store.current())
+    store.on_swap(history.on_load)
+
+# Each dropdown only offers the values that still have rows under the other two dropdowns' selection,
+# most rows first with the count in the label, from the snapshot's co-occurrence index. At most
+# NOTACTIVE_OPTION_LIMIT values are listed (0: all of them); typing in a dropdown searches the rest
+OPTION_LIMIT = int(os.environ.get('NOTACTIVE_OPTION_LIMIT', '500'))
+
+DROPDOWNS = [('salesman', 'salesperson-dropdown'), ('city', 'city-dropdown'), ('BranchStatus', 'status-dropdown')]
+
+
+def dropdown_options(snapshot, dim, selection, current='All', search=None):
+    values, total = snapshot.cooccurrence.options(dim, selection, search, OPTION_LIMIT)
+    options = [{'label': 'All (%d)' % total, 'value': 'All'}] + \
+              [{'label': '%s (%d)' % (value, rows), 'value': value} for value, rows in values]
+    # The selected value stays listed (so it stays displayed) even when it has no rows left
+    if current != 'All' and all(option['value'] != current for option in options):
+        options.append({'label': str(current), 'value': current})
+    return options
+
+
+# The clientside dataset of the current and the previous snapshot
+client_data_cache = make_cache('memory', maxsize=2)
+
+
+def client_data(snapshot):
+    return client_data_cache.get_or_compute(snapshot.key, lambda: client_dataset(snapshot, OPTION_LIMIT))
 
 
 app = dash.Dash(__name__)
 
-# Create dashboard layout
-app.layout = html.Div([
-    # Header
-    html.H1("Not Active license Dashboard", style={'textAlign': 'center', 'color': '#2c3e50'}),
+# Create dashboard layout (a function, so a page load after a data refresh gets fresh dropdown options)
+def serve_layout():
+    snapshot = store.current()
+    return html.Div([
+        # Header
+        html.H1("Not Active license Dashboard", style={'textAlign': 'center', 'color': '#2c3e50'}),
     
-    # Dropdowns
-    html.Div([
+        # Dropdowns
         html.Div([
-            html.Label("Select Salesperson:"),
-            dcc.Dropdown(
-                id='salesperson-dropdown',
-                options=[{'label': 'All', 'value': 'All'}] + 
-                        [{'label': sp, 'value': sp} for sp in df['salesman'].dropna().unique()],
-                value='All'
-            )
-        ], style={'width': '30%', 'display': 'inline-block', 'margin': '10px'}),
+            html.Div([
+                html.Label("Select Salesperson:"),
+                dcc.Dropdown(
+                    id='salesperson-dropdown',
+                    options=dropdown_options(snapshot, 'salesman', {}),
+                    value='All'
+                )
+            ], style={'width': '30%', 'display': 'inline-block', 'margin': '10px'}),
         
-        html.Div([
-            html.Label("Select City:"),
-            dcc.Dropdown(
-                id='city-dropdown',
-                options=[{'label': 'All', 'value': 'All'}] + 
-                        [{'label': city, 'value': city} for city in df['city'].dropna().unique()],
-                value='All'
-            )
-        ], style={'width': '30%', 'display': 'inline-block', 'margin': '10px'}),
+            html.Div([
+                html.Label("Select City:"),
+                dcc.Dropdown(
+                    id='city-dropdown',
+                    options=dropdown_options(snapshot, 'city', {}),
+                    value='All'
+                )
+            ], style={'width': '30%', 'display': 'inline-block', 'margin': '10px'}),
         
+            html.Div([
+                html.Label("Select Branch Status:"),
+                dcc.Dropdown(
+                    id='status-dropdown',
+                    options=dropdown_options(snapshot, 'BranchStatus', {}),
+                    value='All'
+                )
+            ], style={'width': '30%', 'display': 'inline-block', 'margin': '10px'})
+        ]),
+
+        # Reference date of the no-data pie; empty means today (not available for streamed loads)
         html.Div([
-            html.Label("Select Branch Status:"),
-            dcc.Dropdown(
-                id='status-dropdown',
-                options=[{'label': 'All', 'value': 'All'}] + 
-                        [{'label': status, 'value': status} for status in df['BranchStatus'].dropna().unique()],
-                value='All'
+            html.Label("Days with no data as of: "),
+            dcc.DatePickerSingle(
+                id='as-of-date',
+                placeholder='Today',
+                clearable=True,
+                display_format='YYYY-MM-DD',
+                max_date_allowed=snapshot.today.date()
             )
-        ], style={'width': '30%', 'display': 'inline-block', 'margin': '10px'})
-    ]),
+        ], style={'margin': '10px',
+                  'display': 'block' if (snapshot.facture is not None or snapshot.source is not None)
+                  and not CLIENTSIDE else 'none'}),
     
-    # KPI Cards
-    html.Div(id='kpi-cards', style={'margin': '20px'}),
+        # KPI Cards
+        html.Div(id='kpi-cards', style={'margin': '20px'}),
     
-    # Charts Row 1
-    html.Div([
+        # Charts Row 1
         html.Div([
-            dcc.Graph(id='city-deactive-eval')
-        ], style={'width': '50%', 'display': 'inline-block'}),
+            html.Div([
+                dcc.Graph(id='city-deactive-eval')
+            ], style={'width': '50%', 'display': 'inline-block'}),
         
-        html.Div([
-            dcc.Graph(id='city-deactive-club')
-        ], style={'width': '50%', 'display': 'inline-block'})
-    ]),
+            html.Div([
+                dcc.Graph(id='city-deactive-club')
+            ], style={'width': '50%', 'display': 'inline-block'})
+        ]),
     
-    # Charts Row 2
-    html.Div([
+        # Charts Row 2
         html.Div([
-            dcc.Graph(id='salesperson-deactive')
-        ], style={'width': '50%', 'display': 'inline-block'}),
+            html.Div([
+                dcc.Graph(id='salesperson-deactive')
+            ], style={'width': '50%', 'display': 'inline-block'}),
         
-        html.Div([
-            dcc.Graph(id='deactive-pie')
-        ], style={'width': '50%', 'display': 'inline-block'})
-    ]),
+            html.Div([
+                dcc.Graph(id='deactive-pie')
+            ], style={'width': '50%', 'display': 'inline-block'})
+        ]),
     
-    # Charts Row 3 - Branch Status Analysis
-    html.Div([
+        # Charts Row 3 - Branch Status Analysis
         html.Div([
-            dcc.Graph(id='branch-status-eval')
-        ], style={'width': '50%', 'display': 'inline-block'}),
+            html.Div([
+                dcc.Graph(id='branch-status-eval')
+            ], style={'width': '50%', 'display': 'inline-block'}),
         
-        html.Div([
-            dcc.Graph(id='branch-status-club')
-        ], style={'width': '50%', 'display': 'inline-block'})
-    ]),
+            html.Div([
+                dcc.Graph(id='branch-status-club')
+            ], style={'width': '50%', 'display': 'inline-block'})
+        ]),
     
-    # Charts Row 4 - Additional Metrics
-    html.Div([
+        # Charts Row 4 - Additional Metrics
         html.Div([
-            dcc.Graph(id='orders-per-day-hist')
-        ], style={'width': '33%', 'display': 'inline-block'}),
+            html.Div([
+                dcc.Graph(id='orders-per-day-hist')
+            ], style={'width': '33%', 'display': 'inline-block'}),
         
-        html.Div([
-            dcc.Graph(id='avg-revenue-hist')
-        ], style={'width': '33%', 'display': 'inline-block'}),
+            html.Div([
+                dcc.Graph(id='avg-revenue-hist')
+            ], style={'width': '33%', 'display': 'inline-block'}),
         
-        html.Div([
-            dcc.Graph(id='subscription-hist')
-        ], style={'width': '33%', 'display': 'inline-block'})
-    ]),
+            html.Div([
+                dcc.Graph(id='subscription-hist')
+            ], style={'width': '33%', 'display': 'inline-block'})
+        ]),
     
-    # Charts Row 5
-    html.Div([
+        # Charts Row 5
         html.Div([
-            dcc.Graph(id='negative-charge-pie')
-        ], style={'width': '50%', 'display': 'inline-block'}),
+            html.Div([
+                dcc.Graph(id='negative-charge-pie')
+            ], style={'width': '50%', 'display': 'inline-block'}),
         
+            html.Div([
+                dcc.Graph(id='no-data-days-pie')
+            ], style={'width': '50%', 'display': 'inline-block'})
+        ]),
+
+        # Deactive counts of the selection across recorded exports (NOTACTIVE_HISTORY only)
         html.Div([
-            dcc.Graph(id='no-data-days-pie')
-        ], style={'width': '50%', 'display': 'inline-block'})
-    ]),
-    
-    # Histogram
-    html.Div([
-        dcc.Graph(id='tenure-histogram')
-    ], style={'margin': '20px'})
-])
-
-# Callback for updating all charts
-@app.callback(
-    [Output('kpi-cards', 'children'),
-     Output('city-deactive-eval', 'figure'),
-     Output('city-deactive-club', 'figure'),
-     Output('salesperson-deactive', 'figure'),
-     Output('deactive-pie', 'figure'),
-     Output('branch-status-eval', 'figure'),
-     Output('branch-status-club', 'figure'),
-     Output('orders-per-day-hist', 'figure'),
-     Output('avg-revenue-hist', 'figure'),
-     Output('subscription-hist', 'figure'),
-     Output('negative-charge-pie', 'figure'),
-     Output('no-data-days-pie', 'figure'),
-     Output('tenure-histogram', 'figure')],
-    [Input('salesperson-dropdown', 'value'),
-     Input('city-dropdown', 'value'),
-     Input('status-dropdown', 'value')]
-)
-def update_dashboard(selected_salesperson, selected_city, selected_status):
-    # Filter data based on selections
-    filtered_df = df.copy()
-    if selected_salesperson != 'All':
-        filtered_df = filtered_df[filtered_df['salesman'] == selected_salesperson]
-    if selected_city != 'All':
-        filtered_df = filtered_df[filtered_df['city'] == selected_city]
-    if selected_status != 'All':
-        filtered_df = filtered_df[filtered_df['BranchStatus'] == selected_status]
-    
-    # Calculate KPIs for filtered data
-    both_eval_club_f = filtered_df[(filtered_df['SmartEvaluation'] == 1) & (filtered_df['SmartClub'] == 1)]
-    count_both_f = len(both_eval_club_f)
-    count_only_eval_f = len(filtered_df[(filtered_df['SmartEvaluation'] == 1) & (filtered_df['SmartClub'] == 0)])
-    count_only_club_f = len(filtered_df[(filtered_df['SmartClub'] == 1) & (filtered_df['SmartEvaluation'] == 0)])
-    eval_rate_low_f = len(both_eval_club_f[both_eval_club_f['eval_ratio'] <= 0.05])
-    club_rate_low_f = len(both_eval_club_f[both_eval_club_f['Club_ratio'] <= 0.05])
-    both_rates_low_f = len(both_eval_club_f[(both_eval_club_f['eval_ratio'] <= 0.05) & (both_eval_club_f['Club_ratio'] <= 0.05)])
+            dcc.Graph(id='trend-chart')
+        ] if history is not None else [], style={'margin': '20px'}),
     
+        # Histogram
+        html.Div([
+            dcc.Graph(id='tenure-histogram')
+        ], style={'margin': '20px'}),
+
+        # Fingerprint and figure template of what each section currently shows, so unchanged sections
+        # are skipped and changed figures are patched
+        html.Div([dcc.Store(id=output_id + '-signature') for output_id, _, _, _ in SECTIONS]),
+
+        # Clientside mode: the dataset every section is drawn from, and the check for a newer one
+        html.Div([
+            dcc.Store(id='client-data', data=client_data(snapshot)),
+            dcc.Interval(id='client-data-poll', interval=CLIENTSIDE_POLL * 1000, disabled=CLIENTSIDE_POLL <= 0)
+        ] if CLIENTSIDE else [])
+    ])
+
+
+def _summarize_kpis(filtered_df):
+    summary = {}
+
+    # KPIs
+    with timed(STAGES, 'summarize', 'kpis'):
+        # Counted from boolean masks over the filtered frame rather than from filtered copies of it
+        both = (filtered_df['SmartEvaluation'] == 1) & (filtered_df['SmartClub'] == 1)
+        eval_low = filtered_df['eval_ratio'] <= DEACTIVE_THRESHOLD
+        club_low = filtered_df['Club_ratio'] <= DEACTIVE_THRESHOLD
+        summary['both'] = int(both.sum())
+        summary['only_eval'] = int(((filtered_df['SmartEvaluation'] == 1) & (filtered_df['SmartClub'] == 0)).sum())
+        summary['only_club'] = int(((filtered_df['SmartClub'] == 1) & (filtered_df['SmartEvaluation'] == 0)).sum())
+        summary['eval_low'] = int((both & eval_low).sum())
+        summary['club_low'] = int((both & club_low).sum())
+        summary['both_low'] = int((both & eval_low & club_low).sum())
+
+    # Deactive status pie
+    with timed(STAGES, 'summarize', 'deactive-pie'):
+        eval_high = filtered_df['eval_ratio'] > DEACTIVE_THRESHOLD
+        club_high = filtered_df['Club_ratio'] > DEACTIVE_THRESHOLD
+        summary['only_deactive_eval'] = int((both & eval_low & club_high).sum())
+        summary['only_deactive_club'] = int((both & eval_high & club_low).sum())
+        summary['active_both'] = int((both & eval_high & club_high).sum())
+    return summary
+
+
+def _summarize_grouped(filtered_df):
+    summary = {}
+
+    # Deactive evaluation / club counts per city, salesman and branch status
+    with timed(STAGES, 'summarize', 'deactive-flags'):
+        flags = deactive_flags(filtered_df)
+        summary['eval_rows'] = int(flags['eval_rows'].sum())
+        summary['club_rows'] = int(flags['club_rows'].sum())
+    counts = {}
+    for dim in DIMENSIONS:
+        with timed(STAGES, 'summarize', 'grouped-' + dim):
+            counts[dim] = deactive_counts(flags, dim)
+    summary.update(grouped_charts(counts))
+    return summary
+
+
+def _summarize_orders(filtered_df):
+    summary = {}
+
+    # Orders per day
+    with timed(STAGES, 'summarize', 'orders-per-day'):
+        orders_rows = (filtered_df['orderCount'] > 0) & (filtered_df['fDays'] > 0)
+        orders_per_day = filtered_df['orderCount'][orders_rows] / filtered_df['fDays'][orders_rows]
+        summary['orders_rows'] = int(orders_rows.sum())
+        orders_binned = pd.cut(orders_per_day, bins=ORDER_BINS, labels=ORDER_LABELS, right=False, include_lowest=True)
+        for i, count in enumerate(orders_binned.value_counts().reindex(ORDER_LABELS, fill_value=0)):
+            summary['orders_bin_%d' % i] = int(count)
+        summary['orders_per_day_mean'] = orders_per_day.mean()
+        summary['orders_per_day_q50'] = orders_per_day.median()
+    return summary
+
+
+def _summarize_revenue(filtered_df):
+    summary = {}
+
+    # Revenue per day
+    with timed(STAGES, 'summarize', 'revenue-per-day'):
+        revenue_rows = filtered_df['revenue'] > 0
+        revenue_per_day = filtered_df['revenue'][revenue_rows] / filtered_df['fDays'][revenue_rows]
+        summary['revenue_rows'] = int(revenue_rows.sum())
+        summary['revenue_per_day_mean'] = revenue_per_day.mean()
+        summary['revenue_per_day_q25'] = revenue_per_day.quantile(0.25)
+        summary['revenue_per_day_q50'] = revenue_per_day.quantile(0.50)
+        summary['revenue_per_day_q75'] = revenue_per_day.quantile(0.75)
+    return summary
+
+
+def _summarize_subscription(filtered_df):
+    summary = {}
+
+    # Subscription
+    with timed(STAGES, 'summarize', 'subscription'):
+        subscription_data = filtered_df['subscription'].dropna()
+        summary['subscription_count'] = len(subscription_data)
+        subscription_binned = pd.cut(subscription_data, bins=SUBSCRIPTION_BINS, labels=SUBSCRIPTION_LABELS, right=False, include_lowest=True)
+        for i, count in enumerate(subscription_binned.value_counts().reindex(SUBSCRIPTION_LABELS, fill_value=0)):
+            summary['subscription_bin_%d' % i] = int(count)
+        summary['subscription_mean'] = subscription_data.mean()
+        summary['subscription_q50'] = subscription_data.median()
+    return summary
+
+
+def _summarize_days(filtered_df):
+    summary = {}
+
+    # Negative charge days and days with no data
+    for name, column in [('neg', 'HowManydayschargeisNegetive'), ('nodata', 'how_many_days_with_nodata')]:
+        with timed(STAGES, 'summarize', name + '-days'):
+            days = filtered_df[column]
+            summary['%s_bin_0' % name] = int((days == 0).sum())
+            summary['%s_bin_1' % name] = int(((days > 0) & (days <= 7)).sum())
+            summary['%s_bin_2' % name] = int(((days >= 8) & (days <= 30)).sum())
+            summary['%s_bin_3' % name] = int((days > 30).sum())
+    return summary
+
+
+def _summarize_tenure(filtered_df):
+    summary = {}
+
+    # Tenure
+    with timed(STAGES, 'summarize', 'tenure'):
+        tenure_data = filtered_df[TENURE_COLUMN].dropna()
+        summary['tenure_count'] = len(tenure_data)
+        tenure_binned = pd.cut(tenure_data, bins=TENURE_BINS, labels=TENURE_LABELS, right=False, include_lowest=True)
+        for i, count in enumerate(tenure_binned.value_counts().reindex(TENURE_LABELS, fill_value=0)):
+            summary['tenure_bin_%d' % i] = int(count)
+        summary['tenure_mean'] = tenure_data.mean()
+        summary['tenure_q50'] = tenure_data.median()
+        summary['tenure_q75'] = tenure_data.quantile(0.75)
+    return summary
+
+
+# Parts of a summary; each reads the filtered frame on its own and fills its own keys
+SUMMARY_PARTS = [_summarize_kpis, _summarize_grouped, _summarize_orders, _summarize_revenue,
+                 _summarize_subscription, _summarize_days, _summarize_tenure]
+
+
+def summarize_branches(filtered_df, pool=None):
+    # Full scan of an already filtered frame; same keys as Cube.lookup(). With a thread pool the
+    # independent parts run side by side (pandas and NumPy release the GIL in their kernels)
+    if pool is None:
+        parts = [part(filtered_df) for part in SUMMARY_PARTS]
+    else:
+        parts = pool.map(lambda part: part(filtered_df), SUMMARY_PARTS)
+    summary = {}
+    for part in parts:
+        summary.update(part)
+    return summary
+
+
+def render_kpi_cards(summary):
     # KPI Cards
     kpi_cards = html.Div([
         html.Div([
-            html.H3(str(count_both_f)),
+            html.H3(str(summary['both'])),
             html.P("Both Eval & Club")
         ], className='kpi-card', style={'width': '15%', 'display': 'inline-block', 'textAlign': 'center', 
                                       'border': '1px solid #ddd', 'margin': '5px', 'padding': '10px'}),
         
         html.Div([
-            html.H3(str(count_only_eval_f)),
+            html.H3(str(summary['only_eval'])),
             html.P("Only Evaluation")
         ], className='kpi-card', style={'width': '15%', 'display': 'inline-block', 'textAlign': 'center',
                                       'border': '1px solid #ddd', 'margin': '5px', 'padding': '10px'}),
         
         html.Div([
-            html.H3(str(count_only_club_f)),
+            html.H3(str(summary['only_club'])),
             html.P("Only Club")
         ], className='kpi-card', style={'width': '15%', 'display': 'inline-block', 'textAlign': 'center',
                                       'border': '1px solid #ddd', 'margin': '5px', 'padding': '10px'}),
         
         html.Div([
-            html.H3(str(eval_rate_low_f)),
+            html.H3(str(summary['eval_low'])),
             html.P("Low Eval Rate (≤5%)")
         ], className='kpi-card', style={'width': '15%', 'display': 'inline-block', 'textAlign': 'center',
                                       'border': '1px solid #ddd', 'margin': '5px', 'padding': '10px'}),
         
         html.Div([
-            html.H3(str(club_rate_low_f)),
+            html.H3(str(summary['club_low'])),
             html.P("Low Club Rate (≤5%)")
         ], className='kpi-card', style={'width': '15%', 'display': 'inline-block', 'textAlign': 'center',
                                       'border': '1px solid #ddd', 'margin': '5px', 'padding': '10px'}),
         
         html.Div([
-            html.H3(str(both_rates_low_f)),
+            html.H3(str(summary['both_low'])),
             html.P("Both Rates Low (≤5%)")
         ], className='kpi-card', style={'width': '15%', 'display': 'inline-block', 'textAlign': 'center',
                                       'border': '1px solid #ddd', 'margin': '5px', 'padding': '10px'})
     ])
-    
+    return kpi_cards
+
+
+def _stat_box(figure, x, y, color, size):
+    # Empty annotation box of the histogram statistics; renderers fill in the text
+    figure.add_annotation(
+        x=x, y=y,
+        xref="paper", yref="paper",
+        text="",
+        showarrow=False,
+        align="center",
+        bgcolor="rgba(255,255,255,0.95)",
+        bordercolor=color,
+        borderwidth=2,
+        font=dict(size=size, color=color)
+    )
+
+
+def _bar_template(name, x, y, title, tickangle=None):
+    figure = px.bar(pd.DataFrame({x: [], y: []}), x=x, y=y, title=title)
+    if tickangle is not None:
+        # Rotate x-axis labels for better readability
+        figure.update_layout(xaxis_tickangle=tickangle)
+    return FigureTemplate(name, figure)
+
+
+def _orders_template():
+    figure = px.bar(x=ORDER_LABELS, y=[0] * len(ORDER_LABELS), title='Orders Per Day Distribution (Custom Bins)')
+    figure.update_xaxes(title='Orders Per Day Range')
+    figure.update_yaxes(title='Count')
+    _stat_box(figure, 0.2, 0.95, 'red', 16)
+    _stat_box(figure, 0.8, 0.95, 'blue', 16)
+    return FigureTemplate('orders-per-day', figure)
+
+
+def _revenue_template():
+    figure = px.bar(x=['Average', '25th Percentile', '50th Percentile (Median)', '75th Percentile'], y=[1, 1, 1, 1],
+                    title='Revenue Per Day Statistics', text=[''] * 4)
+    figure.update_traces(
+        textposition='inside',
+        textfont=dict(size=14, color='white'),
+        marker=dict(color=['#ff4444', '#4444ff', '#44ff44', '#ff44ff'])
+    )
+    figure.update_layout(
+        showlegend=False,
+        yaxis={'visible': False, 'range': [0, 1.2]},
+        xaxis={'title': ''},
+        height=300
+    )
+    return FigureTemplate('revenue-per-day', figure)
+
+
+def _subscription_template():
+    figure = px.bar(x=SUBSCRIPTION_LABELS, y=[0] * len(SUBSCRIPTION_LABELS),
+                    title='Subscription Distribution (Custom Bins)')
+    figure.update_xaxes(title='Subscription Range')
+    figure.update_yaxes(title='Count')
+    _stat_box(figure, 0.15, 0.90, 'red', 14)
+    _stat_box(figure, 0.85, 0.90, 'blue', 14)
+    return FigureTemplate('subscription', figure)
+
+
+def _tenure_template():
+    figure = px.bar(x=TENURE_LABELS, y=[0] * len(TENURE_LABELS), title='Client Tenure Days Distribution (Custom Bins)')
+    figure.update_xaxes(title='Tenure Days Range')
+    figure.update_yaxes(title='Count')
+    _stat_box(figure, 0.15, 0.95, 'red', 14)
+    _stat_box(figure, 0.5, 0.95, 'blue', 14)
+    _stat_box(figure, 0.85, 0.95, 'green', 14)
+    # Summary box at the bottom
+    figure.add_annotation(
+        x=0.5, y=0.02,
+        xref="paper", yref="paper",
+        text="",
+        showarrow=False,
+        align="center",
+        bgcolor="rgba(240,240,240,0.95)",
+        bordercolor="black",
+        borderwidth=1,
+        font=dict(size=12)
+    )
+    return FigureTemplate('tenure', figure)
+
+
+# Lines of the trend chart: history columns and their legend names
+TREND_SERIES = [('eval_deactive', 'Deactive Evaluation'), ('club_deactive', 'Deactive Club'),
+                ('both_low', 'Both Rates Low (≤5%)')]
+
+
+def _trend_template():
+    figure = px.line(pd.DataFrame({'export_date': [''] * len(TREND_SERIES), 'count': [0] * len(TREND_SERIES),
+                                   'series': [label for _, label in TREND_SERIES]}),
+                     x='export_date', y='count', color='series', markers=True, title='Deactive Counts Across Exports')
+    figure.update_xaxes(title='Export Date', type='date')
+    figure.update_yaxes(title='Count')
+    figure.update_layout(legend_title_text='')
+    return FigureTemplate('trend', figure)
+
+
+def _pie_template(name, names, title):
+    return FigureTemplate(name, px.pie(values=[1] * len(names), names=names, title=title))
+
+
+# Figure templates: styled once here, the renderers below only fill in the data
+CITY_EVAL_FIGURE = _bar_template('city-eval', 'city', 'deactive_eval_count',
+                                 'Top 10 Cities with Most Deactive Evaluation (Count)')
+CITY_CLUB_FIGURE = _bar_template('city-club', 'city', 'deactive_club_count',
+                                 'Top 10 Cities with Most Deactive Club (Count)')
+SALESPERSON_FIGURE = _bar_template('salesperson', 'salesman', 'total_deactive',
+                                   'Salesperson with Most Deactive Club & Evaluation')
+STATUS_EVAL_FIGURE = _bar_template('status-eval', 'BranchStatus', 'deactive_eval_count',
+                                   'Deactive Evaluation Count by Branch Status', tickangle=-45)
+STATUS_CLUB_FIGURE = _bar_template('status-club', 'BranchStatus', 'deactive_club_count',
+                                   'Deactive Club Count by Branch Status', tickangle=-45)
+ORDERS_FIGURE = _orders_template()
+REVENUE_FIGURE = _revenue_template()
+SUBSCRIPTION_FIGURE = _subscription_template()
+TENURE_FIGURE = _tenure_template()
+DEACTIVE_PIE_FIGURE = _pie_template('deactive-pie',
+                                    ['Only Deactive Eval', 'Only Deactive Club', 'Both Deactive', 'Both Active'],
+                                    'Deactive Status Distribution')
+NEG_CHARGE_FIGURE = _pie_template('negative-charge', DAY_BUCKET_LABELS, 'Negative Charge Days Distribution')
+NODATA_FIGURE = _pie_template('no-data-days', DAY_BUCKET_LABELS, 'Days with No Data Distribution')
+TREND_FIGURE = _trend_template()
+
+# Placeholders for selections without data
+NO_EVALUATION_FIGURE = FigureTemplate('no-evaluation', px.bar(title='No Evaluation Data Available'))
+NO_CLUB_FIGURE = FigureTemplate('no-club', px.bar(title='No Club Data Available'))
+NO_BOTH_FIGURE = FigureTemplate('no-both', px.bar(title='No Data Available for Both Club & Evaluation'))
+NO_ORDERS_FIGURE = FigureTemplate('no-orders', px.bar(title='No Order Data Available'))
+NO_REVENUE_FIGURE = FigureTemplate('no-revenue', px.bar(title='No Revenue Data Available'))
+NO_SUBSCRIPTION_FIGURE = FigureTemplate('no-subscription', px.bar(title='No Subscription Data Available'))
+NO_TENURE_FIGURE = FigureTemplate('no-tenure', px.bar(title='No Tenure Data Available'))
+NO_DATA_PIE_FIGURE = FigureTemplate('no-data-pie', px.pie(values=[1], names=['No Data'], title='No Data Available'))
+NO_TREND_FIGURE = FigureTemplate('no-trend', px.line(title='Trends Are Recorded per Single Salesperson, City or Branch Status'))
+
+
+def _top_bars(template, series, limit=None):
+    # Largest first, equal counts by label, so the cut at `limit` is the same in clientside mode
+    series = series.sort_index(kind='stable').sort_values(ascending=False, kind='stable')
+    if limit is not None:
+        series = series.head(limit)
+    return template.fill({('data', 0, 'x'): series.index.tolist(), ('data', 0, 'y'): series.tolist()})
+
+
+def render_city_eval(summary):
     # City with most deactive evaluation (show top 10 counts, not percentages)
-    eval_branches = filtered_df[filtered_df['SmartEvaluation'] == 1]
-    if len(eval_branches) > 0:
-        city_eval = eval_branches.groupby('city').agg({
-            'eval_ratio': lambda x: (x <= 0.05).sum()
-        }).reset_index()
-        city_eval.columns = ['city', 'deactive_eval_count']
-        city_eval = city_eval.sort_values('deactive_eval_count', ascending=False).head(10)
-        fig_city_eval = px.bar(city_eval, x='city', y='deactive_eval_count',
-                              title='Top 10 Cities with Most Deactive Evaluation (Count)')
-    else:
-        fig_city_eval = px.bar(title='No Evaluation Data Available')
-    
+    if summary['eval_rows'] > 0:
+        return _top_bars(CITY_EVAL_FIGURE, summary['city_eval'], 10)
+    return NO_EVALUATION_FIGURE.fill()
+
+
+def render_city_club(summary):
     # City with most deactive club (show top 10 counts, not percentages)
-    club_branches = filtered_df[filtered_df['SmartClub'] == 1]
-    if len(club_branches) > 0:
-        city_club = club_branches.groupby('city').agg({
-            'Club_ratio': lambda x: (x <= 0.05).sum()
-        }).reset_index()
-        city_club.columns = ['city', 'deactive_club_count']
-        city_club = city_club.sort_values('deactive_club_count', ascending=False).head(10)
-        fig_city_club = px.bar(city_club, x='city', y='deactive_club_count',
-                              title='Top 10 Cities with Most Deactive Club (Count)')
-    else:
-        fig_city_club = px.bar(title='No Club Data Available')
-    
+    if summary['club_rows'] > 0:
+        return _top_bars(CITY_CLUB_FIGURE, summary['city_club'], 10)
+    return NO_CLUB_FIGURE.fill()
+
+
+def render_salesperson(summary):
     # Salesperson with most deactive
-    if len(both_eval_club_f) > 0:
-        sales_deactive = both_eval_club_f.groupby('salesman').agg({
-            'eval_ratio': lambda x: (x <= 0.05).sum(),
-            'Club_ratio': lambda x: (x <= 0.05).sum()
-        }).reset_index()
-        sales_deactive['total_deactive'] = sales_deactive['eval_ratio'] + sales_deactive['Club_ratio']
-        sales_deactive = sales_deactive.sort_values('total_deactive', ascending=False).head(10)
-        fig_salesperson = px.bar(sales_deactive, x='salesman', y='total_deactive',
-                                title='Salesperson with Most Deactive Club & Evaluation')
-    else:
-        fig_salesperson = px.bar(title='No Data Available for Both Club & Evaluation')
+    if summary['both'] > 0:
+        return _top_bars(SALESPERSON_FIGURE, summary['salesman_deactive'], 10)
+    return NO_BOTH_FIGURE.fill()
+
 
+def render_branch_status_eval(summary):
     # Branch Status with deactive evaluation counts
-    eval_branches_status = filtered_df[filtered_df['SmartEvaluation'] == 1]
-    if len(eval_branches_status) > 0:
-        status_eval = eval_branches_status.groupby('BranchStatus').agg({
-            'eval_ratio': lambda x: (x <= 0.05).sum()
-        }).reset_index()
-        status_eval.columns = ['BranchStatus', 'deactive_eval_count']
-        status_eval = status_eval.sort_values('deactive_eval_count', ascending=False)
-        fig_branch_status_eval = px.bar(status_eval, x='BranchStatus', y='deactive_eval_count',
-                                       title='Deactive Evaluation Count by Branch Status')
-        # Rotate x-axis labels for better readability
-        fig_branch_status_eval.update_layout(xaxis_tickangle=-45)
-    else:
-        fig_branch_status_eval = px.bar(title='No Evaluation Data Available')
-    
+    if summary['eval_rows'] > 0:
+        return _top_bars(STATUS_EVAL_FIGURE, summary['status_eval'])
+    return NO_EVALUATION_FIGURE.fill()
+
+
+def render_branch_status_club(summary):
     # Branch Status with deactive club counts
-    club_branches_status = filtered_df[filtered_df['SmartClub'] == 1]
-    if len(club_branches_status) > 0:
-        status_club = club_branches_status.groupby('BranchStatus').agg({
-            'Club_ratio': lambda x: (x <= 0.05).sum()
-        }).reset_index()
-        status_club.columns = ['BranchStatus', 'deactive_club_count']
-        status_club = status_club.sort_values('deactive_club_count', ascending=False)
-        fig_branch_status_club = px.bar(status_club, x='BranchStatus', y='deactive_club_count',
-                                       title='Deactive Club Count by Branch Status')
-        # Rotate x-axis labels for better readability
-        fig_branch_status_club.update_layout(xaxis_tickangle=-45)
-    else:
-        fig_branch_status_club = px.bar(title='No Club Data Available')
+    if summary['club_rows'] > 0:
+        return _top_bars(STATUS_CLUB_FIGURE, summary['status_club'])
+    return NO_CLUB_FIGURE.fill()
 
+
+def render_orders_per_day(summary):
     # Orders per day histogram with custom bins
-    filtered_orders = filtered_df[(filtered_df['orderCount'] > 0) & (filtered_df['fDays'] > 0)]
-    if len(filtered_orders) > 0:
-        filtered_orders_copy = filtered_orders.copy()
-        filtered_orders_copy['orders_per_day'] = filtered_orders_copy['orderCount'] / filtered_orders_copy['fDays']
-        
-        # Create custom bins for orders per day
-        bins = [0, 101, 201, 301, 501, float('inf')]
-        labels = ['0-100', '101-200', '201-300', '301-500', '500+']
-        
-        # Cut the data into bins
-        orders_binned = pd.cut(filtered_orders_copy['orders_per_day'], bins=bins, labels=labels, right=False, include_lowest=True)
-        orders_counts = orders_binned.value_counts().reindex(labels, fill_value=0)
-        
-        # Create bar chart
-        fig_orders_per_day = px.bar(x=labels, y=orders_counts.values,
-                                   title='Orders Per Day Distribution (Custom Bins)')
-        fig_orders_per_day.update_xaxes(title='Orders Per Day Range')
-        fig_orders_per_day.update_yaxes(title='Count')
-        
-        # Calculate statistics
-        avg_orders = filtered_orders_copy['orders_per_day'].mean()
-        median_orders = filtered_orders_copy['orders_per_day'].median()
-        
-        # Add prominent statistical annotations
-        fig_orders_per_day.add_annotation(
-            x=0.2, y=0.95,
-            xref="paper", yref="paper",
-            text=f"<b style='color:red'>AVG: {avg_orders:.1f}</b>",
-            showarrow=False,
-            align="center",
-            bgcolor="rgba(255,255,255,0.95)",
-            bordercolor="red",
-            borderwidth=2,
-            font=dict(size=16, color="red")
-        )
-        
-        fig_orders_per_day.add_annotation(
-            x=0.8, y=0.95,
-            xref="paper", yref="paper",
-            text=f"<b style='color:blue'>MEDIAN: {median_orders:.1f}</b>",
-            showarrow=False,
-            align="center",
-            bgcolor="rgba(255,255,255,0.95)",
-            bordercolor="blue",
-            borderwidth=2,
-            font=dict(size=16, color="blue")
-        )
-    else:
-        fig_orders_per_day = px.bar(title='No Order Data Available')
-    
+    if summary['orders_rows'] > 0:
+        orders_counts = [summary['orders_bin_%d' % i] for i in range(len(ORDER_LABELS))]
+        avg_orders = summary['orders_per_day_mean']
+        median_orders = summary['orders_per_day_q50']
+        return ORDERS_FIGURE.fill({
+            ('data', 0, 'y'): orders_counts,
+            ('layout', 'annotations', 0, 'text'): f"<b style='color:red'>AVG: {avg_orders:.1f}</b>",
+            ('layout', 'annotations', 1, 'text'): f"<b style='color:blue'>MEDIAN: {median_orders:.1f}</b>",
+        })
+    return NO_ORDERS_FIGURE.fill()
+
+
+def render_avg_revenue(summary):
     # Revenue per day statistics table
-    revenue_data = filtered_df[filtered_df['revenue'] > 0]
-    if len(revenue_data) > 0:
-        revenue_per_day = revenue_data['revenue'] / revenue_data['fDays']
-        
-        # Calculate statistics
-        avg_rev = revenue_per_day.mean()
-        p25_rev = revenue_per_day.quantile(0.25)
-        p50_rev = revenue_per_day.quantile(0.50)
-        p75_rev = revenue_per_day.quantile(0.75)
-        
-        # Create a table-like display
-        table_data = {
-            'Statistic': ['Average', '25th Percentile', '50th Percentile (Median)', '75th Percentile'],
-            'Value': [f'{avg_rev:,.0f}', f'{p25_rev:,.0f}', f'{p50_rev:,.0f}', f'{p75_rev:,.0f}']
-        }
-        
-        fig_avg_revenue = px.bar(x=table_data['Statistic'], y=[1, 1, 1, 1],
-                                title='Revenue Per Day Statistics',
-                                text=[f"<b>{val}</b>" for val in table_data['Value']])
-        
-        fig_avg_revenue.update_traces(
-            textposition='inside',
-            textfont=dict(size=14, color='white'),
-            marker=dict(color=['#ff4444', '#4444ff', '#44ff44', '#ff44ff'])
-        )
-        
-        fig_avg_revenue.update_layout(
-            showlegend=False,
-            yaxis={'visible': False, 'range': [0, 1.2]},
-            xaxis={'title': ''},
-            height=300
-        )
-    else:
-        fig_avg_revenue = px.bar(title='No Revenue Data Available')
-    
+    if summary['revenue_rows'] > 0:
+        values = [summary['revenue_per_day_mean'], summary['revenue_per_day_q25'],
+                  summary['revenue_per_day_q50'], summary['revenue_per_day_q75']]
+        return REVENUE_FIGURE.fill({('data', 0, 'text'): [f"<b>{value:,.0f}</b>" for value in values]})
+    return NO_REVENUE_FIGURE.fill()
+
+
+def render_subscription(summary):
     # Subscription histogram with custom bins (like client tenure)
-    subscription_data = filtered_df[filtered_df['subscription'].notna()]  # Only exclude NaN values, include 0
-    if len(subscription_data) > 0:
-        # Create custom bins for subscription (0-50%, 50-70%, 70-90%, 90%+)
-        bins = [0, 0.5, 0.7, 0.9, float('inf')]
-        labels = ['0-50%', '50-70%', '70-90%', '90%+']
-        
-        # Cut the data into bins
-        subscription_binned = pd.cut(subscription_data['subscription'], bins=bins, labels=labels, right=False, include_lowest=True)
-        subscription_counts = subscription_binned.value_counts().reindex(labels, fill_value=0)
-        
-        # Create bar chart
-        fig_subscription = px.bar(x=labels, y=subscription_counts.values,
-                                 title='Subscription Distribution (Custom Bins)')
-        fig_subscription.update_xaxes(title='Subscription Range')
-        fig_subscription.update_yaxes(title='Count')
-        
-        # Calculate statistics
-        avg_subscription = subscription_data['subscription'].mean()
-        median_subscription = subscription_data['subscription'].median()
-        
-        # Add prominent statistical annotations (like tenure chart)
-        fig_subscription.add_annotation(
-            x=0.15, y=0.90,
-            xref="paper", yref="paper",
-            text=f"<b style='color:red'>AVERAGE: {avg_subscription:.1%}</b>",
-            showarrow=False,
-            align="center",
-            bgcolor="rgba(255,255,255,0.95)",
-            bordercolor="red",
-            borderwidth=2,
-            font=dict(size=14, color="red")
-        )
-        
-        fig_subscription.add_annotation(
-            x=0.85, y=0.90,
-            xref="paper", yref="paper",
-            text=f"<b style='color:blue'>MEDIAN: {median_subscription:.1%}</b>",
-            showarrow=False,
-            align="center",
-            bgcolor="rgba(255,255,255,0.95)",
-            bordercolor="blue",
-            borderwidth=2,
-            font=dict(size=14, color="blue")
-        )
-    else:
-        fig_subscription = px.bar(title='No Subscription Data Available')
+    if summary['subscription_count'] > 0:
+        subscription_counts = [summary['subscription_bin_%d' % i] for i in range(len(SUBSCRIPTION_LABELS))]
+        avg_subscription = summary['subscription_mean']
+        median_subscription = summary['subscription_q50']
+        return SUBSCRIPTION_FIGURE.fill({
+            ('data', 0, 'y'): subscription_counts,
+            ('layout', 'annotations', 0, 'text'): f"<b style='color:red'>AVERAGE: {avg_subscription:.1%}</b>",
+            ('layout', 'annotations', 1, 'text'): f"<b style='color:blue'>MEDIAN: {median_subscription:.1%}</b>",
+        })
+    return NO_SUBSCRIPTION_FIGURE.fill()
+
 
+def render_deactive_pie(summary):
     # Pie chart for deactive status
-    if len(both_eval_club_f) > 0:
-        deactive_only_eval = len(both_eval_club_f[(both_eval_club_f['eval_ratio'] <= 0.05) & (both_eval_club_f['Club_ratio'] > 0.05)])
-        deactive_only_club = len(both_eval_club_f[(both_eval_club_f['eval_ratio'] > 0.05) & (both_eval_club_f['Club_ratio'] <= 0.05)])
-        deactive_both = len(both_eval_club_f[(both_eval_club_f['eval_ratio'] <= 0.05) & (both_eval_club_f['Club_ratio'] <= 0.05)])
-        active_both = len(both_eval_club_f[(both_eval_club_f['eval_ratio'] > 0.05) & (both_eval_club_f['Club_ratio'] > 0.05)])
-        
-        fig_deactive_pie = px.pie(values=[deactive_only_eval, deactive_only_club, deactive_both, active_both],
-                                 names=['Only Deactive Eval', 'Only Deactive Club', 'Both Deactive', 'Both Active'],
-                                 title='Deactive Status Distribution')
-    else:
-        fig_deactive_pie = px.pie(values=[1], names=['No Data'], title='No Data Available')
-    
+    if summary['both'] > 0:
+        return DEACTIVE_PIE_FIGURE.fill({('data', 0, 'values'): [
+            summary['only_deactive_eval'], summary['only_deactive_club'], summary['both_low'], summary['active_both']]})
+    return NO_DATA_PIE_FIGURE.fill()
+
+
+def render_neg_charge(summary):
     # Negative charge days pie
-    neg_0 = len(filtered_df[filtered_df['HowManydayschargeisNegetive'] == 0])
-    neg_1_7 = len(filtered_df[(filtered_df['HowManydayschargeisNegetive'] > 0) & (filtered_df['HowManydayschargeisNegetive'] <= 7)])
-    neg_8_30 = len(filtered_df[(filtered_df['HowManydayschargeisNegetive'] >= 8) & (filtered_df['HowManydayschargeisNegetive'] <= 30)])
-    neg_30_plus = len(filtered_df[filtered_df['HowManydayschargeisNegetive'] > 30])
-    
-    fig_neg_charge = px.pie(values=[neg_0, neg_1_7, neg_8_30, neg_30_plus],
-                           names=['0 days', '1-7 days', '8-30 days', '30+ days'],
-                           title='Negative Charge Days Distribution')
-    
+    return NEG_CHARGE_FIGURE.fill(
+        {('data', 0, 'values'): [summary['neg_bin_%d' % i] for i in range(len(DAY_BUCKET_LABELS))]})
+
+
+def render_nodata_pie(summary):
     # No data days pie
-    nodata_0 = len(filtered_df[filtered_df['how_many_days_with_nodata'] == 0])
-    nodata_1_7 = len(filtered_df[(filtered_df['how_many_days_with_nodata'] > 0) & (filtered_df['how_many_days_with_nodata'] <= 7)])
-    nodata_8_30 = len(filtered_df[(filtered_df['how_many_days_with_nodata'] >= 8) & (filtered_df['how_many_days_with_nodata'] <= 30)])
-    nodata_30_plus = len(filtered_df[filtered_df['how_many_days_with_nodata'] > 30])
-    
-    fig_nodata_pie = px.pie(values=[nodata_0, nodata_1_7, nodata_8_30, nodata_30_plus],
-                           names=['0 days', '1-7 days', '8-30 days', '30+ days'],
-                           title='Days with No Data Distribution')
-    
+    return NODATA_FIGURE.fill(
+        {('data', 0, 'values'): [summary['nodata_bin_%d' % i] for i in range(len(DAY_BUCKET_LABELS))]})
+
+
+def render_tenure(summary):
     # Tenure histogram with custom bins and statistical lines
-    tenure_data = filtered_df['client_tenure_days\n'].dropna()
-    if len(tenure_data) > 0:
-        # Create custom bins
-        bins = [0, 31, 61, 91, 181, 366, float('inf')]
-        labels = ['0-30', '31-60', '61-90', '91-180', '181-365', '365+']
-        
-        # Cut the data into bins
-        tenure_binned = pd.cut(tenure_data, bins=bins, labels=labels, right=False, include_lowest=True)
-        tenure_counts = tenure_binned.value_counts().reindex(labels, fill_value=0)
-        
-        # Create bar chart with custom bins
-        fig_tenure = px.bar(x=labels, y=tenure_counts.values,
-                           title='Client Tenure Days Distribution (Custom Bins)')
-        fig_tenure.update_xaxes(title='Tenure Days Range')
-        fig_tenure.update_yaxes(title='Count')
-        
-        # Calculate statistics
-        avg_tenure = tenure_data.mean()
-        median_tenure = tenure_data.median()
-        p75_tenure = tenure_data.quantile(0.75)
-        
-        # Add multiple prominent statistical annotations
-        max_count = tenure_counts.max()
-        
-        # Average line annotation (as a red horizontal line for reference)
-        fig_tenure.add_annotation(
-            x=0.15, y=0.95,
-            xref="paper", yref="paper",
-            text=f"<b style='color:red'>AVERAGE: {avg_tenure:.0f} days</b>",
-            showarrow=False,
-            align="center",
-            bgcolor="rgba(255,255,255,0.95)",
-            bordercolor="red",
-            borderwidth=2,
-            font=dict(size=14, color="red")
-        )
-        
-        # Median annotation
-        fig_tenure.add_annotation(
-            x=0.5, y=0.95,
-            xref="paper", yref="paper",
-            text=f"<b style='color:blue'>MEDIAN: {median_tenure:.0f} days</b>",
-            showarrow=False,
-            align="center",
-            bgcolor="rgba(255,255,255,0.95)",
-            bordercolor="blue",
-            borderwidth=2,
-            font=dict(size=14, color="blue")
-        )
-        
-        # 75th percentile annotation
-        fig_tenure.add_annotation(
-            x=0.85, y=0.95,
-            xref="paper", yref="paper",
-            text=f"<b style='color:green'>75th %: {p75_tenure:.0f} days</b>",
-            showarrow=False,
-            align="center",
-            bgcolor="rgba(255,255,255,0.95)",
-            bordercolor="green",
-            borderwidth=2,
-            font=dict(size=14, color="green")
-        )
-        
-        # Add which bin each statistic falls into
+    if summary['tenure_count'] > 0:
+        tenure_counts = [summary['tenure_bin_%d' % i] for i in range(len(TENURE_LABELS))]
+        avg_tenure = summary['tenure_mean']
+        median_tenure = summary['tenure_q50']
+        p75_tenure = summary['tenure_q75']
+
+        # Which bin each statistic falls into
         def get_bin_for_value(value):
             if value <= 30:
                 return "0-30"
@@ -537,32 +687,345 @@ def update_dashboard(selected_salesperson, selected_city, selected_status):
                 return "181-365"
             else:
                 return "365+"
-        
-        # Add arrows pointing to the bins where statistics fall
+
         avg_bin = get_bin_for_value(avg_tenure)
         median_bin = get_bin_for_value(median_tenure)
         p75_bin = get_bin_for_value(p75_tenure)
-        
-        # Summary box at the bottom
-        fig_tenure.add_annotation(
-            x=0.5, y=0.02,
-            xref="paper", yref="paper",
-            text=f"<b>Summary:</b> Avg falls in {avg_bin} bin | Median falls in {median_bin} bin | 75% falls in {p75_bin} bin",
-            showarrow=False,
-            align="center",
-            bgcolor="rgba(240,240,240,0.95)",
-            bordercolor="black",
-            borderwidth=1,
-            font=dict(size=12)
+        return TENURE_FIGURE.fill({
+            ('data', 0, 'y'): tenure_counts,
+            ('layout', 'annotations', 0, 'text'): f"<b style='color:red'>AVERAGE: {avg_tenure:.0f} days</b>",
+            ('layout', 'annotations', 1, 'text'): f"<b style='color:blue'>MEDIAN: {median_tenure:.0f} days</b>",
+            ('layout', 'annotations', 2, 'text'): f"<b style='color:green'>75th %: {p75_tenure:.0f} days</b>",
+            ('layout', 'annotations', 3, 'text'): f"<b>Summary:</b> Avg falls in {avg_bin} bin | Median falls in {median_bin} bin | 75% falls in {p75_bin} bin",
+        })
+    return NO_TENURE_FIGURE.fill()
+
+# Dashboard sections: output id, output property, renderer and the summary fields the renderer reads
+SECTIONS = [
+    ('kpi-cards', 'children', render_kpi_cards,
+     ['both', 'only_eval', 'only_club', 'eval_low', 'club_low', 'both_low']),
+    ('city-deactive-eval', 'figure', render_city_eval, ['eval_rows', 'city_eval']),
+    ('city-deactive-club', 'figure', render_city_club, ['club_rows', 'city_club']),
+    ('salesperson-deactive', 'figure', render_salesperson, ['both', 'salesman_deactive']),
+    ('deactive-pie', 'figure', render_deactive_pie,
+     ['both', 'only_deactive_eval', 'only_deactive_club', 'both_low', 'active_both']),
+    ('branch-status-eval', 'figure', render_branch_status_eval, ['eval_rows', 'status_eval']),
+    ('branch-status-club', 'figure', render_branch_status_club, ['club_rows', 'status_club']),
+    ('orders-per-day-hist', 'figure', render_orders_per_day,
+     ['orders_rows'] + ['orders_bin_%d' % i for i in range(len(ORDER_LABELS))]
+     + ['orders_per_day_mean', 'orders_per_day_q50']),
+    ('avg-revenue-hist', 'figure', render_avg_revenue,
+     ['revenue_rows', 'revenue_per_day_mean', 'revenue_per_day_q25', 'revenue_per_day_q50', 'revenue_per_day_q75']),
+    ('subscription-hist', 'figure', render_subscription,
+     ['subscription_count'] + ['subscription_bin_%d' % i for i in range(len(SUBSCRIPTION_LABELS))]
+     + ['subscription_mean', 'subscription_q50']),
+    ('negative-charge-pie', 'figure', render_neg_charge, ['neg_bin_%d' % i for i in range(len(DAY_BUCKET_LABELS))]),
+    ('no-data-days-pie', 'figure', render_nodata_pie, ['nodata_bin_%d' % i for i in range(len(DAY_BUCKET_LABELS))]),
+    ('tenure-histogram', 'figure', render_tenure,
+     ['tenure_count'] + ['tenure_bin_%d' % i for i in range(len(TENURE_LABELS))]
+     + ['tenure_mean', 'tenure_q50', 'tenure_q75']),
+]
+
+
+def render_trend(selected_salesperson, selected_city, selected_status):
+    # History keeps the overall view and each dimension's values with the other two on 'All'
+    fixed = [(dim, value) for dim, value in zip(DIMENSIONS, [selected_salesperson, selected_city, selected_status])
+             if value != 'All']
+    if len(fixed) > 1:
+        return NO_TREND_FIGURE.fill()
+    level, value = fixed[0] if fixed else ('', None)
+    with timed(STAGES, 'lookup', 'history'):
+        trend = history.trend(level, value, [column for column, _ in TREND_SERIES])
+    dates = [date.date().isoformat() for date in trend.index]
+    changes = {}
+    for i, (column, _) in enumerate(TREND_SERIES):
+        changes[('data', i, 'x')] = dates
+        changes[('data', i, 'y')] = trend[column].tolist()
+    return TREND_FIGURE.fill(changes)
+
+
+def render_dashboard(summary):
+    return tuple(render(summary) for _, _, render, _ in SECTIONS)
+
+
+def full_output(output):
+    # What a section shows from scratch: figures are cached as FigureData, the KPI cards as components
+    return output.figure() if isinstance(output, FigureData) else output
+
+
+def reference_time(snapshot, as_of=None):
+    # The no-data pie counts days up to the snapshot's load time, or up to the end of an "as of" date
+    if not as_of:
+        return snapshot.today
+    return pd.Timestamp(as_of).normalize() + pd.Timedelta(days=1) - pd.Timedelta(1, unit='ns')
+
+
+def summarize_snapshot(snapshot, selected_salesperson, selected_city, selected_status, as_of=None):
+    # Ask the SQL backend, look the selection up in the precomputed cube, or summarize the indexed rows
+    with timed(SELECTIONS, *selection_shape(selected_salesperson, selected_city, selected_status)):
+        if snapshot.source is not None:
+            with timed(STAGES, 'lookup', 'sql'):
+                return snapshot.source.summary(selected_salesperson, selected_city, selected_status,
+                                               reference_time(snapshot, as_of))
+        if snapshot.cube is not None:
+            with timed(STAGES, 'lookup', 'cube'):
+                summary = snapshot.cube.lookup(selected_salesperson, selected_city, selected_status)
+        else:
+            with timed(STAGES, 'filter', 'index'):
+                rows = snapshot.index.select(selected_salesperson, selected_city, selected_status)
+                filtered_df = snapshot.index.take(snapshot.frame, rows, SUMMARY_COLUMNS)
+            summary = summarize_branches(filtered_df, section_pool)
+        if snapshot.facture is not None:
+            # The precomputed buckets are as of the load; these follow the snapshot's current date
+            summary.update(snapshot.facture.buckets(selected_salesperson, selected_city, selected_status,
+                                                    reference_time(snapshot, as_of)))
+        return summary
+
+
+def summarize_selection(snapshot, selected_salesperson, selected_city, selected_status, as_of=None):
+    # The filtered view every section renders from, computed once per selection and data version
+    return summary_cache.get_or_compute(
+        (selected_salesperson, selected_city, selected_status, as_of, snapshot.key),
+        lambda: summarize_snapshot(snapshot, selected_salesperson, selected_city, selected_status, as_of))
+
+
+def section_signature(summary, fields):
+    # Fingerprint of the data one section is drawn from; equal fingerprints draw the same output
+    parts = []
+    for field in fields:
+        value = summary[field]
+        if isinstance(value, pd.Series):
+            value = (tuple(value.index), tuple(value.tolist()))
+        parts.append(value)
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def render_section(snapshot, index, selected_salesperson, selected_city, selected_status, as_of=None,
+                   summary=None):
+    output_id, _, render, _ = SECTIONS[index]
+
+    def compute():
+        if summary is None:
+            selection_summary = summarize_selection(snapshot, selected_salesperson, selected_city, selected_status,
+                                                    as_of)
+        else:
+            selection_summary = summary
+        with timed(STAGES, 'render', output_id):
+            return render(selection_summary)
+
+    return result_cache.get_or_compute(
+        (output_id, selected_salesperson, selected_city, selected_status, as_of, snapshot.key), compute)
+
+
+# One callback per section so Dash can run them independently and the browser paints each as it arrives
+def register_section(index):
+    output_id, prop, _, fields = SECTIONS[index]
+
+    @app.callback(
+        [Output(output_id, prop),
+         Output(output_id + '-signature', 'data')],
+        [Input('salesperson-dropdown', 'value'),
+         Input('city-dropdown', 'value'),
+         Input('status-dropdown', 'value'),
+         Input('as-of-date', 'date')],
+        [State(output_id + '-signature', 'data')]
+    )
+    def update_section(selected_salesperson, selected_city, selected_status, as_of, previous):
+        start = time.perf_counter()
+        try:
+            return section_update(selected_salesperson, selected_city, selected_status, as_of, previous)
+        finally:
+            if metrics.enabled:
+                seconds = time.perf_counter() - start
+                STAGES.observe(seconds, 'callback', output_id)
+                # after_request attributes the rest of the request to serialisation
+                flask.g.notactive_callback = (output_id, seconds)
+
+    def section_update(selected_salesperson, selected_city, selected_status, as_of, previous):
+        snapshot = store.current()
+        summary = summarize_selection(snapshot, selected_salesperson, selected_city, selected_status, as_of)
+        signature = section_signature(summary, fields)
+        if previous and signature == previous['signature']:
+            # Same data as what the browser already shows: send nothing
+            return dash.no_update, dash.no_update
+        output = render_section(snapshot, index, selected_salesperson, selected_city, selected_status, as_of,
+                                summary)
+        if not isinstance(output, FigureData):
+            return output, {'signature': signature, 'template': None}
+        shown = {'signature': signature, 'template': output.template}
+        if PATCH_FIGURES and previous and previous['template'] == output.template:
+            # The browser already has this figure's styling: send only the changed data
+            return output.patch(), shown
+        return output.figure(), shown
+
+    return update_section
+
+
+def register_clientside():
+    app.clientside_callback(
+        ClientsideFunction(namespace='notactive', function_name='update_dashboard'),
+        [Output(output_id, prop) for output_id, prop, _, _ in SECTIONS],
+        [Input('client-data', 'data'),
+         Input('salesperson-dropdown', 'value'),
+         Input('city-dropdown', 'value'),
+         Input('status-dropdown', 'value')]
+    )
+
+    @app.callback(
+        Output('client-data', 'data'),
+        [Input('client-data-poll', 'n_intervals')],
+        [State('client-data', 'data')],
+        prevent_initial_call=True
+    )
+    def refresh_client_data(_, shown):
+        # The only server round trip left: a new dataset once the data has been reloaded
+        snapshot = store.current()
+        if shown and shown['key'] == str(snapshot.key):
+            return dash.no_update
+        return client_data(snapshot)
+
+
+# Refills one dropdown's options when another dropdown changes or the user types a search
+def register_options(dim, dropdown_id):
+    others = [(other, other_id) for other, other_id in DROPDOWNS if other != dim]
+    inputs = [Input(other_id, 'value') for _, other_id in others] + [Input(dropdown_id, 'search_value')]
+    if CLIENTSIDE:
+        app.clientside_callback(
+            ClientsideFunction(namespace='notactive', function_name=dim + '_options'),
+            Output(dropdown_id, 'options'),
+            [Input('client-data', 'data')] + inputs,
+            [State(dropdown_id, 'value')],
+            prevent_initial_call=True
         )
-        
-    else:
-        fig_tenure = px.bar(title='No Tenure Data Available')
-    
-    return (kpi_cards, fig_city_eval, fig_city_club, fig_salesperson, fig_deactive_pie, 
-            fig_branch_status_eval, fig_branch_status_club, fig_orders_per_day, fig_avg_revenue, 
-            fig_subscription, fig_neg_charge, fig_nodata_pie, fig_tenure)
+        return None
+
+    @app.callback(Output(dropdown_id, 'options'), inputs, [State(dropdown_id, 'value')], prevent_initial_call=True)
+    def update_options(first, second, search, current):
+        selection = {others[0][0]: first, others[1][0]: second}
+        with timed(STAGES, 'callback', dropdown_id):
+            return dropdown_options(store.current(), dim, selection, current, search)
+
+    return update_options
+
+
+if CLIENTSIDE:
+    register_clientside()
+else:
+    for index in range(len(SECTIONS)):
+        register_section(index)
+for dim, dropdown_id in DROPDOWNS:
+    register_options(dim, dropdown_id)
+
+
+# A server callback in every mode: the history is read from disk, not shipped to the browser
+def register_trend():
+    @app.callback(
+        Output('trend-chart', 'figure'),
+        [Input('salesperson-dropdown', 'value'),
+         Input('city-dropdown', 'value'),
+         Input('status-dropdown', 'value')]
+    )
+    def update_trend(selected_salesperson, selected_city, selected_status):
+        with timed(STAGES, 'callback', 'trend-chart'):
+            return render_trend(selected_salesperson, selected_city, selected_status).figure()
+
+    return update_trend
+
+
+if history is not None:
+    register_trend()
+
+
+def metrics_page():
+    # Prometheus text exposition of the stage timings, cache hit rates and the loaded data
+    snapshot = store.current()
+    caches = [('result', result_cache.stats()), ('summary', summary_cache.stats())]
+    return flask.Response(metrics.render(
+        metrics.gauge('notactive_cache_hits_total', 'Cache lookups answered from the cache',
+                      [({'cache': name}, stats['hits']) for name, stats in caches], kind='counter'),
+        metrics.gauge('notactive_cache_misses_total', 'Cache lookups that had to compute',
+                      [({'cache': name}, stats['misses']) for name, stats in caches], kind='counter'),
+        metrics.gauge('notactive_cache_evictions_total', 'Entries evicted to stay within the size limit',
+                      [({'cache': name}, stats['evictions']) for name, stats in caches], kind='counter'),
+        metrics.gauge('notactive_cache_hit_ratio', 'Share of cache lookups that were hits',
+                      [({'cache': name}, stats['hit_rate']) for name, stats in caches]),
+        metrics.gauge('notactive_cache_entries', 'Entries currently cached',
+                      [({'cache': name}, stats['size']) for name, stats in caches]),
+        metrics.gauge('notactive_data_version', 'Version of the loaded data, bumped on every reload',
+                      [({}, snapshot.version)]),
+        metrics.gauge('notactive_data_loaded_timestamp_seconds', 'Reference time of the loaded data',
+                      [({}, snapshot.today.timestamp())]),
+    ), mimetype='text/plain; version=0.0.4')
+
+
+def start_request_timer():
+    flask.g.notactive_request_start = time.perf_counter()
+
+
+def record_serialisation(response):
+    callback = flask.g.get('notactive_callback')
+    if callback is not None:
+        output_id, seconds = callback
+        STAGES.observe(time.perf_counter() - flask.g.notactive_request_start - seconds, 'serialise', output_id)
+    return response
+
+
+if metrics.enabled:
+    app.server.add_url_rule('/metrics', 'metrics', metrics_page)
+    app.server.before_request(start_request_timer)
+    app.server.after_request(record_serialisation)
+
+app.layout = serve_layout
+
+
+def warm_selection(snapshot, selected_salesperson, selected_city, selected_status):
+    # Cache the summary and every section of one selection as a first visit would
+    summary = summarize_selection(snapshot, selected_salesperson, selected_city, selected_status)
+    for index in range(len(SECTIONS)):
+        render_section(snapshot, index, selected_salesperson, selected_city, selected_status, summary=summary)
+
+
+# After startup and every data refresh, render the All rollups and each dropdown's NOTACTIVE_WARMUP_TOP
+# most common values on NOTACTIVE_WARMUP_THREADS background threads, so the first visitors hit the cache.
+# A warm-up stops after NOTACTIVE_WARMUP_LIMIT selections or NOTACTIVE_WARMUP_SECONDS (0: no limit);
+# NOTACTIVE_WARMUP_TOP=0 warms only the All/All/All view and NOTACTIVE_WARMUP=0 turns it off
+warmer = None
+
+
+def start_warmer():
+    # Warm the current data now and every reloaded one after it; a preforking server calls this in
+    # each worker after the fork instead (threads don't survive fork, see gunicorn.conf.py)
+    global warmer
+    warmer = Warmer(warm_selection,
+                    threads=int(os.environ.get('NOTACTIVE_WARMUP_THREADS', '2')),
+                    top=int(os.environ.get('NOTACTIVE_WARMUP_TOP', '10')),
+                    limit=int(os.environ.get('NOTACTIVE_WARMUP_LIMIT', '0')),
+                    seconds=float(os.environ.get('NOTACTIVE_WARMUP_SECONDS', '60')))
+    store.on_swap(warmer.start)
+    warmer.start(store.current())
+    return warmer
+
+
+if CLIENTSIDE:
+    # Nothing to render ahead of time; build the next dataset as soon as the data is reloaded
+    store.on_swap(client_data)
+elif os.environ.get('NOTACTIVE_WARMUP', '1') != '0' and os.environ.get('NOTACTIVE_START_RELOADER', '1') != '0':
+    start_warmer()
+
+
+def update_dashboard(selected_salesperson, selected_city, selected_status, as_of=None):
+    # Every section's output for one selection, outside of a Dash request
+    snapshot = store.current()
+    summary = summarize_selection(snapshot, selected_salesperson, selected_city, selected_status, as_of)
+
+    def section(index):
+        return full_output(render_section(snapshot, index, selected_salesperson, selected_city, selected_status,
+                                          as_of, summary))
+
+    if section_pool is None:
+        return tuple(section(index) for index in range(len(SECTIONS)))
+    return tuple(section_pool.map(section, range(len(SECTIONS))))
 
 # Run the app
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=10000, debug=False)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=10000, debug=False)
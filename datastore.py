@@ -0,0 +1,178 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from cooccurrence import CooccurrenceIndex
+from cube import Cube, DIMENSIONS
+from facture import FactureIndex
+from loader import load_branches
+from metrics import STAGES, timed
+from rowindex import RowIndex
+from sketch import k_for_error
+from sqlsource import SqlSource, TABLE
+from streaming import ingest
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot:
+    # Everything derived from one load of the workbook; never mutated after construction.
+    #
+    # `frame` is None for streamed loads, which only keep the cube.
+
+    def __init__(self, version, today, signature, frame=None, cube=None, index=None, options=None,
+                 facture=None, source=None, cooccurrence=None):
+        self.frame = frame
+        self.version = version
+        self.today = today
+        self.signature = signature
+        self.cube = cube
+        # Without a cube, selections are resolved through the inverted index instead of boolean masks
+        self.index = index
+        if options is None:
+            options = {dim: list(frame[dim].dropna().unique()) for dim in DIMENSIONS}
+        self.options = options
+        # Row counts per (salesman, city, BranchStatus) for the dependent dropdown options
+        if cooccurrence is None:
+            cooccurrence = CooccurrenceIndex.from_frame(frame, options)
+        self.cooccurrence = cooccurrence
+        # Sorted lastfacture per selection: the no-data buckets for any reference date (None when streamed)
+        self.facture = facture
+        # SQL backend: summaries are aggregate queries against the database, nothing else is held here
+        self.source = source
+
+    def rolled(self, version, today):
+        # Same data with a new reference date; the no-data buckets follow through `facture`
+        return Snapshot(version, today, self.signature, self.frame, self.cube, self.index, self.options,
+                        self.facture, self.source, self.cooccurrence)
+
+    @property
+    def key(self):
+        # Same in every worker that loaded the same workbook on the same day, unlike `version`
+        return self.signature, self.today.date().isoformat()
+
+
+def build_snapshot(path, version, today, signature, use_cube=True, stream=False, chunksize=50000, frame=None,
+                   sketch_k=None, lean=False, float32=False, backend='pandas', table=TABLE):
+    # Load `path` (or reuse an already loaded `frame`) and derive everything the callbacks read;
+    # sketch_k switches the cube's quantiles from exact to merged per-cell sketches (always on when streaming),
+    # lean and float32 are passed on to load_branches(). backend='sql' reads `table` of the SQLite/DuckDB
+    # file at `path` through aggregate queries instead
+    if backend == 'sql':
+        source = SqlSource(path, table)
+        options = source.options()
+        return Snapshot(version, today, signature, options=options, source=source,
+                        cooccurrence=CooccurrenceIndex(source.cell_rows(), options))
+    if stream:
+        cube, options, cooccurrence = ingest(path, today, chunksize, sketch_k or 200)
+        return Snapshot(version, today, signature, cube=cube, options=options, cooccurrence=cooccurrence)
+    if frame is None:
+        frame = load_branches(path, lean, float32)
+    # Day counts fit in int16 (float32 when some lastfacture is missing) instead of int64
+    days = (today - frame['lastfacture']).dt.days
+    frame['how_many_days_with_nodata'] = pd.to_numeric(days, downcast='integer' if days.notna().all() else 'float')
+    facture = FactureIndex(frame)
+    if use_cube:
+        return Snapshot(version, today, signature, frame=frame, cube=Cube.build(frame, sketch_k), facture=facture)
+    return Snapshot(version, today, signature, frame=frame, index=RowIndex(frame), facture=facture)
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class DataStore:
+    # Holds the current Snapshot and swaps in a rebuilt one when the workbook changes or the day rolls over.
+    #
+    # Readers call current() once per request and use that snapshot throughout, so they never see
+    # a half-loaded frame; rebuilding happens on a background thread.
+
+    def __init__(self, path, interval=30, use_cube=True, stream=False, chunksize=50000, sketch_error=None,
+                 lean=False, float32=False, backend='pandas', table=TABLE):
+        self.path = path
+        self.interval = interval
+        self.use_cube = use_cube
+        self.stream = stream
+        self.chunksize = chunksize
+        self.sketch_k = k_for_error(sketch_error) if sketch_error else None
+        self.lean = lean
+        self.float32 = float32
+        self.backend = backend
+        self.table = table
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._pending = None
+        self._thread = None
+        self._snapshot = self._build(1, datetime.now(), _signature(path))
+
+    def _build(self, version, today, signature):
+        mode = 'sql' if self.backend == 'sql' else 'stream' if self.stream else 'cube' if self.use_cube else 'index'
+        with timed(STAGES, 'load', mode):
+            return build_snapshot(self.path, version, today, signature, self.use_cube, self.stream,
+                                  self.chunksize, sketch_k=self.sketch_k, lean=self.lean, float32=self.float32,
+                                  backend=self.backend, table=self.table)
+
+    def current(self):
+        return self._snapshot
+
+    def on_swap(self, listener):
+        # listener(snapshot) runs on the refresher thread after every swap
+        self._listeners.append(listener)
+
+    def refresh(self, force=False):
+        # Rebuild if the workbook changed (and has stopped changing) or the date rolled over
+        with self._lock:
+            current = self._snapshot
+            now = datetime.now()
+            try:
+                signature = _signature(self.path)
+            except OSError:
+                logger.warning('%s is not readable, keeping data version %d', self.path, current.version)
+                return False
+
+            if force or signature != current.signature:
+                # Wait for one quiet interval so a workbook that is still being written isn't loaded
+                if not force and signature != self._pending:
+                    self._pending = signature
+                    return False
+                try:
+                    snapshot = self._build(current.version + 1, now, signature)
+                except Exception:
+                    logger.exception('Reloading %s failed, keeping data version %d', self.path, current.version)
+                    return False
+            elif now.date() != current.today.date():
+                # Same rows, new reference date: only the no-data buckets depend on it, and those are
+                # looked up for the new date through the facture index or the database (streamed loads
+                # re-read the file)
+                if current.facture is not None or current.source is not None:
+                    snapshot = current.rolled(current.version + 1, now)
+                else:
+                    snapshot = self._build(current.version + 1, now, current.signature)
+            else:
+                return False
+
+            self._pending = None
+            self._snapshot = snapshot
+        logger.info('Loaded data version %d from %s', snapshot.version, self.path)
+        for listener in self._listeners:
+            listener(snapshot)
+        return True
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='datastore-refresh', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Data refresh failed')
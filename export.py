@@ -0,0 +1,258 @@
+import argparse
+import hashlib
+import html
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import kaleido  # noqa: F401  (plotly's local image renderer, only needed for --formats png)
+except ImportError:
+    kaleido = None
+
+from cube import DIMENSIONS
+
+# Output formats: one .json and one .html file per combination, one .png per figure
+FORMATS = ['json', 'html', 'png']
+
+# Set in the parent before the pool forks, so workers inherit the loaded data instead of reloading it
+_dashboard = None
+_snapshot = None
+
+
+def selection_name(selection):
+    # File name stem of a selection: the fixed values, readable but filesystem safe, plus a short hash
+    # of the exact values so two values that only differ in punctuation don't collide
+    fixed = ['%s-%s' % (dim, value) for dim, value in zip(DIMENSIONS, selection) if value != 'All']
+    slug = re.sub(r'[^\w.-]+', '-', '_'.join(fixed)).strip('-')[:80] or 'all'
+    digest = hashlib.sha1(json.dumps(list(selection), ensure_ascii=False).encode('utf-8')).hexdigest()[:8]
+    return '%s-%s' % (slug, digest)
+
+
+def static_html(component):
+    # A Dash html component tree (as render_kpi_cards() builds it) as plain HTML
+    if component is None:
+        return ''
+    if isinstance(component, (list, tuple)):
+        return ''.join(static_html(child) for child in component)
+    if not hasattr(component, 'to_plotly_json'):
+        return html.escape(str(component))
+    props = component.to_plotly_json()['props']
+    tag = component._type.lower()
+    attributes = ''
+    if props.get('className'):
+        attributes += ' class="%s"' % html.escape(props['className'])
+    if props.get('style'):
+        style = ';'.join('%s:%s' % (re.sub(r'([A-Z])', r'-\1', name).lower(), value)
+                         for name, value in props['style'].items())
+        attributes += ' style="%s"' % html.escape(style)
+    return '<%s%s>%s</%s>' % (tag, attributes, static_html(props.get('children')), tag)
+
+
+def render_outputs(selection):
+    # The 13 dashboard outputs of one selection: {output_id: figure dict or html component}
+    summary = _dashboard.summarize_snapshot(_snapshot, *selection)
+    outputs = {}
+    for output_id, _, render, _ in _dashboard.SECTIONS:
+        output = render(summary)
+        outputs[output_id] = output.figure() if isinstance(output, _dashboard.FigureData) else output
+    return outputs
+
+
+def write_json(path, selection, rows, outputs):
+    from plotly.io.json import to_json_plotly
+    document = {'selection': dict(zip(DIMENSIONS, selection)), 'rows': rows, 'data_date': _snapshot.today.isoformat(),
+                'outputs': outputs}
+    with open(path, 'w', encoding='utf-8') as out:
+        out.write(to_json_plotly(document))
+
+
+def write_html(path, selection, rows, outputs):
+    import plotly.io as pio
+    title = ' / '.join(str(value) for value in selection)
+    parts = ['<!DOCTYPE html><html><head><meta charset="utf-8"><title>%s</title>' % html.escape(title),
+             '<script src="plotly.min.js"></script></head><body>',
+             '<h1 style="text-align:center;color:#2c3e50">Not Active license Dashboard</h1>',
+             '<p style="text-align:center">%s: %d branches, data of %s</p>'
+             % (html.escape(title), rows, _snapshot.today.date().isoformat())]
+    for output_id, output in outputs.items():
+        if isinstance(output, dict):
+            parts.append(pio.to_html(output, include_plotlyjs=False, full_html=False, validate=False,
+                                     div_id=output_id))
+        else:
+            parts.append('<div id="%s" style="margin:20px">%s</div>' % (output_id, static_html(output)))
+    parts.append('</body></html>')
+    with open(path, 'w', encoding='utf-8') as out:
+        out.write('\n'.join(parts))
+
+
+def write_png(stem, outputs):
+    import plotly.io as pio
+    for output_id, output in outputs.items():
+        if isinstance(output, dict):
+            pio.write_image(output, '%s.%s.png' % (stem, output_id), format='png', validate=False)
+
+
+def export_chunk(jobs, directory, formats):
+    # Render and write a chunk of (selection, rows) jobs; returns the seconds spent per stage and bytes written
+    seconds = {'render': 0.0, 'write': 0.0}
+    written = 0
+    for selection, rows in jobs:
+        start = time.perf_counter()
+        outputs = render_outputs(selection)
+        rendered = time.perf_counter()
+        stem = os.path.join(directory, selection_name(selection))
+        paths = []
+        if 'json' in formats:
+            write_json(stem + '.json', selection, rows, outputs)
+            paths.append(stem + '.json')
+        if 'html' in formats:
+            write_html(stem + '.html', selection, rows, outputs)
+            paths.append(stem + '.html')
+        if 'png' in formats:
+            write_png(stem, outputs)
+            paths.extend('%s.%s.png' % (stem, output_id) for output_id, output in outputs.items()
+                         if isinstance(output, dict))
+        written += sum(os.path.getsize(path) for path in paths)
+        seconds['render'] += rendered - start
+        seconds['write'] += time.perf_counter() - rendered
+    return len(jobs), seconds, written
+
+
+def selections(snapshot, groupings):
+    # (selection, rows) for the overall view and every combination with rows of each grouping, e.g.
+    # [['salesman'], ['city'], ['salesman', 'city']]; all from one pass over the co-occurrence index
+    jobs = [(('All',) * len(DIMENSIONS), snapshot.cooccurrence.combinations([])[0][1])]
+    seen = {jobs[0][0]}
+    for dims in groupings:
+        for values, rows in snapshot.cooccurrence.combinations(dims):
+            fixed = dict(zip([dim for dim in DIMENSIONS if dim in dims], values))
+            selection = tuple(fixed.get(dim, 'All') for dim in DIMENSIONS)
+            if selection not in seen:
+                seen.add(selection)
+                jobs.append((selection, rows))
+    return jobs
+
+
+class Progress:
+    # One status line on stderr, redrawn at most every `interval` seconds
+
+    def __init__(self, total, interval=1.0):
+        self.total = total
+        self.done = 0
+        self.interval = interval
+        self.start = self.shown = time.perf_counter()
+
+    def advance(self, count):
+        self.done += count
+        now = time.perf_counter()
+        if now - self.shown >= self.interval or self.done == self.total:
+            self.shown = now
+            rate = self.done / max(now - self.start, 1e-9)
+            remaining = (self.total - self.done) / rate if rate else 0
+            sys.stderr.write('\r%d/%d combinations  %.1f/s  ETA %ds   ' % (self.done, self.total, rate, remaining))
+            if self.done == self.total:
+                sys.stderr.write('\n')
+            sys.stderr.flush()
+
+
+def export(directory, groupings, formats, processes=1, chunk=16):
+    # Write every combination of `groupings` in `formats` to `directory`; returns the throughput report
+    global _dashboard, _snapshot
+    import plotly.offline
+    start = time.perf_counter()
+    import dashboard
+    _dashboard = dashboard
+    _snapshot = dashboard.store.current()
+    loaded = time.perf_counter() - start
+
+    os.makedirs(directory, exist_ok=True)
+    if 'html' in formats:
+        with open(os.path.join(directory, 'plotly.min.js'), 'w', encoding='utf-8') as out:
+            out.write(plotly.offline.get_plotlyjs())
+    jobs = selections(_snapshot, groupings)
+    chunks = [jobs[position:position + chunk] for position in range(0, len(jobs), chunk)]
+
+    progress = Progress(len(jobs))
+    seconds = {'render': 0.0, 'write': 0.0}
+    written = 0
+    start = time.perf_counter()
+    if processes > 1:
+        # fork: workers start with the snapshot already in memory
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(processes, mp_context=context) as pool:
+            futures = [pool.submit(export_chunk, part, directory, formats) for part in chunks]
+            for future in as_completed(futures):
+                count, part_seconds, part_written = future.result()
+                for stage in seconds:
+                    seconds[stage] += part_seconds[stage]
+                written += part_written
+                progress.advance(count)
+    else:
+        for part in chunks:
+            count, part_seconds, part_written = export_chunk(part, directory, formats)
+            for stage in seconds:
+                seconds[stage] += part_seconds[stage]
+            written += part_written
+            progress.advance(count)
+    elapsed = time.perf_counter() - start
+
+    with open(os.path.join(directory, 'index.json'), 'w', encoding='utf-8') as out:
+        json.dump({'data_date': _snapshot.today.isoformat(), 'formats': formats,
+                   'combinations': [{'selection': dict(zip(DIMENSIONS, selection)), 'rows': rows,
+                                     'file': selection_name(selection)} for selection, rows in jobs]},
+                  out, ensure_ascii=False, indent=1)
+    return {'combinations': len(jobs), 'outputs': len(jobs) * len(dashboard.SECTIONS), 'processes': processes,
+            'load_seconds': loaded, 'seconds': elapsed, 'combinations_per_second': len(jobs) / elapsed,
+            'render_ms': seconds['render'] / len(jobs) * 1000, 'write_ms': seconds['write'] / len(jobs) * 1000,
+            'megabytes': written / 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render every dashboard view of the current data to static files')
+    parser.add_argument('output', help='directory to write the files and index.json to')
+    parser.add_argument('--path', help='workbook (or database) to export; default NOTACTIVE_PATH as the dashboard')
+    parser.add_argument('--by', action='append', metavar='DIMS',
+                        help='comma separated dimensions to export every combination of, repeatable '
+                             '(default: --by salesman --by city); the overall view is always included')
+    parser.add_argument('--formats', default='json,html', help='comma separated: %s' % ', '.join(FORMATS))
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk', type=int, default=16, help='combinations per task handed to a process')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    formats = [name for name in args.formats.split(',') if name]
+    unknown = [name for name in formats if name not in FORMATS]
+    if unknown:
+        parser.error('unknown format(s): %s' % ', '.join(unknown))
+    if 'png' in formats and kaleido is None:
+        parser.error('--formats png needs kaleido (pip install kaleido)')
+    groupings = [dims.split(',') for dims in (args.by or ['salesman', 'city'])]
+    unknown = [dim for dims in groupings for dim in dims if dim not in DIMENSIONS]
+    if unknown:
+        parser.error('unknown dimension(s): %s (choose from %s)' % (', '.join(unknown), ', '.join(DIMENSIONS)))
+
+    # Load once into the cube (every combination is then a lookup), without the dashboard's background
+    # reloader and warm-up
+    if args.path:
+        os.environ['NOTACTIVE_PATH'] = args.path
+    os.environ['NOTACTIVE_CUBE'] = '1'
+    os.environ['NOTACTIVE_START_RELOADER'] = '0'
+    os.environ['NOTACTIVE_WARMUP'] = '0'
+    report = export(args.output, groupings, formats, max(args.processes, 1), max(args.chunk, 1))
+    if args.json:
+        print(json.dumps(report))
+        return
+    print('%d combinations (%d outputs) in %.2f s on %d process(es): %.1f combinations/s, %.0f outputs/s'
+          % (report['combinations'], report['outputs'], report['seconds'], report['processes'],
+             report['combinations_per_second'], report['outputs'] / report['seconds']))
+    print('load %.2f s, render %.2f ms and write %.2f ms per combination, %.1f MB written'
+          % (report['load_seconds'], report['render_ms'], report['write_ms'], report['megabytes']))
+
+
+if __name__ == '__main__':
+    main()
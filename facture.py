@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from cube import DIMENSIONS, DAY_BUCKET_LABELS, _subsets
+
+_DAY = pd.Timedelta(days=1).value
+
+# A branch whose last invoice is `days` whole days old lands in the bucket whose range holds it:
+# 0, 1-7, 8-30 and 30+ days, the same buckets as the no-data pie
+_BUCKET_EDGES = [31, 8, 1, 0]
+
+
+class FactureIndex:
+    # `lastfacture` timestamps sorted within every dropdown combination (every cube level group).
+    #
+    # The no-data buckets for any reference time are then four binary searches in the selected
+    # group's slice, so moving the reference date (each new day, or an "as of" date picked in the
+    # dashboard) never touches the rows again.
+
+    def __init__(self, frame):
+        lastfacture = frame['lastfacture'].to_numpy(dtype='datetime64[ns]')
+        stamps = lastfacture.view('int64')
+        dated = ~np.isnat(lastfacture)
+        self._groups = {}
+        for fixed in _subsets():
+            if fixed:
+                grouped = frame.groupby(list(fixed), sort=True, observed=True)
+                codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)  # NaN keys only count under 'All'
+                keys = {key: code for code, key in enumerate(grouped.size().index)}
+            else:
+                codes = np.zeros(len(frame), dtype=np.int64)
+                keys = {(): 0}
+            present = dated & (codes >= 0)
+            order = np.lexsort((stamps[present], codes[present]))
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(codes[present], minlength=len(keys)))])
+            self._groups[fixed] = (keys, offsets, stamps[present][order])
+
+    def buckets(self, selected_salesperson, selected_city, selected_status, reference):
+        # nodata_bin_0..3 of a selection as of `reference`, matching (reference - lastfacture).dt.days
+        selection = dict(zip(DIMENSIONS, [selected_salesperson, selected_city, selected_status]))
+        fixed = tuple(dim for dim in DIMENSIONS if selection[dim] != 'All')
+        key = tuple(selection[dim] for dim in fixed)
+        keys, offsets, stamps = self._groups[fixed]
+        code = keys.get(key[0] if len(key) == 1 else key)
+        if code is None:
+            return {'nodata_bin_%d' % i: 0 for i in range(len(DAY_BUCKET_LABELS))}
+
+        # n whole days old <=> reference - (n + 1) days < lastfacture <= reference - n days
+        group = stamps[offsets[code]:offsets[code + 1]]
+        reference = pd.Timestamp(reference).value
+        older = np.searchsorted(group, [reference - days * _DAY for days in _BUCKET_EDGES], side='right')
+        counts = {
+            'nodata_bin_3': older[0],
+            'nodata_bin_2': older[1] - older[0],
+            'nodata_bin_1': older[2] - older[1],
+            'nodata_bin_0': older[3] - older[2],
+        }
+        return {name: int(counts[name]) for name in sorted(counts)}
@@ -0,0 +1,52 @@
+from dash import Patch
+
+# Every template by name, so a FigureData (which only carries the name) can be drawn in any process
+_TEMPLATES = {}
+
+
+def _assign(node, path, value):
+    # Copy of `node` with `value` at `path`; only the containers along the path are copied
+    if not path:
+        return value
+    node = list(node) if isinstance(node, list) else dict(node)
+    node[path[0]] = _assign(node[path[0]], path[1:], value)
+    return node
+
+
+class FigureTemplate:
+    # A figure styled once at startup; callbacks only swap in the properties that carry data
+    # (trace x/y/values/text, annotation text) instead of rebuilding it with Plotly Express.
+
+    def __init__(self, name, figure):
+        self.name = name
+        self.figure = figure.to_dict()
+        _TEMPLATES[name] = self
+
+    def fill(self, changes=None):
+        # changes: {path: value}, e.g. {('data', 0, 'y'): [3, 1], ('layout', 'annotations', 0, 'text'): 'AVG: 2'}
+        return FigureData(self.name, [(path, value) for path, value in (changes or {}).items()])
+
+
+class FigureData:
+    # One rendered figure as its template name plus the changed properties; small to cache and to send
+
+    def __init__(self, template, changes):
+        self.template = template
+        self.changes = changes
+
+    def figure(self):
+        # The complete figure dict, for a browser that doesn't show this template yet
+        figure = _TEMPLATES[self.template].figure
+        for path, value in self.changes:
+            figure = _assign(figure, path, value)
+        return figure
+
+    def patch(self):
+        # Only the changed properties, for a browser already showing a figure of the same template
+        patch = Patch()
+        for path, value in self.changes:
+            target = patch
+            for key in path[:-1]:
+                target = target[key]
+            target[path[-1]] = value
+        return patch
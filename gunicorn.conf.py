@@ -0,0 +1,27 @@
+import multiprocessing
+import os
+
+# Load the workbook once in the master; forked workers share it copy-on-write
+preload_app = True
+
+bind = '0.0.0.0:%s' % os.environ.get('PORT', '10000')
+# One process per core for the CPU-bound pandas work, a few threads each for cheap cache hits and I/O
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('NOTACTIVE_THREADS', '4'))
+# Snapshot builds on reload run in each worker's background thread; keep room for slow first requests
+timeout = int(os.environ.get('NOTACTIVE_WORKER_TIMEOUT', '120'))
+
+# The master never serves requests and its threads wouldn't survive the fork, so it preloads the app
+# with the reloader and warm-up off; each worker then starts them as configured
+START_RELOADER = os.environ.get('NOTACTIVE_START_RELOADER', '1') != '0'
+WARMUP = os.environ.get('NOTACTIVE_WARMUP', '1') != '0'
+os.environ['NOTACTIVE_START_RELOADER'] = '0'
+os.environ['NOTACTIVE_WARMUP'] = '0'
+
+
+def post_fork(server, worker):
+    import dashboard
+    if START_RELOADER:
+        dashboard.store.start()
+    if WARMUP and not dashboard.CLIENTSIDE:
+        dashboard.start_warmer()
@@ -0,0 +1,256 @@
+import argparse
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # no history store
+    pa = None
+
+from cube import DIMENSIONS, COUNT_COLUMNS, SUM_COLUMNS, QUANTILE_COLUMNS, row_measures, _aggregate
+
+logger = logging.getLogger(__name__)
+
+# Recorded aggregates: everything, and every value of each dimension with the other two on 'All'
+LEVELS = [()] + [(dim,) for dim in DIMENSIONS]
+
+# Per-level columns: branch count, the cube's additive counters and sums, and the quantiles (exact,
+# from the sketches when the cube has them, NaN per value for the SQL backend)
+LEVEL_COLUMNS = ['rows'] + COUNT_COLUMNS + SUM_COLUMNS + QUANTILE_COLUMNS
+
+PARTITION = 'export_date'
+
+# Counters kept in the trend rollup: every chartable deactive count and what it is a share of
+TREND_COLUMNS = ['rows', 'both', 'eval_rows', 'eval_deactive', 'club_rows', 'club_deactive', 'eval_low', 'club_low',
+                 'both_low']
+
+# Trend columns of every recorded file, sorted by member then date (rebuilt after each record)
+ROLLUP = '_trends.parquet'
+
+
+def _member_key(levels, values):
+    # One sortable string per (level, value): the rollup is ordered by it
+    return (levels.astype(str) + '\x1f' + values.fillna('').astype(str)).to_numpy(dtype=object)
+
+
+def export_date(snapshot):
+    # The export's date is the workbook's (or database's) modification date
+    return datetime.fromtimestamp(snapshot.signature[0] / 1e9).date()
+
+
+def _level_table(snapshot, fixed):
+    # LEVEL_COLUMNS per member of one level, indexed by the member's value (one unnamed row for everything)
+    cube = snapshot.cube
+    if cube is not None:
+        table = cube.levels[fixed].copy()
+        if cube.sketches is not None:
+            keys = table.index if fixed else [()]
+            quantiles = [cube._sketch_quantiles(fixed, key) for key in keys]
+            table = table.assign(**{name: [values[name] for values in quantiles] for name in QUANTILE_COLUMNS})
+    elif snapshot.frame is not None:
+        table = _aggregate(row_measures(snapshot.frame), list(fixed))
+    elif fixed:
+        table = snapshot.source.counters(fixed[0], snapshot.today)
+    else:
+        summary = snapshot.source.summary('All', 'All', 'All', snapshot.today)
+        table = pd.DataFrame([{name: summary[name] for name in COUNT_COLUMNS + QUANTILE_COLUMNS}])
+        for name in SUM_COLUMNS:
+            metric = name[:-len('_sum')]
+            table[name] = np.nan_to_num(summary['%s_mean' % metric]) * summary['%s_count' % metric]
+    rows = dict(snapshot.cooccurrence.combinations(fixed))
+    keys = [(key,) for key in table.index] if fixed else [()]
+    table['rows'] = [rows.get(key, 0) for key in keys]
+    return table.reindex(columns=LEVEL_COLUMNS)
+
+
+def snapshot_levels(snapshot):
+    # One row per (level, value) of LEVELS: level is '' for everything or the dimension's name
+    parts = []
+    for fixed in LEVELS:
+        table = _level_table(snapshot, fixed)
+        values = [str(value) for value in table.index] if fixed else [None]
+        parts.append(table.reset_index(drop=True).assign(level=fixed[0] if fixed else '', value=values))
+    levels = pd.concat(parts, ignore_index=True)
+    levels[COUNT_COLUMNS + ['rows']] = levels[COUNT_COLUMNS + ['rows']].astype('int64')
+    levels[SUM_COLUMNS + QUANTILE_COLUMNS] = levels[SUM_COLUMNS + QUANTILE_COLUMNS].astype('float64')
+    levels['loaded_at'] = pd.Timestamp(snapshot.today)
+    return levels[['level', 'value', 'loaded_at'] + LEVEL_COLUMNS].sort_values(['level', 'value'], kind='stable')
+
+
+class HistoryStore:
+    # Append-only Parquet store of every load's per-level aggregates, partitioned by export date.
+    #
+    # Each load becomes one zstd-compressed file under export_date=YYYY-MM-DD/, named after the
+    # workbook signature so reloading (or every worker recording) the same export writes it once.
+    # Reading one member across hundreds of such files would open every one of them, so each record
+    # also rewrites a rollup of TREND_COLUMNS sorted by member and date: a trend query reads the one
+    # or two small row groups holding its member, found from the rollup's cached row group statistics.
+
+    def __init__(self, directory, row_group_size=8192, cached_trends=1024):
+        if pa is None:
+            raise ImportError('The history store needs the pyarrow package')
+        self.directory = directory
+        self.row_group_size = row_group_size
+        self.cached_trends = cached_trends
+        self._lock = threading.Lock()
+        self._files = None
+        self._rollup = None
+        self._trends = {}
+
+    def _path(self, snapshot, date):
+        name = '%d-%d.parquet' % tuple(snapshot.signature)
+        return os.path.join(self.directory, '%s=%s' % (PARTITION, date.isoformat()), name)
+
+    def record(self, snapshot, date=None):
+        # Write one snapshot's aggregates; returns the new file, or None when it was already recorded
+        date = date or export_date(snapshot)
+        path = self._path(snapshot, date)
+        if os.path.exists(path):
+            return None
+        table = pa.Table.from_pandas(snapshot_levels(snapshot), preserve_index=False)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+        self.roll_up()
+        return path
+
+    def on_load(self, snapshot):
+        # DataStore listener: a failed record is logged rather than raised into the reloader
+        try:
+            path = self.record(snapshot)
+        except Exception:
+            logger.exception('Recording data version %d in %s failed', snapshot.version, self.directory)
+            return
+        if path is not None:
+            logger.info('Recorded data version %d as %s', snapshot.version, path)
+
+    def files(self):
+        # Recorded files, relative to the store's directory
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted('%s/%s' % (partition.name, entry.name)
+                      for partition in os.scandir(self.directory)
+                      if partition.is_dir() and partition.name.startswith(PARTITION + '=')
+                      for entry in os.scandir(partition.path) if entry.name.endswith('.parquet'))
+
+    def _dataset(self, files):
+        return ds.dataset([os.path.join(self.directory, name) for name in files], format='parquet',
+                          partitioning=ds.partitioning(pa.schema([(PARTITION, pa.string())]), flavor='hive'),
+                          partition_base_dir=self.directory)
+
+    def _open_rollup(self):
+        # (covered files, ParquetFile, [(first key, last key)] per row group) of the rollup, or None
+        path = os.path.join(self.directory, ROLLUP)
+        try:
+            stamp = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        if self._rollup is None or self._rollup[0] != stamp:
+            rollup = pq.ParquetFile(path)
+            covered = frozenset(json.loads(rollup.schema_arrow.metadata[b'files']))
+            column = rollup.schema_arrow.get_field_index('key')
+            ranges = [(group.column(column).statistics.min, group.column(column).statistics.max)
+                      for group in (rollup.metadata.row_group(i) for i in range(rollup.num_row_groups))]
+            self._rollup = (stamp, covered, rollup, ranges)
+        return self._rollup[1:]
+
+    def roll_up(self):
+        # Fold the recorded files the rollup doesn't cover yet into it
+        with self._lock:
+            files = self.files()
+            current = self._open_rollup()
+            covered = current[0] if current else frozenset()
+            added = [name for name in files if name not in covered]
+            if not added:
+                return
+            columns = ['level', 'value', 'loaded_at'] + TREND_COLUMNS
+            added_rows = self._dataset(added).to_table(columns=[PARTITION] + columns).to_pandas()
+            added_rows.insert(0, 'key', _member_key(added_rows.pop('level'), added_rows.pop('value')))
+            parts = [current[1].read().to_pandas(), added_rows] if current else [added_rows]
+            rows = pd.concat(parts, ignore_index=True).sort_values(['key', PARTITION, 'loaded_at'], kind='stable')
+            rows = rows.drop_duplicates(['key', PARTITION], keep='last')
+
+            table = pa.Table.from_pandas(rows, preserve_index=False)
+            table = table.replace_schema_metadata({'files': json.dumps(sorted(covered | set(added)))})
+            path = os.path.join(self.directory, ROLLUP)
+            tmp_path = '%s.%d.tmp' % (path, os.getpid())
+            pq.write_table(table, tmp_path, compression='zstd', row_group_size=self.row_group_size)
+            os.replace(tmp_path, path)
+
+    def trend(self, level='', value=None, columns=('eval_deactive', 'club_deactive', 'both_low')):
+        # `columns` of one level member (level '' for everything) per export date, oldest first; the
+        # latest load of a date wins when an export was replaced the same day
+        columns = list(columns)
+        files = self.files()
+        with self._lock:
+            if files != self._files:
+                self._files = files
+                self._trends = {}
+            cache_key = (level, value, tuple(columns))
+            if cache_key in self._trends:
+                return self._trends[cache_key]
+            rollup = self._open_rollup() if set(columns) <= set(TREND_COLUMNS) else None
+
+        key = _member_key(pd.Series([level]), pd.Series([value], dtype=object))[0]
+        parts = []
+        pending = files
+        if rollup is not None:
+            covered, rollup_file, ranges = rollup
+            groups = [i for i, (first, last) in enumerate(ranges) if first <= key <= last]
+            if groups:
+                rows = rollup_file.read_row_groups(groups, columns=['key', PARTITION, 'loaded_at'] + columns)
+                parts.append(rows.filter(pc.field('key') == key).drop_columns(['key']).to_pandas())
+            pending = [name for name in files if name not in covered]
+        if pending:
+            # Loads recorded since the last roll-up (or columns the rollup doesn't keep) come from the files
+            condition = pc.field('level') == level
+            condition &= pc.field('value').is_null() if value is None else pc.field('value') == str(value)
+            parts.append(self._dataset(pending).to_table(columns=[PARTITION, 'loaded_at'] + columns,
+                                                         filter=condition).to_pandas())
+
+        frame = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=[PARTITION, 'loaded_at'] + columns)
+        frame = frame.sort_values('loaded_at').drop_duplicates(PARTITION, keep='last')
+        frame.index = pd.DatetimeIndex(pd.to_datetime(frame.pop(PARTITION)), name=PARTITION)
+        trend = frame.sort_index()[columns]
+        with self._lock:
+            if len(self._trends) >= self.cached_trends:
+                self._trends.clear()
+            self._trends[cache_key] = trend
+        return trend
+
+
+def main():
+    # Backfill: record old exports, e.g. python history.py history notActive-2025-*.xlsx
+    from datastore import build_snapshot
+
+    parser = argparse.ArgumentParser(description='Record the aggregates of workbooks in the history store')
+    parser.add_argument('directory', help='history store directory (NOTACTIVE_HISTORY)')
+    parser.add_argument('workbooks', nargs='+')
+    parser.add_argument('--date', help='export date (YYYY-MM-DD) when recording a single workbook; default '
+                                       'its modification date')
+    args = parser.parse_args()
+    if args.date and len(args.workbooks) > 1:
+        parser.error('--date needs a single workbook')
+
+    store = HistoryStore(args.directory)
+    for path in args.workbooks:
+        stat = os.stat(path)
+        signature = stat.st_mtime_ns, stat.st_size
+        date = datetime.strptime(args.date, '%Y-%m-%d').date() if args.date else None
+        today = datetime.combine(date, datetime.min.time()) if date else datetime.fromtimestamp(stat.st_mtime)
+        written = store.record(build_snapshot(path, 1, today, signature), date)
+        print('%s: %s' % (path, written or 'already recorded'))
+
+
+if __name__ == '__main__':
+    main()
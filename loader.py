@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # no snapshot cache, parse the workbook on every start
+    pa = None
+
+from cube import DIMENSIONS, SUMMARY_COLUMNS
+
+# Snapshots live next to the workbook unless NOTACTIVE_CACHE_DIR says otherwise
+CACHE_DIR = os.environ.get('NOTACTIVE_CACHE_DIR')
+
+# Bump when the column handling below changes so old snapshots are rebuilt
+CACHE_FORMAT = 1
+
+# Workbook columns the dashboard reads (how_many_days_with_nodata is derived from lastfacture);
+# a lean load keeps only these
+USED_COLUMNS = [column for column in SUMMARY_COLUMNS if column != 'how_many_days_with_nodata'] + ['lastfacture']
+
+# Ratios that may be stored as float32 even where that rounds them. Lossy: a ratio within float32
+# rounding of the 0.05 deactive threshold can land on the other side of it
+FLOAT32_COLUMNS = ['eval_ratio', 'Club_ratio', 'subscription']
+
+
+def normalize_branches(frame):
+    # Clean column names and use compact dtypes for the columns the dashboard filters and counts on
+    frame = frame.rename(columns=lambda name: name.strip() if isinstance(name, str) else name)
+    for dim in DIMENSIONS:
+        frame[dim] = frame[dim].astype('category')
+    for column in frame.columns:
+        values = frame[column]
+        if pd.api.types.is_integer_dtype(values) and not isinstance(values.dtype, pd.CategoricalDtype):
+            frame[column] = pd.to_numeric(values, downcast='integer')
+        elif pd.api.types.is_float_dtype(values):
+            # Only when lossless: the deactive flags compare ratios against 0.05 exactly
+            compact = values.astype('float32')
+            if ((compact.astype('float64') == values) | values.isna()).all():
+                frame[column] = compact
+    return frame
+
+
+def _used_column(name):
+    return (name.strip() if isinstance(name, str) else name) in USED_COLUMNS
+
+
+def _ratios_to_float32(frame):
+    for column in FLOAT32_COLUMNS:
+        if column in frame.columns:
+            frame[column] = frame[column].astype('float32')
+    return frame
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_paths(path):
+    directory = CACHE_DIR or os.path.join(os.path.dirname(os.path.abspath(path)), '.cache')
+    name = os.path.basename(path)
+    return directory, os.path.join(directory, name + '.arrow'), os.path.join(directory, name + '.json')
+
+
+def _cached_digest(meta_path, stat):
+    # Trust the stored digest while mtime and size are unchanged, otherwise rehash the workbook
+    try:
+        with open(meta_path) as meta_file:
+            meta = json.load(meta_file)
+    except (OSError, ValueError):
+        return None, None
+    if meta.get('format') != CACHE_FORMAT:
+        return None, None
+    if meta.get('mtime_ns') == stat.st_mtime_ns and meta.get('size') == stat.st_size:
+        return meta.get('sha256'), meta
+    return None, meta
+
+
+def load_branches(path='notActive.xlsx', lean=False, float32=False):
+    # Parse the workbook once and memory-map an Arrow snapshot of it on later starts. lean keeps only
+    # USED_COLUMNS; float32 also stores the ratios in FLOAT32_COLUMNS as float32
+    frame = _load_branches(path, lean)
+    if lean:
+        frame = frame[[column for column in frame.columns if column in USED_COLUMNS]]
+    return _ratios_to_float32(frame) if float32 else frame
+
+
+def _load_branches(path, lean):
+    if pa is None:
+        return normalize_branches(pd.read_excel(path, usecols=_used_column if lean else None))
+
+    directory, snapshot_path, meta_path = _cache_paths(path)
+    stat = os.stat(path)
+    digest, meta = _cached_digest(meta_path, stat)
+    if digest is None:
+        digest = _file_digest(path)
+        if meta is not None and meta.get('sha256') != digest:
+            meta = None
+
+    if meta is not None and os.path.exists(snapshot_path):
+        if meta.get('mtime_ns') != stat.st_mtime_ns:
+            _write_meta(meta_path, stat, digest)
+        # The snapshot holds every column; a lean load never materialises the others
+        table = feather.read_table(snapshot_path, memory_map=True)
+        if lean:
+            table = table.select([name for name in table.column_names if name in USED_COLUMNS])
+        return table.to_pandas(split_blocks=True)
+
+    frame = normalize_branches(pd.read_excel(path))
+    try:
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = snapshot_path + '.tmp'
+        feather.write_feather(frame, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, snapshot_path)
+        _write_meta(meta_path, stat, digest)
+    except OSError:
+        pass  # read-only filesystem: keep serving the parsed frame
+    return frame
+
+
+def _write_meta(meta_path, stat, digest):
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w') as meta_file:
+        json.dump({'format': CACHE_FORMAT, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                   'sha256': digest}, meta_file)
+    os.replace(tmp_path, meta_path)
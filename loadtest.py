@@ -0,0 +1,178 @@
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Browsers open at most this many connections per host, so a client's callbacks queue beyond it
+CONNECTIONS_PER_CLIENT = 6
+
+
+def fetch_json(url, body=None, timeout=60):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        payload = response.read()
+    return json.loads(payload) if payload else None, len(payload)
+
+
+def _walk(node):
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk(value)
+
+
+def discover(base_url):
+    # Dropdowns (id -> option values, initial value) from the layout and the server callbacks they trigger
+    layout, _ = fetch_json(base_url + '/_dash-layout')
+    dropdowns = {}
+    for node in _walk(layout):
+        if node.get('type') == 'Dropdown' and 'props' in node:
+            props = node['props']
+            values = [option['value'] if isinstance(option, dict) else option for option in props.get('options', [])]
+            dropdowns[props['id']] = (values, props.get('value'))
+    dependencies, _ = fetch_json(base_url + '/_dash-dependencies')
+    callbacks = [callback for callback in dependencies
+                 if not callback.get('clientside_function')
+                 and any(item['id'] in dropdowns for item in callback['inputs'])]
+    return dropdowns, callbacks
+
+
+def _outputs(output):
+    # '..a.figure...b.data..' (several outputs) or 'a.figure' (one) -> [{'id': 'a', 'property': 'figure'}, ...]
+    parts = output[2:-2].split('...') if output.startswith('..') else [output]
+    outputs = []
+    for part in parts:
+        component, prop = part.rsplit('.', 1)
+        outputs.append({'id': component, 'property': prop})
+    return outputs
+
+
+class Client:
+    # One simulated browser tab: holds its dropdown values and whatever the callbacks stored
+
+    def __init__(self, base_url, dropdowns, callbacks, seed):
+        self.base_url = base_url
+        self.dropdowns = dropdowns
+        self.callbacks = callbacks
+        self.random = random.Random(seed)
+        self.props = {(component, 'value'): value for component, (_, value) in dropdowns.items()}
+        self.pool = ThreadPoolExecutor(CONNECTIONS_PER_CLIENT)
+
+    def _request(self, callback, changed):
+        outputs = _outputs(callback['output'])
+        body = {
+            'output': callback['output'],
+            'outputs': outputs if len(outputs) > 1 else outputs[0],
+            'inputs': [dict(item, value=self.props.get((item['id'], item['property']))) for item in callback['inputs']],
+            'state': [dict(item, value=self.props.get((item['id'], item['property']))) for item in callback['state']],
+            'changedPropIds': [changed],
+        }
+        start = time.perf_counter()
+        try:
+            response, size = fetch_json(self.base_url + '/_dash-update-component', body)
+        except (urllib.error.URLError, OSError, ValueError):
+            return time.perf_counter() - start, 0, False
+        seconds = time.perf_counter() - start
+        for component, props in ((response or {}).get('response') or {}).items():
+            for prop, value in props.items():
+                # Keep stored state (e.g. the section signatures) for the next request; figures aren't needed
+                if prop == 'data':
+                    self.props[(component, prop)] = value
+        return seconds, size, True
+
+    def interact(self):
+        # Change one dropdown like a user would and fire every callback it triggers at once
+        component = self.random.choice(sorted(self.dropdowns))
+        self.props[(component, 'value')] = self.random.choice(self.dropdowns[component][0])
+        triggered = [callback for callback in self.callbacks
+                     if any(item['id'] == component for item in callback['inputs'])]
+        start = time.perf_counter()
+        results = list(self.pool.map(lambda callback: self._request(callback, component + '.value'), triggered))
+        return time.perf_counter() - start, results
+
+
+def run(base_url, clients, duration, interactions, seed):
+    dropdowns, callbacks = discover(base_url)
+    if not dropdowns or not callbacks:
+        raise SystemExit('No dropdown callbacks found at %s' % base_url)
+    print('%d dropdowns, %d callbacks, %d clients' % (len(dropdowns), len(callbacks), clients))
+
+    lock = threading.Lock()
+    interaction_seconds, callback_seconds, sizes = [], [], []
+    errors = [0]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def simulate(number):
+        client = Client(base_url, dropdowns, callbacks, seed + number)
+        done = 0
+        while (deadline is None and done < interactions) or (deadline is not None and time.perf_counter() < deadline):
+            seconds, results = client.interact()
+            done += 1
+            with lock:
+                interaction_seconds.append(seconds)
+                for request_seconds, size, ok in results:
+                    if ok:
+                        callback_seconds.append(request_seconds)
+                        sizes.append(size)
+                    else:
+                        errors[0] += 1
+        client.pool.shutdown()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=simulate, args=(number,)) for number in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    report = {'clients': clients, 'seconds': elapsed, 'interactions': len(interaction_seconds),
+              'callbacks': len(callback_seconds), 'errors': errors[0],
+              'callbacks_per_second': len(callback_seconds) / elapsed,
+              'interactions_per_second': len(interaction_seconds) / elapsed,
+              'mean_response_bytes': float(np.mean(sizes)) if sizes else 0.0}
+    for name, samples in [('callback', callback_seconds), ('interaction', interaction_seconds)]:
+        if samples:
+            milliseconds = np.array(samples) * 1000
+            report[name + '_ms'] = {'p50': np.percentile(milliseconds, 50), 'p95': np.percentile(milliseconds, 95),
+                                    'p99': np.percentile(milliseconds, 99), 'max': milliseconds.max()}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay random dropdown changes from concurrent clients')
+    parser.add_argument('--url', default='http://127.0.0.1:10000')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run (0: use --interactions)')
+    parser.add_argument('--interactions', type=int, default=50, help='dropdown changes per client without --duration')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    report = run(args.url.rstrip('/'), args.clients, args.duration, args.interactions, args.seed)
+    if args.json:
+        print(json.dumps(report, indent=2, default=float))
+        return
+    print('%d interactions, %d callbacks in %.1f s, %d errors'
+          % (report['interactions'], report['callbacks'], report['seconds'], report['errors']))
+    print('throughput   %8.1f callbacks/s   %8.1f interactions/s'
+          % (report['callbacks_per_second'], report['interactions_per_second']))
+    for name in ['callback', 'interaction']:
+        if name + '_ms' in report:
+            latency = report[name + '_ms']
+            print('%-12s p50 %8.1f ms   p95 %8.1f ms   p99 %8.1f ms   max %8.1f ms'
+                  % (name, latency['p50'], latency['p95'], latency['p99'], latency['max']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import contextlib
+import os
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Instrumentation is opt-in: while this is False, timed() hands out a shared no-op context manager
+enabled = False
+
+_NOT_TIMED = contextlib.nullcontext()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    # Every series carries the worker's pid: each gunicorn worker keeps its own counters and /metrics
+    # shows only the worker that answered, so scrape every worker (or sum over `worker`) for totals
+    pairs = list(zip(names, values)) + [('worker', os.getpid())] + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value)) for name, value in pairs)
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Histogram:
+    # Cumulative latency buckets per label combination, rendered in the Prometheus text format
+
+    def __init__(self, name, help_text, labelnames, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for position, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[0][position] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.help_text), '# TYPE %s histogram' % self.name]
+        with self._lock:
+            series = sorted(self._series.items())
+            for labels, (counts, total, count) in series:
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append('%s_bucket%s %d' % (self.name, _labels(self.labelnames, labels, [('le', _number(bound))]),
+                                                      bucket_count))
+                lines.append('%s_bucket%s %d' % (self.name, _labels(self.labelnames, labels, [('le', '+Inf')]), count))
+                lines.append('%s_sum%s %s' % (self.name, _labels(self.labelnames, labels), _number(total)))
+                lines.append('%s_count%s %d' % (self.name, _labels(self.labelnames, labels), count))
+        return lines
+
+
+# stage is one of load, filter, lookup, summarize, render, callback, serialise, warmup; part names the
+# section, summary part or load mode it was measured for
+STAGES = Histogram('notactive_stage_seconds', 'Time spent in each stage of loading and updating the dashboard',
+                   ['stage', 'part'])
+# Labelled by which dropdowns are fixed ('all' or 'one' each), not their values: one series per value
+# would grow with every salesman and city in the data
+SELECTIONS = Histogram('notactive_selection_seconds', 'Time to summarize one dropdown combination',
+                       ['salesman', 'city', 'status'])
+
+
+def selection_shape(*selection):
+    # timed(SELECTIONS, *selection_shape('All', 'Tehran', 'All')) -> ('all', 'one', 'all')
+    return tuple('all' if value == 'All' else 'one' for value in selection)
+
+
+@contextlib.contextmanager
+def _timer(histogram, labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, *labels)
+
+
+def timed(histogram, *labels):
+    # with timed(STAGES, 'render', 'kpi-cards'): ...
+    if not enabled:
+        return _NOT_TIMED
+    return _timer(histogram, labels)
+
+
+def gauge(name, help_text, samples, kind='gauge'):
+    # Prometheus lines for one gauge or counter; samples is a list of ({label: value}, number)
+    lines = ['# HELP %s %s' % (name, help_text), '# TYPE %s %s' % (name, kind)]
+    for labels, value in samples:
+        lines.append('%s%s %s' % (name, _labels(list(labels), list(labels.values())), _number(value)))
+    return lines
+
+
+def render(*extra):
+    # The whole /metrics page: both histograms plus any gauge() line lists
+    lines = STAGES.render() + SELECTIONS.render()
+    for block in extra:
+        lines.extend(block)
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from cube import DIMENSIONS
+
+
+def intersect_sorted(small, large):
+    # Positions present in both sorted arrays: one binary search per element of the smaller one
+    if len(small) > len(large):
+        small, large = large, small
+    if len(small) == 0:
+        return small
+    found = np.searchsorted(large, small)
+    found[found == len(large)] = 0
+    return small[large[found] == small]
+
+
+class RowIndex:
+    # Inverted index from every dropdown value to the sorted row positions holding it.
+    #
+    # Rows are grouped by value with a stable argsort, so the positions of one value are a
+    # contiguous, already sorted slice of `_order[dim]`; selecting is slicing plus intersecting.
+
+    def __init__(self, frame, dims=DIMENSIONS):
+        self.length = len(frame)
+        self._order = {}
+        self._offsets = {}
+        self._codes = {}
+        for dim in dims:
+            values = frame[dim]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+            else:
+                codes, uniques = pd.factorize(values)
+            codes = np.asarray(codes, dtype=np.int64)
+            present = codes >= 0  # NaN rows are only ever selected through 'All'
+            order = np.argsort(codes[present], kind='stable')
+            self._order[dim] = np.flatnonzero(present)[order]
+            self._offsets[dim] = np.concatenate([[0], np.cumsum(np.bincount(codes[present], minlength=len(uniques)))])
+            self._codes[dim] = {value: code for code, value in enumerate(uniques)}
+
+    def rows(self, dim, value):
+        code = self._codes[dim].get(value)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        offsets = self._offsets[dim]
+        return self._order[dim][offsets[code]:offsets[code + 1]]
+
+    def select(self, selected_salesperson, selected_city, selected_status):
+        # Sorted row positions for a dropdown selection, or None when nothing is filtered
+        selection = zip(DIMENSIONS, [selected_salesperson, selected_city, selected_status])
+        postings = sorted((self.rows(dim, value) for dim, value in selection if value != 'All'), key=len)
+        if not postings:
+            return None
+        rows = postings[0]
+        for other in postings[1:]:
+            rows = intersect_sorted(rows, other)
+        return rows
+
+    @staticmethod
+    def take(frame, rows, columns=None):
+        # Only the selected rows of only the needed columns; the frame itself when rows is None
+        if rows is None:
+            return frame
+        columns = frame.columns if columns is None else columns
+        return pd.DataFrame({column: frame[column].take(rows) for column in columns})
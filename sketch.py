@@ -0,0 +1,115 @@
+import math
+
+import numpy as np
+
+# Compaction coin: the top bit of a 64-bit LCG (Knuth's MMIX constants) kept per sketch as a plain
+# int, since a numpy Generator per sketch would dominate per-cell memory. Seeded, so the same values
+# give the same sketch and quantiles on every load and in every worker.
+_LCG_MULTIPLIER = 6364136223846793005
+_LCG_INCREMENT = 1442695040888963407
+_MASK64 = (1 << 64) - 1
+
+# Normalized rank error of a KLL sketch is about RANK_ERROR_FACTOR / k (99% confidence, per DataSketches)
+RANK_ERROR_FACTOR = 1.65
+
+
+def k_for_error(error):
+    # Smallest k whose quantiles are within `error` of the true rank (0.01 -> k=165)
+    return max(8, int(math.ceil(RANK_ERROR_FACTOR / error)))
+
+
+class KllSketch:
+    # Mergeable quantile sketch (KLL): a stack of compactors where an item at level h stands for 2**h
+    # input values. Memory stays around 3k items however many values are added, and while nothing
+    # has been compacted the quantiles are exact.
+
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self.seed = seed & _MASK64
+        self._state = self.seed
+
+    @property
+    def rank_error(self):
+        return RANK_ERROR_FACTOR / self.k
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        values = np.asarray(values, dtype='float64')
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.count += len(values)
+        if len(self.levels[0]) > self._capacity(0):
+            self._compress()
+        return self
+
+    def _coin(self):
+        self._state = (self._state * _LCG_MULTIPLIER + _LCG_INCREMENT) & _MASK64
+        return self._state >> 63
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays behind; every other item of the rest moves up with double weight
+                keep = items[:len(items) % 2]
+                paired = items[len(items) % 2:]
+                promoted = paired[self._coin()::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                level = 0  # capacities shrink as the stack grows, so recheck from the bottom
+            else:
+                level += 1
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+        return self
+
+    @classmethod
+    def merge_all(cls, sketches, k=None):
+        # The merged sketch's seed comes from the inputs', so merging the same sketches is repeatable
+        sketches = list(sketches)
+        seed = 0
+        for sketch in sketches:
+            seed = (seed * _LCG_MULTIPLIER + sketch.seed) & _MASK64
+        merged = cls(k or (sketches[0].k if sketches else 200), seed)
+        depth = max((len(sketch.levels) for sketch in sketches), default=1)
+        merged.levels = [np.concatenate([sketch.levels[level] for sketch in sketches if level < len(sketch.levels)]
+                                        or [np.empty(0)]) for level in range(depth)]
+        merged.count = sum(sketch.count for sketch in sketches)
+        merged._compress()
+        return merged
+
+    def quantile(self, q):
+        if self.count == 0:
+            return float('nan')
+        if len(self.levels) == 1:
+            # Nothing compacted yet: same linear interpolation as pandas
+            with np.errstate(invalid='ignore'):
+                return float(np.quantile(self.levels[0], q))
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items_at), 2 ** level, dtype='float64')
+                                  for level, items_at in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, weights = items[order], weights[order]
+        cumulative = np.cumsum(weights)
+        rank = q * cumulative[-1]
+        return float(items[min(np.searchsorted(cumulative, rank, side='left'), len(items) - 1)])
+
+    def __len__(self):
+        return sum(len(items) for items in self.levels)
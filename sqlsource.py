@@ -0,0 +1,291 @@
+import argparse
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:  # SQLite databases only
+    duckdb = None
+
+from cube import (DIMENSIONS, DEACTIVE_THRESHOLD, DEACTIVE_COLUMNS, COUNT_COLUMNS, SUM_COLUMNS, METRICS, QUANTILES,
+                  TENURE_COLUMN, ORDER_BINS, ORDER_LABELS, SUBSCRIPTION_BINS, SUBSCRIPTION_LABELS, TENURE_BINS,
+                  TENURE_LABELS, empty_summary, _summary_from_rows)
+from facture import _BUCKET_EDGES
+from loader import USED_COLUMNS, load_branches
+
+# Table written by build_database() and read by SqlSource
+TABLE = 'branches'
+
+# Workbook row order, so the dropdowns list values in first-seen order like the pandas backend
+ROW_COLUMN = '_row'
+
+_MICROSECOND = pd.Timedelta(1, unit='us').value
+_DAY = pd.Timedelta(days=1).value
+
+
+def _quote(name):
+    return '"%s"' % name.replace('"', '""')
+
+
+def _flag(condition):
+    return 'CASE WHEN %s THEN 1 ELSE 0 END' % condition
+
+
+# The per-row counters of cube.row_measures() as SQL conditions. A NULL comparison never counts,
+# like a NaN one in pandas
+_EVAL_ON = '"SmartEvaluation" = 1'
+_CLUB_ON = '"SmartClub" = 1'
+_EVAL_LOW = '"eval_ratio" <= %r' % DEACTIVE_THRESHOLD
+_CLUB_LOW = '"Club_ratio" <= %r' % DEACTIVE_THRESHOLD
+_EVAL_HIGH = '"eval_ratio" > %r' % DEACTIVE_THRESHOLD
+_CLUB_HIGH = '"Club_ratio" > %r' % DEACTIVE_THRESHOLD
+_BOTH = '%s AND %s' % (_EVAL_ON, _CLUB_ON)
+_ORDERS_ROWS = '"orderCount" > 0 AND "fDays" > 0'
+_REVENUE_ROWS = '"revenue" > 0'
+
+COUNTERS = {
+    'both': _BOTH,
+    'only_eval': '%s AND "SmartClub" = 0' % _EVAL_ON,
+    'only_club': '%s AND "SmartEvaluation" = 0' % _CLUB_ON,
+    'eval_low': '%s AND %s' % (_BOTH, _EVAL_LOW),
+    'club_low': '%s AND %s' % (_BOTH, _CLUB_LOW),
+    'both_low': '%s AND %s AND %s' % (_BOTH, _EVAL_LOW, _CLUB_LOW),
+    'only_deactive_eval': '%s AND %s AND %s' % (_BOTH, _EVAL_LOW, _CLUB_HIGH),
+    'only_deactive_club': '%s AND %s AND %s' % (_BOTH, _EVAL_HIGH, _CLUB_LOW),
+    'active_both': '%s AND %s AND %s' % (_BOTH, _EVAL_HIGH, _CLUB_HIGH),
+    'eval_rows': _EVAL_ON,
+    'eval_deactive': '%s AND %s' % (_EVAL_ON, _EVAL_LOW),
+    'club_rows': _CLUB_ON,
+    'club_deactive': '%s AND %s' % (_CLUB_ON, _CLUB_LOW),
+    'orders_rows': _ORDERS_ROWS,
+    'revenue_rows': _REVENUE_ROWS,
+}
+
+# Per-row metric values, NULL where the dashboard leaves the row out. Revenue on a zero-day branch is
+# NULL here but inf in pandas
+METRIC_EXPRESSIONS = {
+    'orders_per_day': 'CASE WHEN %s THEN 1.0 * "orderCount" / "fDays" END' % _ORDERS_ROWS,
+    'revenue_per_day': 'CASE WHEN %s THEN 1.0 * "revenue" / "fDays" END' % _REVENUE_ROWS,
+    'subscription': '"subscription"',
+    'tenure': _quote(TENURE_COLUMN),
+}
+
+
+def _binned_counters():
+    # Left-closed bins, like pd.cut(right=False), and the negative charge day buckets
+    counters = {}
+    for name, bins, labels in [('orders', ORDER_BINS, ORDER_LABELS),
+                               ('subscription', SUBSCRIPTION_BINS, SUBSCRIPTION_LABELS),
+                               ('tenure', TENURE_BINS, TENURE_LABELS)]:
+        metric = METRIC_EXPRESSIONS['orders_per_day' if name == 'orders' else name]
+        for i in range(len(labels)):
+            condition = '%s >= %r' % (metric, bins[i])
+            if bins[i + 1] != float('inf'):
+                condition += ' AND %s < %r' % (metric, bins[i + 1])
+            counters['%s_bin_%d' % (name, i)] = condition
+    days = '"HowManydayschargeisNegetive"'
+    for i, condition in enumerate(['{0} = 0', '{0} > 0 AND {0} <= 7', '{0} >= 8 AND {0} <= 30', '{0} > 30']):
+        counters['neg_bin_%d' % i] = condition.format(days)
+    return counters
+
+
+COUNTERS.update(_binned_counters())
+
+
+def _nodata_counters(reference):
+    # (condition, parameters) per no-data bucket as of `reference`; lastfacture is stored in
+    # microseconds, so a branch n whole days old has reference - (n + 1) days < lastfacture <= reference - n days
+    reference = pd.Timestamp(reference).value
+    edges = [(reference - days * _DAY) // _MICROSECOND for days in _BUCKET_EDGES]
+    return {
+        'nodata_bin_3': ('"lastfacture" <= ?', [edges[0]]),
+        'nodata_bin_2': ('"lastfacture" > ? AND "lastfacture" <= ?', [edges[0], edges[1]]),
+        'nodata_bin_1': ('"lastfacture" > ? AND "lastfacture" <= ?', [edges[1], edges[2]]),
+        'nodata_bin_0': ('"lastfacture" > ? AND "lastfacture" <= ?', [edges[2], edges[3]]),
+    }
+
+
+def _counter_columns(reference):
+    # Select expressions (and their parameters) of COUNT_COLUMNS then SUM_COLUMNS
+    nodata = _nodata_counters(reference)
+    columns, parameters = [], []
+    for name in COUNT_COLUMNS:
+        if name in nodata:
+            condition, condition_parameters = nodata[name]
+            columns.append('SUM(%s)' % _flag(condition))
+            parameters.extend(condition_parameters)
+        elif name in COUNTERS:
+            columns.append('SUM(%s)' % _flag(COUNTERS[name]))
+        else:
+            columns.append('COUNT(%s)' % METRIC_EXPRESSIONS[name[:-len('_count')]])
+    for name in SUM_COLUMNS:
+        columns.append('SUM(%s)' % METRIC_EXPRESSIONS[name[:-len('_sum')]])
+    return columns, parameters
+
+
+def _interpolate(lower, upper, fraction):
+    # Linear interpolation the way NumPy's quantile() does it
+    if fraction < 0.5:
+        return lower + (upper - lower) * fraction
+    return upper - (upper - lower) * (1 - fraction)
+
+
+class SqlSource:
+    # Dashboard summaries answered by aggregate queries against a SQLite or DuckDB file.
+    #
+    # Filters, counters, bins and per-dimension breakdowns are pushed down as SUM(CASE ...) queries
+    # and quantiles as a few ordered positions, so only small result sets come back; rows are never
+    # loaded into this process.
+
+    def __init__(self, path, table=TABLE):
+        self.path = path
+        self.table = table
+        self.duckdb = os.path.splitext(path)[1].lower() in ('.duckdb', '.ddb')
+        if self.duckdb and duckdb is None:
+            raise ImportError('Reading %s needs the duckdb package' % path)
+        self._local = threading.local()
+        self._root = None
+
+    def _connection(self):
+        # One connection per thread (and per process, after a preforking server forks)
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            if self.duckdb:
+                if self._root is None or self._root[0] != os.getpid():
+                    self._root = (os.getpid(), duckdb.connect(self.path, read_only=True))
+                local.connection = self._root[1].cursor()
+            else:
+                local.connection = sqlite3.connect('file:%s?mode=ro' % os.path.abspath(self.path), uri=True,
+                                                   check_same_thread=False)
+            local.pid = os.getpid()
+        return local.connection
+
+    def query(self, sql, parameters=()):
+        return self._connection().execute(sql, list(parameters)).fetchall()
+
+    def options(self):
+        # Dropdown values in first-seen order, as df[dim].dropna().unique() lists them
+        return {dim: [row[0] for row in self.query(
+            'SELECT %s FROM %s WHERE %s IS NOT NULL GROUP BY %s ORDER BY MIN(%s)'
+            % (_quote(dim), _quote(self.table), _quote(dim), _quote(dim), _quote(ROW_COLUMN)))]
+            for dim in DIMENSIONS}
+
+    def cell_rows(self):
+        # Row count of every (salesman, city, BranchStatus) combination, for the CooccurrenceIndex
+        dims = ', '.join(_quote(dim) for dim in DIMENSIONS)
+        rows = self.query('SELECT %s, COUNT(*) FROM %s GROUP BY %s' % (dims, _quote(self.table), dims))
+        return pd.DataFrame(rows, columns=DIMENSIONS + ['rows'])
+
+    def _where(self, selected_salesperson, selected_city, selected_status):
+        selection = zip(DIMENSIONS, [selected_salesperson, selected_city, selected_status])
+        fixed = [(dim, value) for dim, value in selection if value != 'All']
+        where = ' WHERE ' + ' AND '.join('%s = ?' % _quote(dim) for dim, _ in fixed) if fixed else ''
+        return where, [value for _, value in fixed]
+
+    def summary(self, selected_salesperson, selected_city, selected_status, reference):
+        # Same keys as Cube.lookup(), with the no-data buckets counted as of `reference`
+        where, parameters = self._where(selected_salesperson, selected_city, selected_status)
+        columns, column_parameters = _counter_columns(reference)
+        row = self.query('SELECT COUNT(*), %s FROM %s%s' % (', '.join(columns), _quote(self.table), where),
+                         column_parameters + parameters)[0]
+        if not row[0]:
+            return empty_summary()
+        totals = dict(zip(COUNT_COLUMNS + SUM_COLUMNS, [value or 0 for value in row[1:]]))
+
+        for m in METRICS:
+            totals.update(self._quantiles(m, totals['%s_count' % m], where, parameters))
+        breakdowns = {dim: self._breakdown(dim, where, parameters) for dim in DIMENSIONS}
+        return _summary_from_rows(totals, breakdowns)
+
+    def counters(self, dim, reference):
+        # COUNT_COLUMNS and SUM_COLUMNS per value of `dim` as of `reference`, in one grouped query
+        columns, parameters = _counter_columns(reference)
+        rows = self.query('SELECT %s, %s FROM %s WHERE %s IS NOT NULL GROUP BY %s ORDER BY %s'
+                          % (_quote(dim), ', '.join(columns), _quote(self.table), _quote(dim), _quote(dim),
+                             _quote(dim)), parameters)
+        table = pd.DataFrame([[value or 0 for value in row[1:]] for row in rows], columns=COUNT_COLUMNS + SUM_COLUMNS)
+        table.index = pd.Index([row[0] for row in rows], name=dim)
+        return table
+
+    def _quantiles(self, metric, count, where, parameters):
+        names = ['%s_q%d' % (metric, int(q * 100)) for q in QUANTILES]
+        if not count:
+            return dict.fromkeys(names, float('nan'))
+        expression = METRIC_EXPRESSIONS[metric]
+        positions = [q * (count - 1) for q in QUANTILES]
+        wanted = sorted({int(position) for position in positions} | {min(int(position) + 1, count - 1)
+                                                                     for position in positions})
+        condition = '%s IS NOT NULL' % expression
+        where = where + (' AND ' if where else ' WHERE ') + condition
+        values = dict(self.query(
+            'SELECT position, value FROM (SELECT %s AS value, ROW_NUMBER() OVER (ORDER BY %s) - 1 AS position '
+            'FROM %s%s) AS ranked WHERE position IN (%s)'
+            % (expression, expression, _quote(self.table), where, ', '.join('?' * len(wanted))),
+            parameters + wanted))
+        quantiles = {}
+        for name, position in zip(names, positions):
+            lower = int(position)
+            quantiles[name] = _interpolate(values[lower], values[min(lower + 1, count - 1)], position - lower)
+        return quantiles
+
+    def _breakdown(self, dim, where, parameters):
+        # The deactive counters per value of `dim` within the selection, sorted like the cube's levels
+        where = where + (' AND ' if where else ' WHERE ') + '%s IS NOT NULL' % _quote(dim)
+        rows = self.query('SELECT %s, %s FROM %s%s GROUP BY %s ORDER BY %s'
+                          % (_quote(dim), ', '.join('SUM(%s)' % _flag(COUNTERS[name]) for name in DEACTIVE_COLUMNS),
+                             _quote(self.table), where, _quote(dim), _quote(dim)), parameters)
+        table = pd.DataFrame([row[1:] for row in rows], columns=DEACTIVE_COLUMNS, dtype='int64')
+        table.index = pd.Index([row[0] for row in rows], name=dim)
+        return table
+
+
+def build_database(workbook, path, table=TABLE):
+    # Write the columns the dashboard reads from `workbook` into a SQLite (or .duckdb) file at `path`
+    return write_database(load_branches(workbook, lean=True), path, table)
+
+
+def write_database(frame, path, table=TABLE):
+    # Write the used columns of a loaded frame, replacing `path` atomically so a running dashboard
+    # picks up the new file on its next refresh
+    frame = frame[[column for column in USED_COLUMNS if column in frame.columns]]
+    frame = frame.assign(**{dim: frame[dim].astype(object) for dim in DIMENSIONS})
+    frame[ROW_COLUMN] = range(len(frame))
+    # Microseconds since the epoch (NULL when missing) compare the same way in both engines
+    lastfacture = pd.to_datetime(frame['lastfacture'])
+    frame['lastfacture'] = (lastfacture.astype('datetime64[us]').astype('int64').astype('Int64')
+                            .mask(lastfacture.isna()))
+
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    if os.path.splitext(path)[1].lower() in ('.duckdb', '.ddb'):
+        if duckdb is None:
+            raise ImportError('Writing %s needs the duckdb package' % path)
+        connection = duckdb.connect(tmp_path)
+        connection.register('frame', frame)
+        connection.execute('CREATE TABLE %s AS SELECT * FROM frame' % _quote(table))
+    else:
+        connection = sqlite3.connect(tmp_path)
+        frame.to_sql(table, connection, index=False)
+        for dim in DIMENSIONS:
+            connection.execute('CREATE INDEX %s ON %s (%s)' % (_quote('%s_%s' % (table, dim)), _quote(table),
+                                                              _quote(dim)))
+        connection.commit()
+    connection.close()
+    os.replace(tmp_path, path)
+    return len(frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the SQL backend database from a workbook')
+    parser.add_argument('workbook', help='notActive.xlsx export')
+    parser.add_argument('database', help='SQLite file to write (.duckdb/.ddb for DuckDB)')
+    parser.add_argument('--table', default=TABLE)
+    args = parser.parse_args()
+    rows = build_database(args.workbook, args.database, args.table)
+    print('%d rows written to %s' % (rows, args.database))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from cooccurrence import CooccurrenceIndex
+from cube import Cube, DIMENSIONS, COUNT_COLUMNS, SUM_COLUMNS, SUMMARY_COLUMNS, fold_cells, row_measures
+
+# Stands in for a missing dimension value while cells are accumulated; NaN keys don't align
+_MISSING = '\x00missing'
+
+NUMERIC_COLUMNS = [column for column in SUMMARY_COLUMNS
+                   if column not in DIMENSIONS and column != 'how_many_days_with_nodata']
+
+
+def iter_chunks(path, chunksize=50000):
+    # Raw row chunks of an .xlsx workbook or an equivalent .csv / .parquet export
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        yield from pd.read_csv(path, chunksize=chunksize)
+    elif extension in ('.parquet', '.pq'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows)
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) == chunksize:
+                    yield pd.DataFrame(chunk, columns=header)
+                    chunk = []
+            if chunk:
+                yield pd.DataFrame(chunk, columns=header)
+        finally:
+            workbook.close()
+
+
+def prepare_chunk(chunk, today):
+    chunk = chunk.rename(columns=lambda name: name.strip() if isinstance(name, str) else name)
+    # Formatted but empty worksheet rows come through openpyxl as all-None rows; read_excel drops them
+    chunk = chunk.dropna(how='all')
+    for column in NUMERIC_COLUMNS:
+        chunk[column] = pd.to_numeric(chunk[column], errors='coerce')
+    chunk['lastfacture'] = pd.to_datetime(chunk['lastfacture'])
+    chunk['how_many_days_with_nodata'] = (today - chunk['lastfacture']).dt.days
+    return chunk
+
+
+class StreamAggregator:
+    # Folds row chunks into per-(salesman, city, BranchStatus) counters and quantile sketches.
+    #
+    # Memory grows with the number of distinct cells, never with the number of rows.
+
+    def __init__(self, k=200):
+        self.k = k
+        self.rows = 0
+        self.cells = None
+        self.cell_rows = None
+        self.sketches = {}
+        self.options = {dim: {} for dim in DIMENSIONS}
+
+    def add(self, chunk):
+        measures = row_measures(chunk)
+        for dim in DIMENSIONS:
+            # First-seen order, like the dropdowns built from df[dim].dropna().unique()
+            self.options[dim].update(dict.fromkeys(chunk[dim].dropna().unique()))
+            measures[dim] = measures[dim].astype(object).where(measures[dim].notna(), _MISSING)
+
+        part, _ = fold_cells(measures, self.k, self.sketches)
+        self.cells = part if self.cells is None else self.cells.add(part, fill_value=0)
+        rows = measures.groupby(DIMENSIONS).size()
+        self.cell_rows = rows if self.cell_rows is None else self.cell_rows.add(rows, fill_value=0)
+        self.rows += len(chunk)
+
+    def cube(self):
+        if self.cells is None:
+            cells = pd.DataFrame(columns=DIMENSIONS + COUNT_COLUMNS + SUM_COLUMNS)
+            return Cube.from_cells(cells, [])
+        cells = self.cells.reset_index()
+        sketches = [self.sketches[key] for key in self.cells.index]
+        for dim in DIMENSIONS:
+            cells[dim] = cells[dim].where(cells[dim] != _MISSING, np.nan)
+        cells[COUNT_COLUMNS] = cells[COUNT_COLUMNS].astype('int64')
+        return Cube.from_cells(cells, sketches)
+
+    def dropdown_options(self):
+        return {dim: list(values) for dim, values in self.options.items()}
+
+    def cooccurrence(self):
+        options = self.dropdown_options()
+        if self.cell_rows is None:
+            return CooccurrenceIndex(pd.DataFrame(columns=DIMENSIONS + ['rows']), options)
+        cells = self.cell_rows.rename('rows').reset_index()
+        for dim in DIMENSIONS:
+            cells[dim] = cells[dim].where(cells[dim] != _MISSING, np.nan)
+        return CooccurrenceIndex(cells, options)
+
+
+def ingest(path, today, chunksize=50000, k=200):
+    # Cube, dropdown options and their co-occurrence index for a workbook too large to hold as a frame
+    aggregator = StreamAggregator(k)
+    for chunk in iter_chunks(path, chunksize):
+        aggregator.add(prepare_chunk(chunk, today))
+    return aggregator.cube(), aggregator.dropdown_options(), aggregator.cooccurrence()
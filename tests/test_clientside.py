@@ -0,0 +1,65 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from datetime import datetime
+
+import pytest
+
+# The dashboard loads NOTACTIVE_PATH on import; serve the repo's workbook without background threads
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('NOTACTIVE_PATH', os.path.join(ROOT, 'notActive.xlsx'))
+os.environ.setdefault('NOTACTIVE_START_RELOADER', '0')
+os.environ.setdefault('NOTACTIVE_WARMUP', '0')
+
+import dashboard  # noqa: E402
+from benchmark import synthetic_branches  # noqa: E402
+from clientside import client_dataset  # noqa: E402
+from datastore import build_snapshot  # noqa: E402
+from loader import normalize_branches  # noqa: E402
+from plotly.io.json import to_json_plotly  # noqa: E402
+
+# Outputs of the top-N bar charts in SECTIONS order: kpi-cards comes first
+BAR_OUTPUTS = {'city-deactive-eval': 1, 'city-deactive-club': 2, 'salesperson-deactive': 3,
+               'branch-status-eval': 5, 'branch-status-club': 6}
+
+# Loads clientside.js as the browser would and prints update_dashboard()'s outputs for each selection
+NODE_SCRIPT = '''
+const fs = require('fs');
+global.window = {};
+eval(fs.readFileSync(process.argv[1], 'utf8'));
+const data = JSON.parse(fs.readFileSync(process.argv[2], 'utf8'));
+const selections = JSON.parse(process.argv[3]);
+const update = window.dash_clientside.notactive.update_dashboard;
+console.log(JSON.stringify(selections.map(selection => update(data, ...selection))));
+'''
+
+
+@pytest.fixture(scope='module')
+def snapshot():
+    # Few rows over many cities and salesmen: most bar charts have equal counts around the top-10 cut
+    frame = normalize_branches(synthetic_branches(400, salesmen=60, cities=80, seed=3))
+    return build_snapshot(None, 1, datetime.now(), None, frame=frame)
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='needs node to run clientside.js')
+def test_clientside_bars_match_server(snapshot):
+    selections = [('All', 'All', 'All'), ('salesman 0', 'All', 'All'), ('All', 'All', 'status 0')]
+    with tempfile.TemporaryDirectory() as directory:
+        data_path = os.path.join(directory, 'data.json')
+        with open(data_path, 'w', encoding='utf-8') as out:
+            out.write(to_json_plotly(client_dataset(snapshot)))
+        completed = subprocess.run(['node', '-e', NODE_SCRIPT, '--', os.path.join(ROOT, 'assets', 'clientside.js'),
+                                    data_path, json.dumps(selections)], capture_output=True, text=True, check=True)
+    client = json.loads(completed.stdout)
+
+    tied = False
+    for selection, client_outputs in zip(selections, client):
+        summary = dashboard.summarize_snapshot(snapshot, *selection)
+        for output_id, position in BAR_OUTPUTS.items():
+            server = dashboard.full_output(dashboard.SECTIONS[position][2](summary))
+            counts = server['data'][0]['y']
+            tied = tied or len(set(counts)) < len(counts)
+            assert client_outputs[position]['data'][0]['x'] == server['data'][0]['x'], (selection, output_id)
+    assert tied, 'no selection has equal counts to order'
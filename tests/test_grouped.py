@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cube import DIMENSIONS, filter_branches, deactive_flags, deactive_counts, grouped_charts
+
+CHARTS = ['city_eval', 'city_club', 'salesman_deactive', 'status_eval', 'status_club']
+
+
+def branches(rows, seed=0):
+    # notActive.xlsx's filter and ratio columns: SmartEvaluation/SmartClub off for some branches, ratios
+    # zero, exactly on the 0.05 threshold or missing for others
+    rng = np.random.default_rng(seed)
+
+    def ratios(scale):
+        values = rng.exponential(scale, rows)
+        values[rng.random(rows) < 0.2] = 0
+        values[rng.random(rows) < 0.05] = 0.05
+        values[rng.random(rows) < 0.1] = np.nan
+        return values
+
+    return pd.DataFrame({
+        'salesman': np.array(['salesman %d' % i for i in range(60)], dtype=object)[rng.integers(0, 60, rows)],
+        'city': np.array(['city %d' % i for i in range(25)], dtype=object)[rng.integers(0, 25, rows)],
+        'BranchStatus': np.array(['status %d' % i for i in range(8)], dtype=object)[rng.integers(0, 8, rows)],
+        'SmartEvaluation': (rng.random(rows) < 0.86).astype('int64'),
+        'SmartClub': (rng.random(rows) < 0.89).astype('int64'),
+        'eval_ratio': ratios(0.3),
+        'Club_ratio': ratios(0.1),
+    })
+
+
+def lambda_charts(filtered_df):
+    # The five grouped charts as update_dashboard built them before deactive_counts()
+    eval_branches = filtered_df[filtered_df['SmartEvaluation'] == 1]
+    club_branches = filtered_df[filtered_df['SmartClub'] == 1]
+    both_eval_club_f = filtered_df[(filtered_df['SmartEvaluation'] == 1) & (filtered_df['SmartClub'] == 1)]
+    sales_deactive = both_eval_club_f.groupby('salesman').agg({
+        'eval_ratio': lambda x: (x <= 0.05).sum(),
+        'Club_ratio': lambda x: (x <= 0.05).sum()
+    })
+    return {
+        'city_eval': eval_branches.groupby('city').agg({'eval_ratio': lambda x: (x <= 0.05).sum()})['eval_ratio'],
+        'city_club': club_branches.groupby('city').agg({'Club_ratio': lambda x: (x <= 0.05).sum()})['Club_ratio'],
+        'salesman_deactive': sales_deactive['eval_ratio'] + sales_deactive['Club_ratio'],
+        'status_eval': eval_branches.groupby('BranchStatus').agg({'eval_ratio': lambda x: (x <= 0.05).sum()})['eval_ratio'],
+        'status_club': club_branches.groupby('BranchStatus').agg({'Club_ratio': lambda x: (x <= 0.05).sum()})['Club_ratio'],
+    }
+
+
+def flag_charts(filtered_df):
+    flags = deactive_flags(filtered_df)
+    return grouped_charts({dim: deactive_counts(flags, dim) for dim in DIMENSIONS})
+
+
+def chart_frame(series):
+    # Names and index dtypes differ between the two ways (eval_ratio vs eval_deactive, str vs the
+    # object labels the figures get); compare the labels and counts
+    frame = series.rename('deactive').astype('int64').to_frame()
+    frame.index = frame.index.astype(object)
+    return frame
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return branches(20_000)
+
+
+@pytest.mark.parametrize('selection', [
+    ('All', 'All', 'All'),
+    ('salesman 3', 'All', 'All'),
+    ('All', 'city 0', 'All'),
+    ('All', 'All', 'status 2'),
+    ('salesman 7', 'city 4', 'All'),
+    ('All', 'city 1', 'status 0'),
+])
+def test_grouped_charts_match_lambdas(frame, selection):
+    filtered_df = filter_branches(frame, *selection)
+    expected = lambda_charts(filtered_df)
+    actual = flag_charts(filtered_df)
+    for name in CHARTS:
+        pd.testing.assert_frame_equal(chart_frame(actual[name]), chart_frame(expected[name]), obj=name)
+
+
+def test_benchmark_lambdas(benchmark, frame):
+    benchmark(lambda_charts, frame)
+
+
+def test_benchmark_grouped_charts(benchmark, frame):
+    charts = benchmark(flag_charts, frame)
+    assert list(charts) == CHARTS
@@ -0,0 +1,83 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cube import DIMENSIONS
+from metrics import STAGES, timed
+
+logger = logging.getLogger(__name__)
+
+
+def top_values(snapshot, dim, top):
+    # The `top` values of one dropdown with the most branches
+    if top <= 0:
+        return []
+    values, _ = snapshot.cooccurrence.options(dim, {}, limit=top)
+    return [value for value, _ in values]
+
+
+def popular_selections(snapshot, top):
+    # The All/All/All rollup, then each dropdown's most common values with the others on 'All', taking
+    # the n-th most common value of every dropdown before any n+1-th so a short budget covers all three
+    selections = [('All',) * len(DIMENSIONS)]
+    ranked = [top_values(snapshot, dim, top) for dim in DIMENSIONS]
+    for rank in range(top):
+        for position, values in enumerate(ranked):
+            if rank < len(values):
+                selection = ['All'] * len(DIMENSIONS)
+                selection[position] = values[rank]
+                selections.append(tuple(selection))
+    return selections
+
+
+class Warmer:
+    # Fills the result caches for the most popular selections of a snapshot on a background thread pool.
+    #
+    # warm(snapshot, salesperson, city, status) computes and caches one selection. A warm-up stops at
+    # `limit` selections or after `seconds`, whichever comes first (0 lifts either budget), and a newer
+    # snapshot cancels whatever is left of the previous one's.
+
+    def __init__(self, warm, threads=2, top=10, limit=0, seconds=60):
+        self.warm = warm
+        self.threads = threads
+        self.top = top
+        self.limit = limit
+        self.seconds = seconds
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def start(self, snapshot):
+        # Returns at once; usable as a DataStore.on_swap listener
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        thread = threading.Thread(target=self._run, args=(snapshot, generation),
+                                  name='warmup-%d' % snapshot.version, daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self, snapshot, generation):
+        start = time.perf_counter()
+        deadline = start + self.seconds if self.seconds else None
+        selections = popular_selections(snapshot, self.top)
+        if self.limit:
+            selections = selections[:self.limit]
+
+        def warm_one(selection):
+            # Skipped once the budget is spent or a newer snapshot took over
+            if generation != self._generation or (deadline is not None and time.perf_counter() > deadline):
+                return False
+            try:
+                with timed(STAGES, 'warmup', 'selection'):
+                    self.warm(snapshot, *selection)
+            except Exception:
+                logger.exception('Warming %s failed', selection)
+                return False
+            return True
+
+        with ThreadPoolExecutor(self.threads, thread_name_prefix='warmup') as pool:
+            warmed = sum(pool.map(warm_one, selections))
+        logger.info('Warmed %d of %d selections for data version %d in %.1f s',
+                    warmed, len(selections), snapshot.version, time.perf_counter() - start)
+        return warmed
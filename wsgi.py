@@ -0,0 +1,10 @@
+import gc
+
+from dashboard import app
+
+# WSGI entry point for multi-worker servers: gunicorn -c gunicorn.conf.py wsgi:server
+server = app.server
+
+# Everything loaded so far (the frame, cube and figure templates) is shared copy-on-write with forked
+# workers; keep the garbage collector from touching those objects and dirtying their pages
+gc.freeze()